@@ -0,0 +1,138 @@
+// Compares the previous per-row attendance marking loop with the set-based markAttendance
+// upsert on a throwaway database. Usage: node bench/attendance-mark.js [students] [days]
+const fs = require("fs");
+const os = require("os");
+const path = require("path");
+
+const dbFile = path.join(os.tmpdir(), `cms-bench-attendance-${process.pid}.db`);
+process.env.DATABASE_URL = `sqlite:///${dbFile}`;
+
+const { connectDb, closeDb, initializeSchema, withTransaction } = require("../src/db");
+const { createAuditLog, markAttendance } = require("../src/services");
+
+const studentCount = Number(process.argv[2]) || 150;
+const dayCount = Number(process.argv[3]) || 20;
+
+function isoDate(offset) {
+  const d = new Date(Date.UTC(2024, 0, 1));
+  d.setUTCDate(d.getUTCDate() + offset);
+  return d.toISOString().slice(0, 10);
+}
+
+async function setup(db) {
+  return withTransaction(db, async (tx) => {
+    const institute = await tx.run("INSERT INTO institutes (name) VALUES ('Bench Institute')");
+    const instituteId = institute.lastID;
+    const user = await tx.run(
+      `INSERT INTO users (institute_id, full_name, email, password_hash, role)
+       VALUES (?, 'Bench Teacher', 'bench@example.com', 'x', 'TEACHER')`,
+      [instituteId]
+    );
+    const batch = await tx.run(
+      `INSERT INTO batches (institute_id, name, course, schedule, start_date)
+       VALUES (?, 'Bench Batch', 'Bench', 'Daily', '2024-01-01')`,
+      [instituteId]
+    );
+    const studentIds = [];
+    for (let i = 0; i < studentCount; i += 1) {
+      const student = await tx.run(
+        "INSERT INTO students (institute_id, full_name, join_date, status) VALUES (?, ?, '2024-01-01', 'ACTIVE')",
+        [instituteId, `Bench Student ${i + 1}`]
+      );
+      studentIds.push(student.lastID);
+      await tx.run("INSERT INTO student_batches (institute_id, student_id, batch_id) VALUES (?, ?, ?)", [
+        instituteId,
+        student.lastID,
+        batch.lastID
+      ]);
+    }
+    return { instituteId, userId: user.lastID, batchId: batch.lastID, studentIds };
+  });
+}
+
+function records(studentIds, day) {
+  return studentIds.map((studentId) => ({ student_id: studentId, status: (studentId + day) % 5 ? "PRESENT" : "ABSENT" }));
+}
+
+// The pre-bulk implementation of POST /attendance/mark: five autocommitted statements per student.
+async function markPerRow(db, { instituteId, userId, batchId }, date, rows) {
+  for (const record of rows) {
+    const existing = await db.get(
+      "SELECT * FROM attendance WHERE institute_id = ? AND batch_id = ? AND date = ? AND student_id = ?",
+      [instituteId, batchId, date, record.student_id]
+    );
+    let id;
+    if (existing) {
+      await db.run("UPDATE attendance SET status = ?, marked_by = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?", [
+        record.status,
+        userId,
+        existing.id
+      ]);
+      id = existing.id;
+    } else {
+      const created = await db.run(
+        `INSERT INTO attendance (institute_id, batch_id, student_id, date, status, marked_by)
+         VALUES (?, ?, ?, ?, ?, ?)`,
+        [instituteId, batchId, record.student_id, date, record.status, userId]
+      );
+      id = created.lastID;
+    }
+    await createAuditLog(db, {
+      instituteId,
+      actorUserId: userId,
+      action: existing ? "ATTENDANCE_UPDATED" : "ATTENDANCE_CREATED",
+      entity: "attendance",
+      entityId: id,
+      before: existing ? { status: existing.status } : null,
+      after: { status: record.status }
+    });
+    await db.get("SELECT * FROM attendance WHERE id = ?", [id]);
+  }
+}
+
+async function markBulk(db, { instituteId, userId, batchId }, date, rows) {
+  await markAttendance(db, {
+    instituteId,
+    actorUserId: userId,
+    entries: rows.map((record) => ({ ...record, batch_id: batchId, date }))
+  });
+}
+
+async function measure(label, days, mark) {
+  const startedAt = process.hrtime.bigint();
+  for (const day of days) {
+    await mark(day);
+  }
+  const elapsedMs = Number(process.hrtime.bigint() - startedAt) / 1e6;
+  const rows = days.length * studentCount;
+  process.stdout.write(
+    `${label.padEnd(22)} ${String(rows).padStart(7)} rows  ${elapsedMs.toFixed(0).padStart(7)} ms  ` +
+      `${(elapsedMs / days.length).toFixed(1).padStart(7)} ms/batch  ${Math.round((rows / elapsedMs) * 1000).toString().padStart(7)} rows/s\n`
+  );
+}
+
+async function runBench() {
+  await initializeSchema();
+  const db = await connectDb();
+  const context = await setup(db);
+  const legacyDays = Array.from({ length: dayCount }, (_, i) => i);
+  const bulkDays = Array.from({ length: dayCount }, (_, i) => dayCount + i);
+
+  process.stdout.write(`Marking ${studentCount} students x ${dayCount} days\n`);
+  await measure("per-row insert", legacyDays, (day) => markPerRow(db, context, isoDate(day), records(context.studentIds, day)));
+  await measure("per-row update", legacyDays, (day) => markPerRow(db, context, isoDate(day), records(context.studentIds, day + 1)));
+  await measure("bulk upsert insert", bulkDays, (day) => markBulk(db, context, isoDate(day), records(context.studentIds, day)));
+  await measure("bulk upsert update", bulkDays, (day) => markBulk(db, context, isoDate(day), records(context.studentIds, day + 1)));
+  await closeDb();
+}
+
+runBench()
+  .catch((error) => {
+    process.stderr.write(`Benchmark failed: ${error.message}\n`);
+    process.exitCode = 1;
+  })
+  .finally(() => {
+    for (const suffix of ["", "-wal", "-shm"]) {
+      fs.rmSync(`${dbFile}${suffix}`, { force: true });
+    }
+  });
@@ -0,0 +1,301 @@
+// Builds a large synthetic dataset for load tests and query profiling: institutes with
+// admins, teachers, batches, students (each with a login), fees, payments and a daily
+// attendance history. Writes the database plus a <db>.manifest.json with logins and ids
+// for bench/load.js.
+//
+// Usage: node bench/generate-data.js [--db=path] [--institutes=5] [--students=5000]
+//          [--batches=10] [--teachers=4] [--days=90] [--payments=2] [--seed=1] [--force]
+// --students is the total across all institutes; --payments is the most payments per fee.
+const fs = require("fs");
+const os = require("os");
+const path = require("path");
+
+function parseArgs(argv) {
+  const options = {};
+  for (const arg of argv) {
+    const match = /^--([\w-]+)(?:=(.*))?$/.exec(arg);
+    if (match) {
+      options[match[1]] = match[2] === undefined ? true : match[2];
+    }
+  }
+  return options;
+}
+
+const args = parseArgs(process.argv.slice(2));
+const options = {
+  dbFile: path.resolve(args.db || path.join(os.tmpdir(), "cms-bench.db")),
+  institutes: Math.max(Number(args.institutes) || 5, 1),
+  students: Math.max(Number(args.students) || 5000, 1),
+  batches: Math.max(Number(args.batches) || 10, 1),
+  teachers: Math.max(Number(args.teachers) || 4, 1),
+  days: Math.max(Number(args.days) || 90, 0),
+  payments: Math.max(Number(args.payments ?? 2), 0),
+  seed: Number(args.seed) || 1,
+  force: Boolean(args.force)
+};
+
+if (fs.existsSync(options.dbFile)) {
+  if (!options.force) {
+    process.stderr.write(`${options.dbFile} already exists; pass --force to replace it\n`);
+    process.exit(1);
+  }
+  for (const suffix of ["", "-wal", "-shm"]) {
+    fs.rmSync(`${options.dbFile}${suffix}`, { force: true });
+  }
+}
+process.env.DATABASE_URL = `sqlite:///${options.dbFile}`;
+
+const { connectDb, closeDb, initializeSchema, withTransaction } = require("../src/db");
+const { hashPassword } = require("../src/auth");
+const { rebuildFeeBalances } = require("../src/services");
+const { closeWorkerPool } = require("../src/workers");
+
+const PASSWORD = "Bench@123";
+const MAX_VARIABLES = 999;
+const MANIFEST_STUDENTS_PER_INSTITUTE = 50;
+
+// Deterministic PRNG (mulberry32) so the same flags always produce the same dataset.
+function createRandom(seed) {
+  let state = seed >>> 0;
+  return () => {
+    state = (state + 0x6d2b79f5) >>> 0;
+    let t = state;
+    t = Math.imul(t ^ (t >>> 15), t | 1);
+    t ^= t + Math.imul(t ^ (t >>> 7), t | 61);
+    return ((t ^ (t >>> 14)) >>> 0) / 4294967296;
+  };
+}
+
+const random = createRandom(options.seed);
+
+function pick(items) {
+  return items[Math.floor(random() * items.length)];
+}
+
+function isoDateOffset(days) {
+  const date = new Date();
+  date.setUTCHours(0, 0, 0, 0);
+  date.setUTCDate(date.getUTCDate() + days);
+  return date.toISOString().slice(0, 10);
+}
+
+// Multi-row INSERTs sized to stay under SQLite's default variable limit. With `returning`,
+// yields the new ids in row order: AUTOINCREMENT ids within one statement are ascending.
+async function insertRows(tx, table, columns, rows, { returning = false } = {}) {
+  const perStatement = Math.max(Math.floor(MAX_VARIABLES / columns.length), 1);
+  const placeholders = `(${columns.map(() => "?").join(", ")})`;
+  const ids = [];
+  for (let start = 0; start < rows.length; start += perStatement) {
+    const chunk = rows.slice(start, start + perStatement);
+    const sql = `INSERT INTO ${table} (${columns.join(", ")}) VALUES ${chunk.map(() => placeholders).join(", ")}`;
+    const params = chunk.flat();
+    if (returning) {
+      const inserted = await tx.all(`${sql} RETURNING id`, params);
+      ids.push(...inserted.map((row) => row.id).sort((a, b) => a - b));
+    } else {
+      await tx.run(sql, params);
+    }
+  }
+  return ids;
+}
+
+const counts = { institutes: 0, users: 0, batches: 0, students: 0, student_fees: 0, payments: 0, attendance: 0 };
+
+function studentsForInstitute(index) {
+  const base = Math.floor(options.students / options.institutes);
+  return base + (index < options.students % options.institutes ? 1 : 0);
+}
+
+async function generateInstitute(db, index, passwordHash) {
+  const tag = `i${index + 1}`;
+  const studentCount = studentsForInstitute(index);
+  const institute = await withTransaction(db, async (tx) => {
+    const created = await tx.run("INSERT INTO institutes (name) VALUES (?)", [`Bench Institute ${index + 1}`]);
+    const instituteId = created.lastID;
+    const adminEmail = `admin@${tag}.bench`;
+    await insertRows(
+      tx,
+      "users",
+      ["institute_id", "full_name", "email", "password_hash", "role"],
+      [[instituteId, `Admin ${tag}`, adminEmail, passwordHash, "ADMIN"]]
+    );
+    const teacherEmails = Array.from({ length: options.teachers }, (_, i) => `teacher${i + 1}@${tag}.bench`);
+    const teacherIds = await insertRows(
+      tx,
+      "users",
+      ["institute_id", "full_name", "email", "password_hash", "role"],
+      teacherEmails.map((email, i) => [instituteId, `Teacher ${i + 1} ${tag}`, email, passwordHash, "TEACHER"]),
+      { returning: true }
+    );
+    const plan = await tx.run(
+      `INSERT INTO fee_plans (institute_id, name, type, amount, metadata_json)
+       VALUES (?, 'Bench Quarterly', 'QUARTERLY', 9000, ?)`,
+      [instituteId, JSON.stringify({ months: 3 })]
+    );
+    const batchIds = await insertRows(
+      tx,
+      "batches",
+      ["institute_id", "name", "course", "schedule", "teacher_id", "start_date", "end_date", "fee_plan_id"],
+      Array.from({ length: options.batches }, (_, i) => [
+        instituteId,
+        `Batch ${i + 1} ${tag}`,
+        `Course ${(i % 6) + 1}`,
+        "Mon-Sat 07:00 AM - 08:30 AM",
+        teacherIds[i % teacherIds.length],
+        isoDateOffset(-options.days - 30),
+        isoDateOffset(180),
+        plan.lastID
+      ]),
+      { returning: true }
+    );
+
+    const studentIds = await insertRows(
+      tx,
+      "students",
+      ["institute_id", "full_name", "phone", "email", "guardian_name", "join_date", "status"],
+      Array.from({ length: studentCount }, (_, i) => [
+        instituteId,
+        `Student ${i + 1} ${tag}`,
+        `9${String(index * 1000000 + i).padStart(9, "0")}`,
+        `student${i + 1}@${tag}.bench`,
+        `Guardian ${i + 1}`,
+        isoDateOffset(-options.days - Math.floor(random() * 60)),
+        random() < 0.97 ? "ACTIVE" : "DISABLED"
+      ]),
+      { returning: true }
+    );
+    await insertRows(
+      tx,
+      "users",
+      ["institute_id", "full_name", "email", "password_hash", "role", "student_id"],
+      studentIds.map((studentId, i) => [instituteId, `Student ${i + 1} ${tag}`, `student${i + 1}@${tag}.bench`, passwordHash, "STUDENT", studentId])
+    );
+    const studentBatch = studentIds.map((studentId, i) => [studentId, batchIds[i % batchIds.length]]);
+    await insertRows(
+      tx,
+      "student_batches",
+      ["institute_id", "student_id", "batch_id"],
+      studentBatch.map(([studentId, batchId]) => [instituteId, studentId, batchId])
+    );
+
+    const fees = studentBatch.map(([studentId, batchId]) => {
+      const total = pick([6000, 9000, 12000, 15000]);
+      const discount = pick([0, 0, 0, 500, 1000]);
+      const installment = ((total - discount) / 3).toFixed(2);
+      const firstDue = -Math.floor(random() * 60);
+      return {
+        studentId,
+        batchId,
+        total,
+        discount,
+        schedule: [0, 30, 60].map((offset) => ({ due_date: isoDateOffset(firstDue + offset), amount: installment }))
+      };
+    });
+    const feeIds = await insertRows(
+      tx,
+      "student_fees",
+      ["institute_id", "student_id", "batch_id", "fee_plan_id", "total_fee", "discount", "due_schedule_json"],
+      fees.map((fee) => [instituteId, fee.studentId, fee.batchId, plan.lastID, fee.total, fee.discount, JSON.stringify(fee.schedule)]),
+      { returning: true }
+    );
+
+    const payments = [];
+    fees.forEach((fee, i) => {
+      const paymentCount = Math.floor(random() * (options.payments + 1));
+      for (let k = 0; k < paymentCount; k += 1) {
+        const paidOn = isoDateOffset(-Math.floor(random() * Math.max(options.days, 1)));
+        payments.push([
+          instituteId,
+          feeIds[i],
+          Number(fee.schedule[k % fee.schedule.length].amount),
+          paidOn,
+          pick(["CASH", "UPI", "BANK"]),
+          `BENCH-${tag}-${feeIds[i]}-${k + 1}`,
+          teacherIds[0],
+          `${paidOn} 10:00:00`
+        ]);
+      }
+    });
+    await insertRows(
+      tx,
+      "payments",
+      ["institute_id", "student_fee_id", "amount", "paid_on", "mode", "receipt_no", "created_by", "created_at"],
+      payments
+    );
+
+    counts.institutes += 1;
+    counts.users += 1 + teacherIds.length + studentIds.length;
+    counts.batches += batchIds.length;
+    counts.students += studentIds.length;
+    counts.student_fees += feeIds.length;
+    counts.payments += payments.length;
+    return {
+      id: instituteId,
+      admin_email: adminEmail,
+      teacher_emails: teacherEmails,
+      teacher_ids: teacherIds,
+      batch_ids: batchIds,
+      students: studentBatch.slice(0, MANIFEST_STUDENTS_PER_INSTITUTE).map(([studentId, batchId], i) => ({
+        id: studentId,
+        email: `student${i + 1}@${tag}.bench`,
+        batch_id: batchId
+      })),
+      studentBatch
+    };
+  });
+
+  // One transaction per batch keeps the WAL bounded on multi-million row histories.
+  for (const batchId of institute.batch_ids) {
+    const roster = institute.studentBatch.filter(([, id]) => id === batchId).map(([studentId]) => studentId);
+    const markedBy = institute.teacher_ids[institute.batch_ids.indexOf(batchId) % institute.teacher_ids.length];
+    await withTransaction(db, async (tx) => {
+      for (let day = options.days; day >= 1; day -= 1) {
+        const date = isoDateOffset(-day);
+        const rows = roster.map((studentId) => [
+          institute.id,
+          batchId,
+          studentId,
+          date,
+          random() < 0.85 ? "PRESENT" : "ABSENT",
+          markedBy,
+          `${date} 09:00:00`
+        ]);
+        await insertRows(tx, "attendance", ["institute_id", "batch_id", "student_id", "date", "status", "marked_by", "created_at"], rows);
+        counts.attendance += rows.length;
+      }
+    });
+  }
+
+  const { studentBatch, ...manifestEntry } = institute;
+  return manifestEntry;
+}
+
+async function generate() {
+  const startedAt = Date.now();
+  await initializeSchema();
+  const db = await connectDb();
+  // Every generated login shares one password, so hash it once.
+  const passwordHash = await hashPassword(PASSWORD);
+  const institutes = [];
+  for (let i = 0; i < options.institutes; i += 1) {
+    institutes.push(await generateInstitute(db, i, passwordHash));
+    process.stdout.write(`Institute ${i + 1}/${options.institutes} done (${counts.attendance} attendance rows so far)\n`);
+  }
+  await rebuildFeeBalances(db);
+  await db.exec("ANALYZE;");
+  await closeDb();
+  await closeWorkerPool();
+
+  const manifestFile = `${options.dbFile}.manifest.json`;
+  fs.writeFileSync(
+    manifestFile,
+    JSON.stringify({ database: options.dbFile, password: PASSWORD, options, counts, institutes }, null, 2)
+  );
+  process.stdout.write(`Generated ${JSON.stringify(counts)} in ${((Date.now() - startedAt) / 1000).toFixed(1)}s\n`);
+  process.stdout.write(`Database: ${options.dbFile}\nManifest: ${manifestFile}\n`);
+}
+
+generate().catch((error) => {
+  process.stderr.write(`Data generation failed: ${error.message}\n`);
+  process.exitCode = 1;
+});
@@ -0,0 +1,336 @@
+// Scripted HTTP load against the API using a dataset from bench/generate-data.js. Starts
+// the server on the generated database (or targets --url), runs `--connections` virtual
+// users for `--duration` seconds over a weighted mix of scenarios, then prints per-scenario
+// latency percentiles and the server's own per-route and per-query numbers from
+// GET /metrics (authenticated with METRICS_TOKEN, generated for a server started here).
+//
+// Usage: node bench/load.js [--manifest=path] [--url=http://host:port/api/v1]
+//          [--duration=20] [--connections=10] [--scenarios=a,b] [--json]
+const fs = require("fs");
+const net = require("net");
+const os = require("os");
+const path = require("path");
+const crypto = require("crypto");
+const { spawn } = require("child_process");
+
+function parseArgs(argv) {
+  const options = {};
+  for (const arg of argv) {
+    const match = /^--([\w-]+)(?:=(.*))?$/.exec(arg);
+    if (match) {
+      options[match[1]] = match[2] === undefined ? true : match[2];
+    }
+  }
+  return options;
+}
+
+const args = parseArgs(process.argv.slice(2));
+const options = {
+  manifestFile: path.resolve(args.manifest || path.join(os.tmpdir(), "cms-bench.db.manifest.json")),
+  url: args.url || null,
+  durationMs: Math.max(Number(args.duration) || 20, 1) * 1000,
+  connections: Math.max(Number(args.connections) || 10, 1),
+  scenarios: args.scenarios ? String(args.scenarios).split(",") : null,
+  json: Boolean(args.json)
+};
+
+const SESSION_INSTITUTES = 5;
+const SESSION_STUDENTS = 5;
+
+function pick(items) {
+  return items[Math.floor(Math.random() * items.length)];
+}
+
+function isoDateOffset(days) {
+  const date = new Date();
+  date.setUTCDate(date.getUTCDate() + days);
+  return date.toISOString().slice(0, 10);
+}
+
+// Each scenario builds one request from a random institute's sessions.
+const SCENARIOS = {
+  login: {
+    weight: 1,
+    request: ({ institute, manifest }) => ({
+      method: "POST",
+      path: "/auth/login",
+      body: { email: pick(institute.students).email, password: manifest.password }
+    })
+  },
+  "admin-dashboard": {
+    weight: 2,
+    request: ({ institute }) => ({ method: "GET", path: "/dashboard/admin", token: institute.adminToken })
+  },
+  "student-dashboard": {
+    weight: 3,
+    request: ({ institute }) => ({ method: "GET", path: "/dashboard/student", token: pick(institute.studentTokens) })
+  },
+  dues: {
+    weight: 2,
+    request: ({ institute }) => ({
+      method: "GET",
+      path: `/fees/dues?batch_id=${pick(institute.batch_ids)}`,
+      token: institute.adminToken
+    })
+  },
+  "attendance-mark": {
+    weight: 2,
+    request: ({ institute, manifest }) => {
+      const batchId = pick(institute.students).batch_id;
+      const roster = institute.students.filter((student) => student.batch_id === batchId);
+      return {
+        method: "POST",
+        path: "/attendance/mark",
+        token: institute.teacherToken,
+        body: {
+          batch_id: batchId,
+          date: isoDateOffset(-1 - Math.floor(Math.random() * Math.max(manifest.options.days, 1))),
+          records: roster.map((student) => ({ student_id: student.id, status: Math.random() < 0.85 ? "PRESENT" : "ABSENT" }))
+        }
+      };
+    }
+  },
+  "attendance-export": {
+    weight: 1,
+    request: ({ institute }) => ({
+      method: "GET",
+      path: `/attendance/export?batch_id=${pick(institute.batch_ids)}&date_from=${isoDateOffset(-30)}`,
+      token: institute.adminToken
+    })
+  },
+  "dues-export": {
+    weight: 1,
+    request: ({ institute }) => ({ method: "GET", path: "/fees/dues/export", token: institute.adminToken })
+  }
+};
+
+async function send(baseUrl, { method, path: requestPath, token, body }) {
+  const response = await fetch(`${baseUrl}${requestPath}`, {
+    method,
+    headers: {
+      ...(body ? { "content-type": "application/json" } : {}),
+      ...(token ? { authorization: `Bearer ${token}` } : {})
+    },
+    body: body ? JSON.stringify(body) : undefined
+  });
+  const payload = Buffer.from(await response.arrayBuffer());
+  return { status: response.status, bytes: payload.length, payload };
+}
+
+async function login(baseUrl, email, password) {
+  const response = await send(baseUrl, { method: "POST", path: "/auth/login", body: { email, password } });
+  if (response.status !== 200) {
+    throw new Error(`Login as ${email} failed with ${response.status}: ${response.payload.toString()}`);
+  }
+  return JSON.parse(response.payload.toString()).access_token;
+}
+
+function freePort() {
+  return new Promise((resolve, reject) => {
+    const server = net.createServer();
+    server.once("error", reject);
+    server.listen(0, "127.0.0.1", () => {
+      const { port } = server.address();
+      server.close(() => resolve(port));
+    });
+  });
+}
+
+async function startServer(manifest, metricsToken) {
+  const port = await freePort();
+  const child = spawn(process.execPath, [...process.execArgv, path.join(__dirname, "..", "src", "server.js")], {
+    env: {
+      ...process.env,
+      PORT: String(port),
+      DATABASE_URL: `sqlite:///${manifest.database}`,
+      STORAGE_DIR: path.join(os.tmpdir(), "cms-bench-storage"),
+      RUN_SCHEDULER: "false",
+      RATE_LIMIT_PER_MINUTE: "100000000",
+      METRICS_TOKEN: metricsToken
+    },
+    stdio: ["ignore", "ignore", "inherit"]
+  });
+  const baseUrl = `http://127.0.0.1:${port}/api/v1`;
+  const deadline = Date.now() + 30000;
+  while (Date.now() < deadline) {
+    if (child.exitCode != null) {
+      throw new Error(`Server exited with code ${child.exitCode}`);
+    }
+    try {
+      if ((await fetch(`${baseUrl}/health`)).ok) {
+        return { child, baseUrl };
+      }
+    } catch (_error) {
+      // Not listening yet.
+    }
+    await new Promise((resolve) => setTimeout(resolve, 200));
+  }
+  child.kill();
+  throw new Error("Server did not become healthy within 30s");
+}
+
+async function openSessions(baseUrl, manifest) {
+  const institutes = [];
+  for (const institute of manifest.institutes.slice(0, SESSION_INSTITUTES)) {
+    if (!institute.students.length) {
+      continue;
+    }
+    const studentTokens = [];
+    for (const student of institute.students.slice(0, SESSION_STUDENTS)) {
+      studentTokens.push(await login(baseUrl, student.email, manifest.password));
+    }
+    institutes.push({
+      ...institute,
+      adminToken: await login(baseUrl, institute.admin_email, manifest.password),
+      teacherToken: await login(baseUrl, institute.teacher_emails[0], manifest.password),
+      studentTokens
+    });
+  }
+  if (!institutes.length) {
+    throw new Error("Manifest has no institutes with students");
+  }
+  return institutes;
+}
+
+function percentile(sorted, q) {
+  if (!sorted.length) {
+    return null;
+  }
+  return sorted[Math.min(Math.ceil(q * sorted.length) - 1, sorted.length - 1)];
+}
+
+function summarize(name, stats, elapsedMs) {
+  const sorted = [...stats.latencies].sort((a, b) => a - b);
+  const round = (value) => (value == null ? null : Number(value.toFixed(2)));
+  return {
+    scenario: name,
+    requests: sorted.length,
+    rps: round((sorted.length / elapsedMs) * 1000),
+    errors: stats.errors,
+    statuses: stats.statuses,
+    mean_ms: round(sorted.reduce((acc, value) => acc + value, 0) / (sorted.length || 1)),
+    p50_ms: round(percentile(sorted, 0.5)),
+    p95_ms: round(percentile(sorted, 0.95)),
+    p99_ms: round(percentile(sorted, 0.99)),
+    max_ms: round(sorted[sorted.length - 1] ?? null),
+    kb_per_request: round(stats.bytes / 1024 / (sorted.length || 1))
+  };
+}
+
+async function runLoad(baseUrl, manifest, institutes, scenarioNames) {
+  const weighted = scenarioNames.flatMap((name) => Array(SCENARIOS[name].weight).fill(name));
+  const stats = Object.fromEntries(scenarioNames.map((name) => [name, { latencies: [], errors: 0, statuses: {}, bytes: 0 }]));
+  const startedAt = Date.now();
+  const stopAt = startedAt + options.durationMs;
+
+  async function virtualUser() {
+    while (Date.now() < stopAt) {
+      const name = pick(weighted);
+      const entry = stats[name];
+      const request = SCENARIOS[name].request({ institute: pick(institutes), manifest });
+      const start = process.hrtime.bigint();
+      try {
+        const response = await send(baseUrl, request);
+        entry.statuses[response.status] = (entry.statuses[response.status] || 0) + 1;
+        entry.bytes += response.bytes;
+        if (response.status >= 400) {
+          entry.errors += 1;
+        }
+      } catch (_error) {
+        entry.statuses.network = (entry.statuses.network || 0) + 1;
+        entry.errors += 1;
+      }
+      entry.latencies.push(Number(process.hrtime.bigint() - start) / 1e6);
+    }
+  }
+
+  await Promise.all(Array.from({ length: options.connections }, virtualUser));
+  const elapsedMs = Date.now() - startedAt;
+  return scenarioNames.map((name) => summarize(name, stats[name], elapsedMs));
+}
+
+function printTable(title, columns, rows) {
+  const widths = columns.map(([header, value]) => Math.max(header.length, ...rows.map((row) => String(value(row)).length)));
+  const line = (cells) => cells.map((cell, i) => String(cell).padStart(widths[i])).join("  ");
+  process.stdout.write(`\n${title}\n${line(columns.map(([header]) => header))}\n`);
+  for (const row of rows) {
+    process.stdout.write(`${line(columns.map(([, value]) => value(row)))}\n`);
+  }
+}
+
+function printReport(results, metrics) {
+  printTable(
+    `Client-side latency (${options.connections} connections, ${options.durationMs / 1000}s)`,
+    [
+      ["scenario", (row) => row.scenario],
+      ["requests", (row) => row.requests],
+      ["rps", (row) => row.rps],
+      ["errors", (row) => row.errors],
+      ["p50 ms", (row) => row.p50_ms],
+      ["p95 ms", (row) => row.p95_ms],
+      ["p99 ms", (row) => row.p99_ms],
+      ["max ms", (row) => row.max_ms]
+    ],
+    results
+  );
+  if (!metrics) {
+    return;
+  }
+  printTable(
+    "Server routes (queries/request exposes N+1 patterns)",
+    [
+      ["route", (row) => row.route],
+      ["requests", (row) => row.requests],
+      ["p95 ms", (row) => row.latency_ms.p95],
+      ["queries/req", (row) => row.queries_per_request.mean],
+      ["max queries", (row) => row.queries_per_request.max],
+      ["db ms/req", (row) => row.query_ms_per_request]
+    ],
+    metrics.routes
+  );
+  printTable(
+    "Slowest queries by total time",
+    [
+      ["count", (row) => row.count],
+      ["total ms", (row) => row.total_ms],
+      ["mean ms", (row) => row.mean_ms],
+      ["max ms", (row) => row.max_ms],
+      ["sql", (row) => (row.sql.length > 100 ? `${row.sql.slice(0, 97)}...` : row.sql).padEnd(100)]
+    ],
+    metrics.queries.slice(0, 15)
+  );
+}
+
+async function main() {
+  const manifest = JSON.parse(fs.readFileSync(options.manifestFile, "utf8"));
+  const scenarioNames = options.scenarios || Object.keys(SCENARIOS);
+  const unknown = scenarioNames.filter((name) => !SCENARIOS[name]);
+  if (unknown.length) {
+    throw new Error(`Unknown scenarios: ${unknown.join(", ")} (available: ${Object.keys(SCENARIOS).join(", ")})`);
+  }
+  const metricsToken = process.env.METRICS_TOKEN || (options.url ? "" : crypto.randomBytes(16).toString("hex"));
+  const server = options.url
+    ? { child: null, baseUrl: options.url.replace(/\/$/, "") }
+    : await startServer(manifest, metricsToken);
+  try {
+    const institutes = await openSessions(server.baseUrl, manifest);
+    await send(server.baseUrl, { method: "POST", path: "/metrics/reset", token: metricsToken });
+    const results = await runLoad(server.baseUrl, manifest, institutes, scenarioNames);
+    const metricsResponse = await send(server.baseUrl, { method: "GET", path: "/metrics", token: metricsToken });
+    const metrics = metricsResponse.status === 200 ? JSON.parse(metricsResponse.payload.toString()) : null;
+    if (options.json) {
+      process.stdout.write(`${JSON.stringify({ options, results, metrics }, null, 2)}\n`);
+    } else {
+      printReport(results, metrics);
+    }
+  } finally {
+    if (server.child) {
+      server.child.kill("SIGTERM");
+    }
+  }
+}
+
+main().catch((error) => {
+  process.stderr.write(`Load run failed: ${error.message}\n`);
+  process.exitCode = 1;
+});
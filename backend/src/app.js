@@ -3,9 +3,11 @@ const cors = require("cors");
 const rateLimit = require("express-rate-limit");
 const config = require("./config");
 const routes = require("./routes");
+const { requestMetrics } = require("./instrumentation");
 
 function createApp() {
   const app = express();
+  app.use(requestMetrics());
   app.use(express.json({ limit: "10mb" }));
   app.use(express.urlencoded({ extended: true }));
   app.use(
@@ -1,24 +1,17 @@
-const crypto = require("crypto");
-const bcrypt = require("bcryptjs");
 const jwt = require("jsonwebtoken");
 const config = require("./config");
 const { connectDb } = require("./db");
+const { runTask } = require("./workers");
+const { loadPrincipal } = require("./cache");
 
+// bcrypt and PBKDF2 take tens to hundreds of milliseconds of CPU, so both run on the
+// worker pool instead of the request thread.
 function hashPassword(password) {
-  return bcrypt.hashSync(password, 12);
+  return runTask("hashPassword", { password });
 }
 
 function verifyPassword(password, packedHash) {
-  const raw = String(packedHash || "");
-  if (raw.startsWith("$2a$") || raw.startsWith("$2b$") || raw.startsWith("$2y$")) {
-    return bcrypt.compareSync(password, raw);
-  }
-  const [salt, expected] = raw.split(":");
-  if (!salt || !expected) {
-    return false;
-  }
-  const actual = crypto.pbkdf2Sync(password, salt, 120000, 64, "sha512").toString("hex");
-  return crypto.timingSafeEqual(Buffer.from(actual, "hex"), Buffer.from(expected, "hex"));
+  return runTask("verifyPassword", { password, packedHash });
 }
 
 function createToken(user, tokenType, expiresInMinutes) {
@@ -64,7 +57,7 @@ async function requireAuth(req, res, next) {
     return unauthorized(res);
   }
   const db = await connectDb();
-  const user = await db.get("SELECT * FROM users WHERE id = ?", [Number(payload.sub)]);
+  const user = await loadPrincipal(db, Number(payload.sub));
   if (!user || !user.is_active) {
     return unauthorized(res, "Inactive user");
   }
@@ -0,0 +1,39 @@
+const { initializeSchema, connectDb } = require("./db");
+const { rebuildFeeBalances, verifyFeeBalances } = require("./services");
+
+function parseArgs(argv) {
+  const [command = "verify", ...rest] = argv;
+  const instituteArg = rest.find((item) => item.startsWith("--institute="));
+  return {
+    command,
+    instituteId: instituteArg ? Number(instituteArg.split("=")[1]) : null
+  };
+}
+
+async function runBalances() {
+  const { command, instituteId } = parseArgs(process.argv.slice(2));
+  await initializeSchema();
+  const db = await connectDb();
+
+  if (command === "rebuild") {
+    const count = await rebuildFeeBalances(db, { instituteId });
+    process.stdout.write(`Rebuilt ${count} fee balance rows.\n`);
+    return;
+  }
+  if (command !== "verify") {
+    throw new Error(`Unknown command "${command}". Use "rebuild" or "verify".`);
+  }
+  const { checked, mismatches } = await verifyFeeBalances(db, { instituteId });
+  for (const item of mismatches) {
+    process.stdout.write(`Mismatch for student_fee ${item.student_fee_id}: ${JSON.stringify(item)}\n`);
+  }
+  process.stdout.write(`Checked ${checked} fee balance rows, ${mismatches.length} mismatched.\n`);
+  if (mismatches.length) {
+    process.exitCode = 1;
+  }
+}
+
+runBalances().catch((error) => {
+  process.stderr.write(`Balance command failed: ${error.message}\n`);
+  process.exit(1);
+});
@@ -0,0 +1,150 @@
+const config = require("./config");
+const { USER_BY_ID_SQL, STUDENT_BATCH_IDS_SQL } = require("./queries");
+
+// In-process cache with per-entry TTL and least-recently-used eviction once `capacity`
+// entries are held. getOrLoad shares one in-flight load per key, and a delete() that lands
+// while a load is running keeps that load's (possibly stale) result out of the cache.
+// Entries are per process: writes made by another process show up after at most `ttlMs`.
+class TtlLruCache {
+  constructor({ name, capacity, ttlMs }) {
+    this.name = name;
+    this.capacity = capacity;
+    this.ttlMs = ttlMs;
+    this.entries = new Map();
+    this.loading = new Map();
+    this.hits = 0;
+    this.misses = 0;
+    this.evictions = 0;
+    this.invalidations = 0;
+  }
+
+  enabled() {
+    return this.ttlMs > 0 && this.capacity > 0;
+  }
+
+  get(key) {
+    const entry = this.entries.get(key);
+    if (!entry) {
+      return undefined;
+    }
+    if (entry.expiresAt <= Date.now()) {
+      this.entries.delete(key);
+      return undefined;
+    }
+    this.entries.delete(key);
+    this.entries.set(key, entry);
+    return entry.value;
+  }
+
+  set(key, value) {
+    if (!this.enabled()) {
+      return;
+    }
+    this.entries.delete(key);
+    this.entries.set(key, { value, expiresAt: Date.now() + this.ttlMs });
+    while (this.entries.size > this.capacity) {
+      this.entries.delete(this.entries.keys().next().value);
+      this.evictions += 1;
+    }
+  }
+
+  async getOrLoad(key, loader) {
+    const cached = this.get(key);
+    if (cached !== undefined) {
+      this.hits += 1;
+      return cached;
+    }
+    this.misses += 1;
+    let pending = this.loading.get(key);
+    if (!pending) {
+      pending = Promise.resolve()
+        .then(loader)
+        .then((value) => {
+          if (this.loading.get(key) === pending && value != null) {
+            this.set(key, value);
+          }
+          return value;
+        })
+        .finally(() => {
+          if (this.loading.get(key) === pending) {
+            this.loading.delete(key);
+          }
+        });
+      this.loading.set(key, pending);
+    }
+    return pending;
+  }
+
+  delete(key) {
+    this.entries.delete(key);
+    this.loading.delete(key);
+    this.invalidations += 1;
+  }
+
+  clear() {
+    this.entries.clear();
+    this.loading.clear();
+    this.invalidations += 1;
+  }
+
+  stats() {
+    const lookups = this.hits + this.misses;
+    return {
+      name: this.name,
+      size: this.entries.size,
+      capacity: this.capacity,
+      ttl_ms: this.ttlMs,
+      hits: this.hits,
+      misses: this.misses,
+      hit_rate: lookups ? Number((this.hits / lookups).toFixed(4)) : null,
+      evictions: this.evictions,
+      invalidations: this.invalidations
+    };
+  }
+}
+
+const principalCache = new TtlLruCache({
+  name: "principals",
+  capacity: config.authCacheMaxEntries,
+  ttlMs: config.authCacheTtlMs
+});
+
+const batchMembershipCache = new TtlLruCache({
+  name: "student_batches",
+  capacity: config.authCacheMaxEntries,
+  ttlMs: config.authCacheTtlMs
+});
+
+// The user row behind an access token. Callers get their own copy, so handlers can't
+// change what the next request sees. No route updates a users row, so nothing
+// invalidates these entries: a row changed in the database (deactivation, role change)
+// takes effect once its entry expires, at most AUTH_CACHE_TTL_MS later.
+async function loadPrincipal(db, userId) {
+  const user = await principalCache.getOrLoad(userId, () => db.get(USER_BY_ID_SQL, [userId]));
+  return user ? { ...user } : user;
+}
+
+async function loadStudentBatchIds(db, studentId) {
+  const batchIds = await batchMembershipCache.getOrLoad(studentId, async () => {
+    const links = await db.all(STUDENT_BATCH_IDS_SQL, [studentId]);
+    return links.map((item) => item.batch_id);
+  });
+  return [...batchIds];
+}
+
+// Call after changing a student's student_batches rows.
+function invalidateStudentBatches(studentId) {
+  batchMembershipCache.delete(Number(studentId));
+}
+
+function cacheStats() {
+  return [principalCache.stats(), batchMembershipCache.stats()];
+}
+
+module.exports = {
+  TtlLruCache,
+  loadPrincipal,
+  loadStudentBatchIds,
+  invalidateStudentBatches,
+  cacheStats
+};
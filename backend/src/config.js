@@ -1,3 +1,4 @@
+const os = require("os");
 const path = require("path");
 const dotenv = require("dotenv");
 
@@ -17,6 +18,16 @@ function parseIntValue(value, fallback) {
   return Number.isFinite(parsed) ? parsed : fallback;
 }
 
+function parseSynchronous(value) {
+  const mode = String(value || "NORMAL").toUpperCase();
+  return ["OFF", "NORMAL", "FULL", "EXTRA"].includes(mode) ? mode : "NORMAL";
+}
+
+// Leave one core for the event loop; hashing and PDF rendering get the rest, up to four.
+function defaultWorkerPoolSize() {
+  return Math.min(Math.max(os.availableParallelism() - 1, 1), 4);
+}
+
 function databaseFileFromUrl(rawUrl) {
   const url = rawUrl || "sqlite:///./coaching.db";
   if (url.startsWith("sqlite:///")) {
@@ -38,6 +49,18 @@ const config = {
   refreshTokenExpireMinutes: parseIntValue(process.env.REFRESH_TOKEN_EXPIRE_MINUTES, 60 * 24 * 7),
   databaseUrl: process.env.DATABASE_URL || "sqlite:///./coaching.db",
   databaseFile: databaseFileFromUrl(process.env.DATABASE_URL),
+  dbReadPoolSize: Math.max(parseIntValue(process.env.DB_READ_POOL_SIZE, 4), 0),
+  dbStatementCacheSize: Math.max(parseIntValue(process.env.DB_STATEMENT_CACHE_SIZE, 200), 1),
+  dbBusyTimeoutMs: parseIntValue(process.env.DB_BUSY_TIMEOUT_MS, 5000),
+  dbCacheSizeKb: parseIntValue(process.env.DB_CACHE_SIZE_KB, 20000),
+  dbMmapSizeMb: parseIntValue(process.env.DB_MMAP_SIZE_MB, 256),
+  dbSynchronous: parseSynchronous(process.env.DB_SYNCHRONOUS),
+  workerPoolSize: Math.max(parseIntValue(process.env.WORKER_POOL_SIZE, defaultWorkerPoolSize()), 0),
+  workerQueueLimit: Math.max(parseIntValue(process.env.WORKER_QUEUE_LIMIT, 200), 0),
+  authCacheTtlMs: Math.max(parseIntValue(process.env.AUTH_CACHE_TTL_MS, 30000), 0),
+  authCacheMaxEntries: Math.max(parseIntValue(process.env.AUTH_CACHE_MAX_ENTRIES, 10000), 0),
+  metricsEnabled: parseBool(process.env.METRICS_ENABLED, true),
+  metricsToken: process.env.METRICS_TOKEN || "",
   storageDir: path.resolve(projectRoot, process.env.STORAGE_DIR || "./storage"),
   corsOrigins: (process.env.CORS_ORIGINS || "http://localhost:5173,http://127.0.0.1:5173")
     .split(",")
@@ -45,6 +68,8 @@ const config = {
     .filter(Boolean),
   rateLimitPerMinute: parseIntValue(process.env.RATE_LIMIT_PER_MINUTE, 120),
   runScheduler: parseBool(process.env.RUN_SCHEDULER, true),
+  reminderShardIndex: parseIntValue(process.env.REMINDER_SHARD_INDEX, 0),
+  reminderShardCount: Math.max(parseIntValue(process.env.REMINDER_SHARD_COUNT, 1), 1),
   smtpHost: process.env.SMTP_HOST || "",
   smtpPort: parseIntValue(process.env.SMTP_PORT, 587),
   smtpUser: process.env.SMTP_USER || "",
@@ -1,223 +1,318 @@
 const path = require("path");
 const fs = require("fs");
+const { AsyncLocalStorage } = require("async_hooks");
 const { open } = require("sqlite");
 const sqlite3 = require("sqlite3");
 const config = require("./config");
+const migrations = require("./migrations");
+const { timeQuery } = require("./instrumentation");
 
 let db;
+let connecting;
 
-async function connectDb() {
-  if (db) {
-    return db;
+// Set while a withTransaction callback is running, so every query issued from that
+// async call chain goes to the writer inside the open transaction.
+const transactionScope = new AsyncLocalStorage();
+
+function normalizeParams(params) {
+  if (params.length === 1 && Array.isArray(params[0])) {
+    return params[0];
   }
-  fs.mkdirSync(path.dirname(config.databaseFile), { recursive: true });
-  db = await open({
-    filename: config.databaseFile,
-    driver: sqlite3.Database
-  });
-  await db.exec("PRAGMA foreign_keys = ON;");
-  return db;
+  return params;
 }
 
-async function initializeSchema() {
-  const database = await connectDb();
-  await database.exec(`
-    CREATE TABLE IF NOT EXISTS institutes (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      name TEXT NOT NULL UNIQUE,
-      created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-      updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
-    );
+// Cached statements are reference counted: an entry evicted while a query still holds
+// it is finalized when the last holder releases it, not under that query.
+class StatementCache {
+  constructor(connection, capacity) {
+    this.connection = connection;
+    this.capacity = capacity;
+    this.statements = new Map();
+  }
 
-    CREATE TABLE IF NOT EXISTS students (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      institute_id INTEGER NOT NULL,
-      full_name TEXT NOT NULL,
-      phone TEXT,
-      email TEXT,
-      guardian_name TEXT,
-      guardian_phone TEXT,
-      address TEXT,
-      join_date TEXT NOT NULL,
-      status TEXT NOT NULL CHECK(status IN ('ACTIVE', 'DISABLED')),
-      created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-      updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-      FOREIGN KEY (institute_id) REFERENCES institutes(id)
-    );
+  async use(sql, work) {
+    const entry = this.acquire(sql);
+    try {
+      return await work(await entry.pending);
+    } finally {
+      this.release(entry);
+    }
+  }
 
-    CREATE TABLE IF NOT EXISTS users (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      institute_id INTEGER NOT NULL,
-      full_name TEXT NOT NULL,
-      email TEXT NOT NULL UNIQUE,
-      phone TEXT,
-      password_hash TEXT NOT NULL,
-      role TEXT NOT NULL CHECK(role IN ('ADMIN', 'TEACHER', 'STUDENT')),
-      is_active INTEGER NOT NULL DEFAULT 1,
-      student_id INTEGER UNIQUE,
-      created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-      updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-      FOREIGN KEY (institute_id) REFERENCES institutes(id),
-      FOREIGN KEY (student_id) REFERENCES students(id)
-    );
+  acquire(sql) {
+    let entry = this.statements.get(sql);
+    if (entry) {
+      this.statements.delete(sql);
+      this.statements.set(sql, entry);
+    } else {
+      entry = { pending: this.connection.prepare(sql), holders: 0, evicted: false };
+      this.statements.set(sql, entry);
+      entry.pending.catch(() => {
+        if (this.statements.get(sql) === entry) {
+          this.statements.delete(sql);
+        }
+      });
+      if (this.statements.size > this.capacity) {
+        const [oldestSql, oldest] = this.statements.entries().next().value;
+        this.statements.delete(oldestSql);
+        this.evict(oldest);
+      }
+    }
+    entry.holders += 1;
+    return entry;
+  }
 
-    CREATE TABLE IF NOT EXISTS fee_plans (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      institute_id INTEGER NOT NULL,
-      name TEXT NOT NULL,
-      type TEXT NOT NULL CHECK(type IN ('MONTHLY', 'QUARTERLY', 'ONE_TIME', 'CUSTOM')),
-      amount REAL NOT NULL,
-      metadata_json TEXT,
-      created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-      updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-      FOREIGN KEY (institute_id) REFERENCES institutes(id)
-    );
+  release(entry) {
+    entry.holders -= 1;
+    if (entry.evicted && entry.holders === 0) {
+      finalizeEntry(entry);
+    }
+  }
 
-    CREATE TABLE IF NOT EXISTS batches (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      institute_id INTEGER NOT NULL,
-      name TEXT NOT NULL,
-      course TEXT NOT NULL,
-      schedule TEXT NOT NULL,
-      teacher_id INTEGER,
-      start_date TEXT NOT NULL,
-      end_date TEXT,
-      fee_plan_id INTEGER,
-      created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-      updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-      FOREIGN KEY (institute_id) REFERENCES institutes(id),
-      FOREIGN KEY (teacher_id) REFERENCES users(id),
-      FOREIGN KEY (fee_plan_id) REFERENCES fee_plans(id)
-    );
+  evict(entry) {
+    entry.evicted = true;
+    if (entry.holders === 0) {
+      return finalizeEntry(entry);
+    }
+    return null;
+  }
 
-    CREATE TABLE IF NOT EXISTS student_batches (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      institute_id INTEGER NOT NULL,
-      student_id INTEGER NOT NULL,
-      batch_id INTEGER NOT NULL,
-      UNIQUE(student_id, batch_id),
-      FOREIGN KEY (institute_id) REFERENCES institutes(id),
-      FOREIGN KEY (student_id) REFERENCES students(id),
-      FOREIGN KEY (batch_id) REFERENCES batches(id)
-    );
+  async clear() {
+    const entries = [...this.statements.values()];
+    this.statements.clear();
+    await Promise.all(entries.map((entry) => this.evict(entry)));
+  }
+}
 
-    CREATE TABLE IF NOT EXISTS attendance (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      institute_id INTEGER NOT NULL,
-      batch_id INTEGER NOT NULL,
-      student_id INTEGER NOT NULL,
-      date TEXT NOT NULL,
-      status TEXT NOT NULL CHECK(status IN ('PRESENT', 'ABSENT')),
-      marked_by INTEGER NOT NULL,
-      created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-      updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-      UNIQUE(batch_id, student_id, date),
-      FOREIGN KEY (institute_id) REFERENCES institutes(id),
-      FOREIGN KEY (batch_id) REFERENCES batches(id),
-      FOREIGN KEY (student_id) REFERENCES students(id),
-      FOREIGN KEY (marked_by) REFERENCES users(id)
-    );
+function finalizeEntry(entry) {
+  return entry.pending.then((stmt) => stmt.finalize()).catch(() => {});
+}
+
+class WriteQueue {
+  constructor() {
+    this.tail = Promise.resolve();
+  }
 
-    CREATE TABLE IF NOT EXISTS notes (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      institute_id INTEGER NOT NULL,
-      batch_id INTEGER NOT NULL,
-      title TEXT NOT NULL,
-      description TEXT,
-      tags TEXT,
-      file_name TEXT NOT NULL,
-      file_path TEXT NOT NULL UNIQUE,
-      file_type TEXT NOT NULL,
-      created_by INTEGER NOT NULL,
-      created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-      updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-      FOREIGN KEY (institute_id) REFERENCES institutes(id),
-      FOREIGN KEY (batch_id) REFERENCES batches(id),
-      FOREIGN KEY (created_by) REFERENCES users(id)
+  run(task) {
+    const result = this.tail.then(task);
+    this.tail = result.catch(() => {});
+    return result;
+  }
+}
+
+// Exposes the subset of the `sqlite` Database API the app uses. Reads go to a pool of
+// read-only connections, writes and transactions are serialized on one writer, and
+// statements issued through get/all/run are prepared once per connection and reused.
+class DatabasePool {
+  constructor(writer, readers) {
+    this.writer = writer;
+    this.readers = readers;
+    this.nextReader = 0;
+    this.writeQueue = new WriteQueue();
+    this.writerStatements = new StatementCache(writer, config.dbStatementCacheSize);
+    this.readerStatements = new Map(
+      readers.map((reader) => [reader, new StatementCache(reader, config.dbStatementCacheSize)])
     );
+  }
+
+  inTransaction() {
+    return transactionScope.getStore() === this;
+  }
+
+  // Runs `work` with the statement cache of the connection a read should use. Inside a
+  // transaction that is the writer. Without readers (DB_READ_POOL_SIZE=0) reads also go to
+  // the writer, queued like writes so they never run inside another caller's transaction.
+  read(work) {
+    if (this.inTransaction()) {
+      return work(this.writerStatements);
+    }
+    if (!this.readers.length) {
+      return this.writeQueue.run(() => work(this.writerStatements));
+    }
+    const reader = this.readers[this.nextReader];
+    this.nextReader = (this.nextReader + 1) % this.readers.length;
+    return work(this.readerStatements.get(reader));
+  }
+
+  write(task) {
+    if (this.inTransaction()) {
+      return task();
+    }
+    return this.writeQueue.run(task);
+  }
 
-    CREATE TABLE IF NOT EXISTS student_fees (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      institute_id INTEGER NOT NULL,
-      student_id INTEGER NOT NULL,
-      batch_id INTEGER NOT NULL,
-      fee_plan_id INTEGER,
-      total_fee REAL NOT NULL,
-      discount REAL NOT NULL,
-      due_schedule_json TEXT NOT NULL,
-      created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-      updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-      UNIQUE(student_id, batch_id),
-      FOREIGN KEY (institute_id) REFERENCES institutes(id),
-      FOREIGN KEY (student_id) REFERENCES students(id),
-      FOREIGN KEY (batch_id) REFERENCES batches(id),
-      FOREIGN KEY (fee_plan_id) REFERENCES fee_plans(id)
+  get(sql, ...params) {
+    return timeQuery(sql, () =>
+      this.read((statements) =>
+        statements.use(sql, async (stmt) => {
+          try {
+            return await stmt.get(normalizeParams(params));
+          } finally {
+            await stmt.reset();
+          }
+        })
+      )
     );
+  }
 
-    CREATE TABLE IF NOT EXISTS payments (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      institute_id INTEGER NOT NULL,
-      student_fee_id INTEGER NOT NULL,
-      amount REAL NOT NULL,
-      paid_on TEXT NOT NULL,
-      mode TEXT NOT NULL CHECK(mode IN ('CASH', 'UPI', 'BANK')),
-      receipt_no TEXT NOT NULL UNIQUE,
-      remarks TEXT,
-      created_by INTEGER NOT NULL,
-      created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-      updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-      FOREIGN KEY (institute_id) REFERENCES institutes(id),
-      FOREIGN KEY (student_fee_id) REFERENCES student_fees(id),
-      FOREIGN KEY (created_by) REFERENCES users(id)
+  all(sql, ...params) {
+    return timeQuery(sql, () =>
+      this.read((statements) => statements.use(sql, (stmt) => stmt.all(normalizeParams(params))))
     );
+  }
 
-    CREATE TABLE IF NOT EXISTS notifications (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      institute_id INTEGER NOT NULL,
-      student_id INTEGER,
-      batch_id INTEGER,
-      type TEXT NOT NULL CHECK(type IN ('FEE_REMINDER', 'ANNOUNCEMENT', 'SYSTEM')),
-      message TEXT NOT NULL,
-      meta_json TEXT,
-      created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-      read_at TEXT,
-      FOREIGN KEY (institute_id) REFERENCES institutes(id),
-      FOREIGN KEY (student_id) REFERENCES students(id),
-      FOREIGN KEY (batch_id) REFERENCES batches(id)
+  // Write timings include the wait for the writer queue, which is what a request sees.
+  run(sql, ...params) {
+    return timeQuery(sql, () =>
+      this.write(() => this.writerStatements.use(sql, (stmt) => stmt.run(normalizeParams(params))))
     );
+  }
 
-    CREATE TABLE IF NOT EXISTS reminder_rules (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      institute_id INTEGER NOT NULL,
-      batch_id INTEGER,
-      name TEXT NOT NULL,
-      days_before INTEGER NOT NULL,
-      on_due_date INTEGER NOT NULL,
-      every_n_days_after_due INTEGER NOT NULL,
-      is_active INTEGER NOT NULL,
-      created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-      updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-      FOREIGN KEY (institute_id) REFERENCES institutes(id),
-      FOREIGN KEY (batch_id) REFERENCES batches(id)
+  exec(sql) {
+    return timeQuery(sql, () => this.write(() => this.writer.exec(sql)));
+  }
+
+  transaction(work) {
+    if (this.inTransaction()) {
+      return work(this);
+    }
+    return this.writeQueue.run(async () => {
+      await this.writer.exec("BEGIN IMMEDIATE");
+      try {
+        const result = await transactionScope.run(this, () => work(this));
+        await this.writer.exec("COMMIT");
+        return result;
+      } catch (error) {
+        await this.writer.exec("ROLLBACK");
+        throw error;
+      }
+    });
+  }
+
+  // A connection loads the planner statistics when it opens, so after migrations have
+  // built and analyzed new indexes the readers are replaced to plan with them.
+  async reopenReaders() {
+    const stale = this.readers;
+    const staleStatements = [...this.readerStatements.values()];
+    this.readers = await Promise.all(stale.map(() => openReader()));
+    this.readerStatements = new Map(
+      this.readers.map((reader) => [reader, new StatementCache(reader, config.dbStatementCacheSize)])
     );
+    this.nextReader = 0;
+    await Promise.all(staleStatements.map((cache) => cache.clear()));
+    await Promise.all(stale.map((reader) => reader.close()));
+  }
+
+  async close() {
+    await this.writeQueue.run(async () => {
+      await this.writerStatements.clear();
+      await Promise.all([...this.readerStatements.values()].map((cache) => cache.clear()));
+      await this.writer.exec("PRAGMA optimize;");
+      await Promise.all(this.readers.map((reader) => reader.close()));
+      await this.writer.close();
+    });
+  }
+}
+
+function connectionPragmas() {
+  return `
+    PRAGMA busy_timeout = ${config.dbBusyTimeoutMs};
+    PRAGMA cache_size = -${config.dbCacheSizeKb};
+    PRAGMA mmap_size = ${config.dbMmapSizeMb * 1024 * 1024};
+    PRAGMA temp_store = MEMORY;
+  `;
+}
+
+async function openReader() {
+  const reader = await open({
+    filename: config.databaseFile,
+    driver: sqlite3.Database,
+    mode: sqlite3.OPEN_READONLY
+  });
+  await reader.exec(connectionPragmas());
+  return reader;
+}
+
+async function openPool() {
+  fs.mkdirSync(path.dirname(config.databaseFile), { recursive: true });
+  const writer = await open({
+    filename: config.databaseFile,
+    driver: sqlite3.Database
+  });
+  await writer.exec(`
+    PRAGMA journal_mode = WAL;
+    PRAGMA synchronous = ${config.dbSynchronous};
+    PRAGMA foreign_keys = ON;
+    ${connectionPragmas()}
+  `);
+  const readers = [];
+  for (let i = 0; i < config.dbReadPoolSize; i += 1) {
+    readers.push(await openReader());
+  }
+  return new DatabasePool(writer, readers);
+}
 
-    CREATE TABLE IF NOT EXISTS audit_logs (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      institute_id INTEGER NOT NULL,
-      actor_user_id INTEGER,
-      action TEXT NOT NULL,
-      entity TEXT NOT NULL,
-      entity_id TEXT NOT NULL,
-      before_json TEXT,
-      after_json TEXT,
-      created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-      FOREIGN KEY (institute_id) REFERENCES institutes(id),
-      FOREIGN KEY (actor_user_id) REFERENCES users(id)
+async function connectDb() {
+  if (db) {
+    return db;
+  }
+  if (!connecting) {
+    connecting = openPool()
+      .then((pool) => {
+        db = pool;
+        return pool;
+      })
+      .finally(() => {
+        connecting = null;
+      });
+  }
+  return connecting;
+}
+
+async function closeDb() {
+  if (!db) {
+    return;
+  }
+  const pool = db;
+  db = null;
+  await pool.close();
+}
+
+async function initializeSchema() {
+  const database = await connectDb();
+  await database.exec(`
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+      version INTEGER PRIMARY KEY,
+      name TEXT NOT NULL,
+      applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
     );
   `);
+  const rows = await database.all("SELECT version FROM schema_migrations");
+  const applied = new Set(rows.map((row) => row.version));
+  const ran = [];
+  for (const migration of migrations) {
+    if (applied.has(migration.version)) {
+      continue;
+    }
+    await withTransaction(database, async (tx) => {
+      await migration.up(tx);
+      await tx.run("INSERT INTO schema_migrations (version, name) VALUES (?, ?)", [migration.version, migration.name]);
+    });
+    ran.push(migration);
+  }
+  if (ran.length) {
+    await database.reopenReaders();
+  }
+  return ran;
+}
+
+function withTransaction(database, work) {
+  return database.transaction(work);
 }
 
 module.exports = {
   connectDb,
-  initializeSchema
+  closeDb,
+  initializeSchema,
+  withTransaction
 };
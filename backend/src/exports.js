@@ -0,0 +1,141 @@
+const zlib = require("zlib");
+const { Readable } = require("stream");
+const { pipeline } = require("stream/promises");
+const { stringify } = require("csv-stringify");
+const { zipStream } = require("./zip");
+
+const EXPORT_CHUNK_SIZE = 1000;
+
+// One page of a keyset walk: the rows after `cursor` (the key values of the last row seen,
+// or null for the first page) in key order.
+function keysetPageQuery({ sql, where = "", params = [], keys, chunkSize = EXPORT_CHUNK_SIZE }, cursor = null) {
+  const keyColumns = keys.map((key) => key.column).join(", ");
+  let condition = where;
+  const queryParams = [...params];
+  if (cursor) {
+    condition += `${where ? " AND" : "WHERE"} (${keyColumns}) > (${cursor.map(() => "?").join(", ")})`;
+    queryParams.push(...cursor);
+  }
+  return { sql: `${sql} ${condition} ORDER BY ${keyColumns} LIMIT ?`, params: [...queryParams, chunkSize] };
+}
+
+// Walks a query in keyset order, one bounded page at a time, so an export holds at most
+// `chunkSize` rows in memory. `keys` must be unique together (end with the primary key)
+// and match the ORDER BY the caller wants.
+async function* iterateKeyset(db, spec) {
+  const { keys, chunkSize = EXPORT_CHUNK_SIZE } = spec;
+  let cursor = null;
+  for (;;) {
+    const page = keysetPageQuery(spec, cursor);
+    const rows = await db.all(page.sql, page.params);
+    for (const row of rows) {
+      yield row;
+    }
+    if (rows.length < chunkSize) {
+      return;
+    }
+    const last = rows[rows.length - 1];
+    cursor = keys.map((key) => last[key.field]);
+  }
+}
+
+async function* toRecords(rows, columns) {
+  for await (const row of rows) {
+    yield columns.map(([, value]) => value(row));
+  }
+}
+
+function wantsGzip(req) {
+  return String(req.query.gzip).toLowerCase() === "true" && Boolean(req.acceptsEncodings("gzip"));
+}
+
+function sendExportError(res, error) {
+  if (error.code === "WORKER_POOL_BUSY") {
+    res.status(503).json({ detail: "Server is busy, try again shortly" });
+    return;
+  }
+  res.status(500).json({ detail: "Export failed" });
+}
+
+async function* resume(first, iterator) {
+  try {
+    for (let step = first; !step.done; step = await iterator.next()) {
+      yield step.value;
+    }
+  } finally {
+    if (iterator.return) {
+      await iterator.return();
+    }
+  }
+}
+
+// Pulls the first chunk of `source` before sending `headers`, so a failure up to that
+// point (a bad query, a busy worker pool) still gets a JSON error response. After that
+// the status line is on the wire: a failing source is logged and the connection dropped,
+// which the client sees as a truncated download rather than a complete file.
+async function sendStream(res, { source, headers, transforms = [] }) {
+  const iterator = source[Symbol.asyncIterator]();
+  let first;
+  try {
+    first = await iterator.next();
+  } catch (error) {
+    if (!res.destroyed) {
+      sendExportError(res, error);
+    }
+    return;
+  }
+  if (res.destroyed) {
+    if (iterator.return) {
+      await iterator.return();
+    }
+    return;
+  }
+  for (const [name, value] of Object.entries(headers)) {
+    res.setHeader(name, value);
+  }
+  try {
+    await pipeline(Readable.from(resume(first, iterator)), ...transforms, res);
+  } catch (error) {
+    if (error.code === "ERR_STREAM_PREMATURE_CLOSE") {
+      return;
+    }
+    process.stderr.write(`Export ${res.req.originalUrl} failed after streaming started: ${error.message}\n`);
+    res.destroy();
+  }
+}
+
+// Streams `rows` (any async iterable) to the response as CSV. Backpressure flows from the
+// socket through the optional gzip stage and the stringifier back to the row iterator,
+// which only fetches the next page once earlier rows have been written.
+async function streamCsvExport(req, res, { filename, columns, rows }) {
+  const headers = {
+    "Content-Type": "text/csv; charset=utf-8",
+    "Content-Disposition": `attachment; filename=${filename}`
+  };
+  const transforms = [stringify({ header: true, columns: columns.map(([header]) => header) })];
+  if (wantsGzip(req)) {
+    headers["Content-Encoding"] = "gzip";
+    transforms.push(zlib.createGzip());
+  }
+  await sendStream(res, { source: toRecords(rows, columns), headers, transforms });
+}
+
+// Streams `entries` (an async iterable of `{ name, data, date }`) to the response as a
+// ZIP archive, pulling the next entry only when the socket has room for it.
+async function streamZipExport(req, res, { filename, entries }) {
+  await sendStream(res, {
+    source: zipStream(entries),
+    headers: {
+      "Content-Type": "application/zip",
+      "Content-Disposition": `attachment; filename=${filename}`
+    }
+  });
+}
+
+module.exports = {
+  EXPORT_CHUNK_SIZE,
+  keysetPageQuery,
+  iterateKeyset,
+  streamCsvExport,
+  streamZipExport
+};
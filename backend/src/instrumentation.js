@@ -0,0 +1,223 @@
+const { AsyncLocalStorage } = require("async_hooks");
+const config = require("./config");
+
+// Upper bounds, in milliseconds, of the latency histogram buckets. The last bucket is open.
+const LATENCY_BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000];
+const MAX_TRACKED_QUERIES = 500;
+const OTHER_QUERIES = "(other)";
+
+// Set for the lifetime of each request so database calls can be charged to its route.
+const requestScope = new AsyncLocalStorage();
+
+class Histogram {
+  constructor(bounds = LATENCY_BUCKETS_MS) {
+    this.bounds = bounds;
+    this.counts = new Array(bounds.length + 1).fill(0);
+    this.count = 0;
+    this.sum = 0;
+    this.max = 0;
+  }
+
+  record(value) {
+    let index = this.bounds.findIndex((bound) => value <= bound);
+    if (index === -1) {
+      index = this.bounds.length;
+    }
+    this.counts[index] += 1;
+    this.count += 1;
+    this.sum += value;
+    this.max = Math.max(this.max, value);
+  }
+
+  // Upper bound of the bucket holding the q-th value, capped at the largest value seen.
+  percentile(q) {
+    if (!this.count) {
+      return null;
+    }
+    const rank = Math.ceil(q * this.count);
+    let seen = 0;
+    for (let i = 0; i < this.counts.length; i += 1) {
+      seen += this.counts[i];
+      if (seen >= rank) {
+        return i < this.bounds.length ? Math.min(this.bounds[i], this.max) : this.max;
+      }
+    }
+    return this.max;
+  }
+
+  toJSON() {
+    const round = (value) => (value == null ? null : Number(value.toFixed(3)));
+    return {
+      count: this.count,
+      mean: this.count ? round(this.sum / this.count) : null,
+      p50: round(this.percentile(0.5)),
+      p95: round(this.percentile(0.95)),
+      p99: round(this.percentile(0.99)),
+      max: round(this.max),
+      buckets: Object.fromEntries(
+        this.counts.map((count, i) => [i < this.bounds.length ? `le_${this.bounds[i]}` : "gt_max", count])
+      )
+    };
+  }
+}
+
+let routeStats = new Map();
+let queryStats = new Map();
+let startedAt = new Date();
+
+function elapsedMs(start) {
+  return Number(process.hrtime.bigint() - start) / 1e6;
+}
+
+// Collapses whitespace and variable-length placeholder lists, so `IN (?, ?, ?)` and
+// multi-row VALUES lists of any length are counted as one query shape.
+function normalizeSql(sql) {
+  return String(sql)
+    .replace(/\s+/g, " ")
+    .replace(/\?(?:\s*,\s*\?)+/g, "?, ...")
+    .replace(/(\((?:\?, \.\.\.|\?)\))(?:\s*,\s*\((?:\?, \.\.\.|\?)\))+/g, "$1, ...")
+    .trim();
+}
+
+function routeKey(req) {
+  if (!req.route) {
+    return `${req.method} (unmatched)`;
+  }
+  return `${req.method} ${req.baseUrl}${req.route.path}`;
+}
+
+function routeEntry(key) {
+  let entry = routeStats.get(key);
+  if (!entry) {
+    entry = {
+      latency: new Histogram(),
+      queriesPerRequest: new Histogram([0, 1, 2, 3, 5, 10, 20, 50, 100, 500]),
+      queryMs: 0,
+      statuses: {}
+    };
+    routeStats.set(key, entry);
+  }
+  return entry;
+}
+
+function recordQuery(sql, start, failed = false) {
+  const ms = elapsedMs(start);
+  const request = requestScope.getStore();
+  if (request) {
+    request.queries += 1;
+    request.queryMs += ms;
+  }
+  let key = normalizeSql(sql);
+  if (!queryStats.has(key) && queryStats.size >= MAX_TRACKED_QUERIES) {
+    key = OTHER_QUERIES;
+  }
+  let entry = queryStats.get(key);
+  if (!entry) {
+    entry = { count: 0, errors: 0, totalMs: 0, maxMs: 0, routes: new Set() };
+    queryStats.set(key, entry);
+  }
+  entry.count += 1;
+  entry.totalMs += ms;
+  entry.maxMs = Math.max(entry.maxMs, ms);
+  if (failed) {
+    entry.errors += 1;
+  }
+  if (request && request.route) {
+    entry.routes.add(request.route);
+  }
+}
+
+// Times a database call issued through the pool. `call` returns a promise.
+function timeQuery(sql, call) {
+  if (!config.metricsEnabled) {
+    return call();
+  }
+  const start = process.hrtime.bigint();
+  return call().then(
+    (result) => {
+      recordQuery(sql, start);
+      return result;
+    },
+    (error) => {
+      recordQuery(sql, start, true);
+      throw error;
+    }
+  );
+}
+
+// Express middleware recording latency, status and database work per matched route.
+function requestMetrics() {
+  return (req, res, next) => {
+    if (!config.metricsEnabled) {
+      return next();
+    }
+    const start = process.hrtime.bigint();
+    // The matched route is only known once routing has run, so resolve it lazily; by the
+    // time a handler queries the database, req.route is set.
+    const request = {
+      queries: 0,
+      queryMs: 0,
+      get route() {
+        return req.route ? routeKey(req) : null;
+      }
+    };
+    let recorded = false;
+    const record = () => {
+      if (recorded) {
+        return;
+      }
+      recorded = true;
+      const key = routeKey(req);
+      const entry = routeEntry(key);
+      entry.latency.record(elapsedMs(start));
+      entry.queriesPerRequest.record(request.queries);
+      entry.queryMs += request.queryMs;
+      const status = res.writableFinished ? `${Math.floor(res.statusCode / 100)}xx` : "aborted";
+      entry.statuses[status] = (entry.statuses[status] || 0) + 1;
+    };
+    res.on("finish", record);
+    res.on("close", record);
+    requestScope.run(request, next);
+  };
+}
+
+function metricsSnapshot() {
+  const round = (value) => Number(value.toFixed(3));
+  const routes = [...routeStats.entries()]
+    .map(([route, entry]) => ({
+      route,
+      requests: entry.latency.count,
+      statuses: entry.statuses,
+      latency_ms: entry.latency.toJSON(),
+      queries_per_request: entry.queriesPerRequest.toJSON(),
+      query_ms_per_request: entry.latency.count ? round(entry.queryMs / entry.latency.count) : null
+    }))
+    .sort((a, b) => b.requests - a.requests);
+  const queries = [...queryStats.entries()]
+    .map(([sql, entry]) => ({
+      sql,
+      count: entry.count,
+      errors: entry.errors,
+      total_ms: round(entry.totalMs),
+      mean_ms: round(entry.totalMs / entry.count),
+      max_ms: round(entry.maxMs),
+      routes: [...entry.routes].sort()
+    }))
+    .sort((a, b) => b.total_ms - a.total_ms);
+  return { since: startedAt.toISOString(), routes, queries };
+}
+
+function resetMetrics() {
+  routeStats = new Map();
+  queryStats = new Map();
+  startedAt = new Date();
+}
+
+module.exports = {
+  Histogram,
+  normalizeSql,
+  timeQuery,
+  requestMetrics,
+  metricsSnapshot,
+  resetMetrics
+};
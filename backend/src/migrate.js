@@ -0,0 +1,16 @@
+const { initializeSchema, connectDb } = require("./db");
+
+async function runMigrate() {
+  const ran = await initializeSchema();
+  for (const migration of ran) {
+    process.stdout.write(`Applied migration ${migration.version} (${migration.name})\n`);
+  }
+  const db = await connectDb();
+  const current = await db.get("SELECT MAX(version) AS version FROM schema_migrations");
+  process.stdout.write(`Schema is at version ${current.version || 0}.\n`);
+}
+
+runMigrate().catch((error) => {
+  process.stderr.write(`Migration failed: ${error.message}\n`);
+  process.exit(1);
+});
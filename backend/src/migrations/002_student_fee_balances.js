@@ -0,0 +1,29 @@
+module.exports = {
+  version: 2,
+  name: "student_fee_balances",
+  async up(db) {
+    await db.exec(`
+      CREATE TABLE IF NOT EXISTS student_fee_balances (
+        student_fee_id INTEGER PRIMARY KEY,
+        institute_id INTEGER NOT NULL,
+        student_id INTEGER NOT NULL,
+        batch_id INTEGER NOT NULL,
+        paid_amount REAL NOT NULL,
+        due_amount REAL NOT NULL,
+        next_due_date TEXT,
+        next_installment_amount REAL,
+        outstanding_installments INTEGER NOT NULL,
+        updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (student_fee_id) REFERENCES student_fees(id),
+        FOREIGN KEY (institute_id) REFERENCES institutes(id)
+      );
+
+      CREATE INDEX IF NOT EXISTS idx_student_fee_balances_institute_due
+        ON student_fee_balances (institute_id, due_amount, next_due_date);
+      CREATE INDEX IF NOT EXISTS idx_student_fee_balances_student
+        ON student_fee_balances (student_id, due_amount);
+      CREATE INDEX IF NOT EXISTS idx_payments_student_fee_created
+        ON payments (student_fee_id, created_at);
+    `);
+  }
+};
@@ -0,0 +1,21 @@
+module.exports = {
+  version: 3,
+  name: "notification_dedupe_key",
+  async up(db) {
+    const columns = await db.all("PRAGMA table_info(notifications)");
+    const hadColumn = columns.some((item) => item.name === "dedupe_key");
+    if (!hadColumn) {
+      await db.exec("ALTER TABLE notifications ADD COLUMN dedupe_key TEXT;");
+    }
+    await db.exec("CREATE UNIQUE INDEX IF NOT EXISTS idx_notifications_dedupe_key ON notifications (dedupe_key);");
+    if (!hadColumn) {
+      // Older reminders only carried their identity inside meta_json; lift it into the indexed column once.
+      await db.run(
+        `UPDATE OR IGNORE notifications
+         SET dedupe_key = 'FEE_REMINDER|' || json_extract(meta_json, '$.student_fee_id') || '|' ||
+                          json_extract(meta_json, '$.due_date') || '|' || json_extract(meta_json, '$.trigger_day')
+         WHERE type = 'FEE_REMINDER' AND meta_json IS NOT NULL AND json_valid(meta_json)`
+      );
+    }
+  }
+};
@@ -0,0 +1,62 @@
+// Indexes for the list, count and lookup paths in routes/*. Each one leads with the
+// equality columns a route filters on and ends with the column it orders by, so
+// paginated listings walk the index instead of sorting the table.
+module.exports = {
+  version: 4,
+  name: "query_indexes",
+  async up(db) {
+    await db.exec(`
+      CREATE INDEX IF NOT EXISTS idx_users_institute_role
+        ON users (institute_id, role, is_active);
+
+      CREATE INDEX IF NOT EXISTS idx_students_institute_created
+        ON students (institute_id, created_at);
+
+      CREATE INDEX IF NOT EXISTS idx_fee_plans_institute_created
+        ON fee_plans (institute_id, created_at);
+
+      CREATE INDEX IF NOT EXISTS idx_batches_institute_created
+        ON batches (institute_id, created_at);
+      CREATE INDEX IF NOT EXISTS idx_batches_teacher
+        ON batches (teacher_id);
+
+      CREATE INDEX IF NOT EXISTS idx_student_batches_batch
+        ON student_batches (batch_id, student_id);
+      CREATE INDEX IF NOT EXISTS idx_student_batches_institute_student
+        ON student_batches (institute_id, student_id);
+
+      CREATE INDEX IF NOT EXISTS idx_attendance_institute_date
+        ON attendance (institute_id, date, status);
+      CREATE INDEX IF NOT EXISTS idx_attendance_student_batch
+        ON attendance (student_id, batch_id, status);
+
+      CREATE INDEX IF NOT EXISTS idx_notes_institute_created
+        ON notes (institute_id, created_at);
+      CREATE INDEX IF NOT EXISTS idx_notes_batch_created
+        ON notes (batch_id, created_at);
+
+      CREATE INDEX IF NOT EXISTS idx_student_fees_institute_created
+        ON student_fees (institute_id, created_at);
+      CREATE INDEX IF NOT EXISTS idx_student_fees_batch
+        ON student_fees (batch_id);
+
+      CREATE INDEX IF NOT EXISTS idx_payments_institute_created
+        ON payments (institute_id, created_at);
+
+      CREATE INDEX IF NOT EXISTS idx_notifications_institute_created
+        ON notifications (institute_id, created_at);
+      CREATE INDEX IF NOT EXISTS idx_notifications_institute_type_created
+        ON notifications (institute_id, type, created_at);
+      CREATE INDEX IF NOT EXISTS idx_notifications_student
+        ON notifications (student_id);
+
+      CREATE INDEX IF NOT EXISTS idx_reminder_rules_institute_active
+        ON reminder_rules (institute_id, is_active);
+
+      CREATE INDEX IF NOT EXISTS idx_audit_logs_institute_created
+        ON audit_logs (institute_id, created_at);
+      CREATE INDEX IF NOT EXISTS idx_audit_logs_entity
+        ON audit_logs (entity, entity_id);
+    `);
+  }
+};
@@ -0,0 +1,19 @@
+// Indexes for the attendance history listings, which page newest-first by (date,
+// created_at) across an institute, a batch or a student. The table is re-analyzed so that
+// a database whose statistics predate these indexes doesn't keep planning around them.
+module.exports = {
+  version: 5,
+  name: "history_indexes",
+  async up(db) {
+    await db.exec(`
+      CREATE INDEX IF NOT EXISTS idx_attendance_institute_date_created
+        ON attendance (institute_id, date, created_at);
+      CREATE INDEX IF NOT EXISTS idx_attendance_batch_date_created
+        ON attendance (batch_id, date, created_at);
+      CREATE INDEX IF NOT EXISTS idx_attendance_student_date_created
+        ON attendance (student_id, date, created_at);
+
+      ANALYZE attendance;
+    `);
+  }
+};
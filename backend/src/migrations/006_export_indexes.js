@@ -0,0 +1,23 @@
+// Indexes matching the keyset order of the CSV exports, so each export page is an
+// index range read that stops after LIMIT rows instead of sorting the filtered set.
+// The dues export walks one institute's balances in student_fee_id order. Both tables
+// are re-analyzed so the new indexes get planner statistics alongside the older ones.
+module.exports = {
+  version: 6,
+  name: "export_indexes",
+  async up(db) {
+    await db.exec(`
+      CREATE INDEX IF NOT EXISTS idx_attendance_institute_date_id
+        ON attendance (institute_id, date, id);
+
+      CREATE INDEX IF NOT EXISTS idx_student_fees_institute_id
+        ON student_fees (institute_id, id);
+
+      CREATE INDEX IF NOT EXISTS idx_student_fee_balances_institute_fee
+        ON student_fee_balances (institute_id, student_fee_id);
+
+      ANALYZE attendance;
+      ANALYZE student_fee_balances;
+    `);
+  }
+};
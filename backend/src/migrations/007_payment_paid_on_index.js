@@ -0,0 +1,12 @@
+// Receipt bundles select a batch's payments for one month by paid_on and stream them in
+// (paid_on, id) order; this index serves both the range and the keyset order.
+module.exports = {
+  version: 7,
+  name: "payment_paid_on_index",
+  async up(db) {
+    await db.exec(`
+      CREATE INDEX IF NOT EXISTS idx_payments_institute_paid_on
+        ON payments (institute_id, paid_on, id);
+    `);
+  }
+};
@@ -0,0 +1,11 @@
+const migrations = [
+  require("./001_initial_schema"),
+  require("./002_student_fee_balances"),
+  require("./003_notification_dedupe_key"),
+  require("./004_query_indexes"),
+  require("./005_history_indexes"),
+  require("./006_export_indexes"),
+  require("./007_payment_paid_on_index")
+];
+
+module.exports = migrations;
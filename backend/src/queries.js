@@ -0,0 +1,448 @@
+// SQL for the read paths over large tables, shared by the routes and services that run it
+// and by query-plans.js, which checks each statement against the schema's indexes.
+// Builders take the filters a route has parsed and return `{ sql, params }`; export
+// builders return a keyset spec for iterateKeyset instead.
+
+function placeholders(values) {
+  return values.map(() => "?").join(",");
+}
+
+function pageQuery(sql, params, { limit, offset }) {
+  return { sql: `${sql} LIMIT ? OFFSET ?`, params: [...params, limit, offset] };
+}
+
+const USER_BY_ID_SQL = "SELECT * FROM users WHERE id = ?";
+const USER_BY_EMAIL_SQL = "SELECT * FROM users WHERE email = ?";
+const ACTIVE_TEACHERS_SQL = "SELECT * FROM users WHERE institute_id = ? AND role = 'TEACHER' AND is_active = 1";
+
+const STUDENT_BATCH_IDS_SQL = "SELECT batch_id FROM student_batches WHERE student_id = ?";
+const BATCH_ROSTER_SQL = `SELECT s.id, s.full_name, s.phone, s.email
+   FROM students s JOIN student_batches sb ON sb.student_id = s.id
+   WHERE sb.batch_id = ? AND s.institute_id = ? ORDER BY s.full_name ASC`;
+
+const FEE_PLANS_SQL = "SELECT * FROM fee_plans WHERE institute_id = ? ORDER BY created_at DESC";
+
+// Fees with their paid total. Balance refresh, rebuild and verify all read through this one
+// definition, so the stored balance and the check agree on how it is computed.
+const FEE_WITH_PAID_SQL = `SELECT sf.*,
+          (SELECT COALESCE(SUM(p.amount), 0) FROM payments p WHERE p.student_fee_id = sf.id) AS paid_amount
+   FROM student_fees sf`;
+const STUDENT_FEE_WITH_PAID_SQL = `${FEE_WITH_PAID_SQL} WHERE sf.id = ?`;
+
+const ACTIVE_REMINDER_RULES_SQL = "SELECT * FROM reminder_rules WHERE is_active = 1 AND institute_id = ?";
+const REMINDER_FEE_CHUNK_SQL = `SELECT sf.id, sf.institute_id, sf.student_id, sf.batch_id, sf.due_schedule_json,
+          fb.paid_amount, fb.due_amount, s.full_name AS student_name, b.name AS batch_name
+   FROM student_fee_balances fb
+   JOIN student_fees sf ON sf.id = fb.student_fee_id
+   JOIN students s ON s.id = sf.student_id
+   JOIN batches b ON b.id = sf.batch_id
+   WHERE fb.institute_id = ? AND fb.due_amount > 0 AND fb.student_fee_id > ?
+   ORDER BY fb.student_fee_id
+   LIMIT ?`;
+
+const PRESENT_ON_DATE_SQL =
+  "SELECT COUNT(*) as c FROM attendance WHERE institute_id = ? AND date = ? AND status = 'PRESENT'";
+const STUDENT_ATTENDANCE_SUMMARY_SQL = `SELECT batch_id, COUNT(*) as total, SUM(CASE WHEN status = 'PRESENT' THEN 1 ELSE 0 END) as present
+   FROM attendance WHERE student_id = ? AND institute_id = ? GROUP BY batch_id`;
+
+function enrolledStudentsQuery(instituteId, batchIds) {
+  return {
+    sql: `SELECT batch_id, student_id FROM student_batches
+          WHERE institute_id = ? AND batch_id IN (${placeholders(batchIds)})`,
+    params: [instituteId, ...batchIds]
+  };
+}
+
+function studentListQueries({ instituteId, search, phone, batchId, unpaidOnly }, page) {
+  const params = [instituteId];
+  let where = "WHERE s.institute_id = ?";
+  let join = "";
+  if (search) {
+    where += " AND s.full_name LIKE ?";
+    params.push(`%${search}%`);
+  }
+  if (phone) {
+    where += " AND s.phone LIKE ?";
+    params.push(`%${phone}%`);
+  }
+  if (batchId != null) {
+    join = "JOIN student_batches sb ON sb.student_id = s.id";
+    where += " AND sb.batch_id = ?";
+    params.push(batchId);
+  }
+  if (unpaidOnly) {
+    where += ` AND EXISTS (
+      SELECT 1 FROM student_fee_balances fb
+      WHERE fb.student_id = s.id AND fb.institute_id = s.institute_id AND fb.due_amount > 0
+    )`;
+  }
+  return {
+    count: { sql: `SELECT COUNT(DISTINCT s.id) AS total FROM students s ${join} ${where}`, params },
+    page: pageQuery(`SELECT DISTINCT s.* FROM students s ${join} ${where} ORDER BY s.created_at DESC`, params, page)
+  };
+}
+
+function batchListQueries({ instituteId, studentId, search }, page) {
+  const params = [instituteId];
+  let join = "";
+  let where = "WHERE b.institute_id = ?";
+  if (studentId != null) {
+    join = "JOIN student_batches sb ON sb.batch_id = b.id";
+    where += " AND sb.student_id = ?";
+    params.push(studentId);
+  }
+  if (search) {
+    where += " AND b.name LIKE ?";
+    params.push(`%${search}%`);
+  }
+  return {
+    count: { sql: `SELECT COUNT(DISTINCT b.id) as total FROM batches b ${join} ${where}`, params },
+    page: pageQuery(`SELECT DISTINCT b.* FROM batches b ${join} ${where} ORDER BY b.created_at DESC`, params, page)
+  };
+}
+
+// Student callers are pinned to their own profile through viewerStudentId, on top of any
+// requested student filter.
+function attendanceWhere({ instituteId, batchId, studentId, viewerStudentId, dateFrom, dateTo }) {
+  const params = [instituteId];
+  let where = "WHERE institute_id = ?";
+  if (batchId != null) {
+    where += " AND batch_id = ?";
+    params.push(batchId);
+  }
+  if (studentId != null) {
+    where += " AND student_id = ?";
+    params.push(studentId);
+  }
+  if (dateFrom) {
+    where += " AND date >= ?";
+    params.push(dateFrom);
+  }
+  if (dateTo) {
+    where += " AND date <= ?";
+    params.push(dateTo);
+  }
+  if (viewerStudentId != null) {
+    where += " AND student_id = ?";
+    params.push(viewerStudentId);
+  }
+  return { where, params };
+}
+
+function attendanceHistoryQueries(filters, page) {
+  const { where, params } = attendanceWhere(filters);
+  return {
+    count: { sql: `SELECT COUNT(*) as total FROM attendance ${where}`, params },
+    page: pageQuery(`SELECT * FROM attendance ${where} ORDER BY date DESC, created_at DESC`, params, page)
+  };
+}
+
+function attendanceStatsQuery(filters) {
+  const { where, params } = attendanceWhere(filters);
+  return {
+    sql: `SELECT student_id, batch_id,
+                 COUNT(*) as total_classes,
+                 SUM(CASE WHEN status = 'PRESENT' THEN 1 ELSE 0 END) as present_count,
+                 SUM(CASE WHEN status = 'ABSENT' THEN 1 ELSE 0 END) as absent_count
+          FROM attendance ${where}
+          GROUP BY student_id, batch_id`,
+    params
+  };
+}
+
+function attendanceExportQuery(filters) {
+  const { where, params } = attendanceWhere(filters);
+  return {
+    sql: "SELECT * FROM attendance",
+    where,
+    params,
+    keys: [
+      { column: "date", field: "date" },
+      { column: "id", field: "id" }
+    ]
+  };
+}
+
+// `batchIds` restricts a student's listing to their own batches.
+function noteListQueries({ instituteId, batchId, batchIds }, page) {
+  const params = [instituteId];
+  let where = "WHERE n.institute_id = ?";
+  if (batchId != null) {
+    where += " AND n.batch_id = ?";
+    params.push(batchId);
+  }
+  if (batchIds) {
+    where += ` AND n.batch_id IN (${placeholders(batchIds)})`;
+    params.push(...batchIds);
+  }
+  return {
+    count: { sql: `SELECT COUNT(*) as total FROM notes n ${where}`, params },
+    page: pageQuery(`SELECT n.* FROM notes n ${where} ORDER BY n.created_at DESC`, params, page)
+  };
+}
+
+function batchNotesQuery(batchIds) {
+  return {
+    sql: `SELECT id, batch_id, title, description, file_name, created_at
+          FROM notes WHERE batch_id IN (${placeholders(batchIds)})
+          ORDER BY created_at DESC LIMIT 30`,
+    params: batchIds
+  };
+}
+
+function feeLedgerWhere(filters) {
+  const clauses = ["fb.institute_id = ?"];
+  const params = [filters.instituteId];
+  if (filters.batchId != null) {
+    clauses.push("sf.batch_id = ?");
+    params.push(filters.batchId);
+  }
+  if (filters.studentId != null) {
+    clauses.push("sf.student_id = ?");
+    params.push(filters.studentId);
+  }
+  // Student callers are always pinned to their own profile, on top of any requested student filter.
+  if (filters.viewerStudentId != null) {
+    clauses.push("sf.student_id = ?");
+    params.push(filters.viewerStudentId);
+  }
+  if (filters.outstandingOnly) {
+    clauses.push("fb.due_amount > 0");
+  }
+  if (filters.dueFrom) {
+    clauses.push("(fb.next_due_date IS NULL OR fb.next_due_date >= ?)");
+    params.push(filters.dueFrom);
+  }
+  if (filters.dueTo) {
+    clauses.push("(fb.next_due_date IS NULL OR fb.next_due_date <= ?)");
+    params.push(filters.dueTo);
+  }
+  return { where: `WHERE ${clauses.join(" AND ")}`, params };
+}
+
+const FEE_LEDGER_SELECT = `SELECT sf.*, s.full_name AS student_name, b.name AS batch_name,
+          fb.paid_amount, fb.due_amount, fb.next_due_date,
+          fb.next_installment_amount AS upcoming_due_amount, fb.outstanding_installments
+   FROM student_fees sf
+   JOIN student_fee_balances fb ON fb.student_fee_id = sf.id
+   LEFT JOIN students s ON s.id = sf.student_id
+   LEFT JOIN batches b ON b.id = sf.batch_id`;
+
+function feeLedgerCountQuery(filters) {
+  const { where, params } = feeLedgerWhere(filters);
+  return {
+    sql: `SELECT COUNT(*) AS total FROM student_fees sf
+          JOIN student_fee_balances fb ON fb.student_fee_id = sf.id ${where}`,
+    params
+  };
+}
+
+function feeLedgerSummaryQuery(filters) {
+  const { where, params } = feeLedgerWhere({ ...filters, outstandingOnly: true });
+  return {
+    sql: `SELECT COUNT(*) AS unpaid, COALESCE(SUM(fb.due_amount), 0) AS total_due
+          FROM student_fees sf
+          JOIN student_fee_balances fb ON fb.student_fee_id = sf.id ${where}`,
+    params
+  };
+}
+
+function feeLedgerQuery(filters, { newestFirst = false, limit, offset } = {}) {
+  const { where, params } = feeLedgerWhere(filters);
+  const sql = `${FEE_LEDGER_SELECT} ${where}
+     ORDER BY ${newestFirst ? "sf.created_at DESC, sf.id DESC" : "sf.id ASC"}`;
+  if (limit == null) {
+    return { sql, params };
+  }
+  return pageQuery(sql, params, { limit, offset: offset || 0 });
+}
+
+function feeLedgerExportQuery(filters) {
+  const { where, params } = feeLedgerWhere(filters);
+  return { sql: FEE_LEDGER_SELECT, where, params, keys: [{ column: "fb.student_fee_id", field: "id" }] };
+}
+
+function feePaymentsQuery(studentFeeIds) {
+  return {
+    sql: `SELECT * FROM payments WHERE student_fee_id IN (${placeholders(studentFeeIds)}) ORDER BY created_at DESC`,
+    params: studentFeeIds
+  };
+}
+
+function paymentListQueries({ instituteId, studentFeeId, viewerStudentId }, page) {
+  const params = [instituteId];
+  let where = "WHERE p.institute_id = ?";
+  if (studentFeeId != null) {
+    where += " AND p.student_fee_id = ?";
+    params.push(studentFeeId);
+  }
+  if (viewerStudentId != null) {
+    where += " AND sf.student_id = ?";
+    params.push(viewerStudentId);
+  }
+  const from = "FROM payments p JOIN student_fees sf ON sf.id = p.student_fee_id";
+  return {
+    count: { sql: `SELECT COUNT(*) AS total ${from} ${where}`, params },
+    page: pageQuery(`SELECT p.* ${from} ${where} ORDER BY p.created_at DESC`, params, page)
+  };
+}
+
+const PAYMENT_DETAIL_FROM = `FROM payments p
+   JOIN student_fees sf ON sf.id = p.student_fee_id
+   LEFT JOIN students s ON s.id = sf.student_id
+   LEFT JOIN batches b ON b.id = sf.batch_id`;
+
+function paymentExportQuery({ instituteId, studentFeeId, batchId, dateFrom, dateTo }) {
+  const params = [instituteId];
+  let where = "WHERE p.institute_id = ?";
+  if (studentFeeId != null) {
+    where += " AND p.student_fee_id = ?";
+    params.push(studentFeeId);
+  }
+  if (batchId != null) {
+    where += " AND sf.batch_id = ?";
+    params.push(batchId);
+  }
+  if (dateFrom) {
+    where += " AND p.paid_on >= ?";
+    params.push(dateFrom);
+  }
+  if (dateTo) {
+    where += " AND p.paid_on <= ?";
+    params.push(dateTo);
+  }
+  return {
+    sql: `SELECT p.*, sf.student_id, sf.batch_id, s.full_name AS student_name, b.name AS batch_name
+          ${PAYMENT_DETAIL_FROM}`,
+    where,
+    params,
+    keys: [
+      { column: "p.created_at", field: "created_at" },
+      { column: "p.id", field: "id" }
+    ]
+  };
+}
+
+// Payments for a receipt bundle: a count to check against the archive limit, and the rows
+// in (paid_on, id) order. `from`/`to` bound paid_on to a month, `to` exclusive.
+function receiptBundleQueries({ instituteId, batchId, from, to }) {
+  const params = [instituteId];
+  let where = "WHERE p.institute_id = ?";
+  if (batchId != null) {
+    where += " AND sf.batch_id = ?";
+    params.push(batchId);
+  }
+  if (from) {
+    where += " AND p.paid_on >= ? AND p.paid_on < ?";
+    params.push(from, to);
+  }
+  return {
+    count: { sql: `SELECT COUNT(*) AS total ${PAYMENT_DETAIL_FROM} ${where}`, params },
+    rows: {
+      sql: `SELECT p.*, sf.total_fee, sf.discount, s.full_name AS student_name,
+                   b.name AS batch_name, b.course AS batch_course
+            ${PAYMENT_DETAIL_FROM}`,
+      where,
+      params,
+      keys: [
+        { column: "p.paid_on", field: "paid_on" },
+        { column: "p.id", field: "id" }
+      ]
+    }
+  };
+}
+
+function auditLogExportQuery({ instituteId, entity, action, dateFrom, dateTo }) {
+  const params = [instituteId];
+  let where = "WHERE institute_id = ?";
+  if (entity) {
+    where += " AND entity = ?";
+    params.push(entity);
+  }
+  if (action) {
+    where += " AND action = ?";
+    params.push(action);
+  }
+  if (dateFrom) {
+    where += " AND created_at >= ?";
+    params.push(dateFrom);
+  }
+  if (dateTo) {
+    where += " AND created_at < date(?, '+1 day')";
+    params.push(dateTo);
+  }
+  return {
+    sql: "SELECT * FROM audit_logs",
+    where,
+    params,
+    keys: [
+      { column: "created_at", field: "created_at" },
+      { column: "id", field: "id" }
+    ]
+  };
+}
+
+// A student (viewerStudentId) sees notifications addressed to them, institute-wide ones
+// and those for their `batchIds`.
+function notificationListQueries({ instituteId, type, viewerStudentId, batchIds = [] }, page) {
+  const params = [instituteId];
+  let where = "WHERE institute_id = ?";
+  if (type) {
+    where += " AND type = ?";
+    params.push(type);
+  }
+  if (viewerStudentId != null) {
+    let clause = "(student_id = ? OR (student_id IS NULL AND batch_id IS NULL)";
+    params.push(viewerStudentId);
+    if (batchIds.length) {
+      clause += ` OR (student_id IS NULL AND batch_id IN (${placeholders(batchIds)}))`;
+      params.push(...batchIds);
+    }
+    where += ` AND ${clause})`;
+  }
+  return {
+    count: { sql: `SELECT COUNT(*) as total FROM notifications ${where}`, params },
+    page: pageQuery(`SELECT * FROM notifications ${where} ORDER BY created_at DESC`, params, page)
+  };
+}
+
+function existingRemindersQuery(dedupeKeys) {
+  return {
+    sql: `SELECT COUNT(*) AS c FROM notifications WHERE dedupe_key IN (${placeholders(dedupeKeys)})`,
+    params: dedupeKeys
+  };
+}
+
+module.exports = {
+  USER_BY_ID_SQL,
+  USER_BY_EMAIL_SQL,
+  ACTIVE_TEACHERS_SQL,
+  STUDENT_BATCH_IDS_SQL,
+  BATCH_ROSTER_SQL,
+  FEE_PLANS_SQL,
+  FEE_WITH_PAID_SQL,
+  STUDENT_FEE_WITH_PAID_SQL,
+  ACTIVE_REMINDER_RULES_SQL,
+  REMINDER_FEE_CHUNK_SQL,
+  PRESENT_ON_DATE_SQL,
+  STUDENT_ATTENDANCE_SUMMARY_SQL,
+  enrolledStudentsQuery,
+  studentListQueries,
+  batchListQueries,
+  attendanceHistoryQueries,
+  attendanceStatsQuery,
+  attendanceExportQuery,
+  noteListQueries,
+  batchNotesQuery,
+  feeLedgerCountQuery,
+  feeLedgerSummaryQuery,
+  feeLedgerQuery,
+  feeLedgerExportQuery,
+  feePaymentsQuery,
+  paymentListQueries,
+  paymentExportQuery,
+  receiptBundleQueries,
+  auditLogExportQuery,
+  notificationListQueries,
+  existingRemindersQuery
+};
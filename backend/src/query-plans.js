@@ -0,0 +1,164 @@
+const { initializeSchema, connectDb } = require("./db");
+const { keysetPageQuery } = require("./exports");
+const queries = require("./queries");
+
+const PAGE = { limit: 20, offset: 0 };
+const DAY = "2024-01-01";
+// Export checks plan a page after the first, so the keyset condition is part of the plan.
+const CURSOR = [DAY, 0];
+
+// Every statement the routes and background jobs run against a large table, built with
+// the same builders they use, so a change to a route's SQL is what gets checked here.
+// `ordered` marks paginated listings that must be served in index order rather than by
+// sorting the table.
+const QUERY_PLAN_CHECKS = [
+  { name: "auth: user by id", sql: queries.USER_BY_ID_SQL, params: [1] },
+  { name: "auth: user by email", sql: queries.USER_BY_EMAIL_SQL, params: ["a@b.c"] },
+  { name: "users: active teachers", sql: queries.ACTIVE_TEACHERS_SQL, params: [1] },
+  { name: "students: count", ...queries.studentListQueries({ instituteId: 1 }, PAGE).count },
+  { name: "students: page", ...queries.studentListQueries({ instituteId: 1 }, PAGE).page, ordered: true },
+  { name: "students: page by batch", ...queries.studentListQueries({ instituteId: 1, batchId: 1 }, PAGE).page },
+  {
+    name: "students: unpaid only",
+    ...queries.studentListQueries({ instituteId: 1, unpaidOnly: true }, PAGE).page,
+    ordered: true
+  },
+  { name: "students: batch links", sql: queries.STUDENT_BATCH_IDS_SQL, params: [1] },
+  { name: "batches: count", ...queries.batchListQueries({ instituteId: 1 }, PAGE).count },
+  { name: "batches: page", ...queries.batchListQueries({ instituteId: 1 }, PAGE).page, ordered: true },
+  { name: "batches: student page", ...queries.batchListQueries({ instituteId: 1, studentId: 1 }, PAGE).page },
+  { name: "batches: roster", sql: queries.BATCH_ROSTER_SQL, params: [1, 1] },
+  { name: "attendance: enrolled students", ...queries.enrolledStudentsQuery(1, [1, 2]) },
+  {
+    name: "attendance: history count",
+    ...queries.attendanceHistoryQueries({ instituteId: 1, dateFrom: DAY, dateTo: "2024-12-31" }, PAGE).count
+  },
+  { name: "attendance: history page", ...queries.attendanceHistoryQueries({ instituteId: 1 }, PAGE).page, ordered: true },
+  {
+    name: "attendance: history by batch",
+    ...queries.attendanceHistoryQueries({ instituteId: 1, batchId: 1 }, PAGE).page,
+    ordered: true
+  },
+  {
+    name: "attendance: student history",
+    ...queries.attendanceHistoryQueries({ instituteId: 1, viewerStudentId: 1 }, PAGE).page,
+    ordered: true
+  },
+  { name: "attendance: stats", ...queries.attendanceStatsQuery({ instituteId: 1, batchId: 1 }) },
+  {
+    name: "attendance: export page",
+    ...keysetPageQuery(queries.attendanceExportQuery({ instituteId: 1, dateFrom: DAY }), CURSOR),
+    ordered: true
+  },
+  { name: "notes: count", ...queries.noteListQueries({ instituteId: 1 }, PAGE).count },
+  { name: "notes: page", ...queries.noteListQueries({ instituteId: 1 }, PAGE).page, ordered: true },
+  { name: "notes: student page", ...queries.noteListQueries({ instituteId: 1, batchIds: [1, 2] }, PAGE).page },
+  { name: "fees: plans", sql: queries.FEE_PLANS_SQL, params: [1], ordered: true },
+  { name: "fees: ledger page", ...queries.feeLedgerQuery({ instituteId: 1 }, { newestFirst: true, ...PAGE }) },
+  { name: "fees: ledger count", ...queries.feeLedgerCountQuery({ instituteId: 1 }) },
+  { name: "fees: dues", ...queries.feeLedgerQuery({ instituteId: 1, outstandingOnly: true }) },
+  { name: "fees: dues by batch", ...queries.feeLedgerQuery({ instituteId: 1, batchId: 1, outstandingOnly: true }) },
+  { name: "fees: dues summary", ...queries.feeLedgerSummaryQuery({ instituteId: 1 }) },
+  { name: "fees: payments for fees", ...queries.feePaymentsQuery([1, 2]) },
+  { name: "fees: fee with paid total", sql: queries.STUDENT_FEE_WITH_PAID_SQL, params: [1] },
+  { name: "fees: payments page", ...queries.paymentListQueries({ instituteId: 1 }, PAGE).page, ordered: true },
+  {
+    name: "fees: payments export page",
+    ...keysetPageQuery(queries.paymentExportQuery({ instituteId: 1 }), CURSOR),
+    ordered: true
+  },
+  {
+    name: "fees: receipt bundle count",
+    ...queries.receiptBundleQueries({ instituteId: 1, batchId: 1, from: DAY, to: "2024-02-01" }).count
+  },
+  {
+    name: "fees: receipt bundle page",
+    ...keysetPageQuery(queries.receiptBundleQueries({ instituteId: 1, from: DAY, to: "2024-02-01" }).rows, CURSOR),
+    ordered: true
+  },
+  {
+    name: "fees: dues export page",
+    ...keysetPageQuery(queries.feeLedgerExportQuery({ instituteId: 1, outstandingOnly: true }), [0]),
+    ordered: true
+  },
+  {
+    name: "audit logs: export page",
+    ...keysetPageQuery(queries.auditLogExportQuery({ instituteId: 1 }), CURSOR),
+    ordered: true
+  },
+  { name: "notifications: page", ...queries.notificationListQueries({ instituteId: 1 }, PAGE).page, ordered: true },
+  {
+    name: "notifications: page by type",
+    ...queries.notificationListQueries({ instituteId: 1, type: "ANNOUNCEMENT" }, PAGE).page,
+    ordered: true
+  },
+  {
+    name: "notifications: student page",
+    ...queries.notificationListQueries({ instituteId: 1, viewerStudentId: 1, batchIds: [1] }, PAGE).page,
+    ordered: true
+  },
+  { name: "reminders: active rules", sql: queries.ACTIVE_REMINDER_RULES_SQL, params: [1] },
+  { name: "reminders: fee chunk", sql: queries.REMINDER_FEE_CHUNK_SQL, params: [1, 0, 500] },
+  { name: "reminders: existing keys", ...queries.existingRemindersQuery(["a", "b"]) },
+  { name: "dashboard: today's attendance", sql: queries.PRESENT_ON_DATE_SQL, params: [1, DAY] },
+  { name: "dashboard: student attendance", sql: queries.STUDENT_ATTENDANCE_SUMMARY_SQL, params: [1, 1] },
+  { name: "dashboard: batch notes", ...queries.batchNotesQuery([1, 2]) }
+];
+
+// A bare "SCAN <table>" is a full table scan; "SCAN <table> USING ... INDEX" walks an index in order.
+const FULL_SCAN_PATTERN = /^SCAN \w+$/;
+const SORT_PATTERN = /^USE TEMP B-TREE FOR (RIGHT PART OF )?ORDER BY$/;
+
+function planViolations(check, planRows) {
+  const problems = [];
+  for (const row of planRows) {
+    const detail = String(row.detail).trim();
+    if (FULL_SCAN_PATTERN.test(detail)) {
+      problems.push(detail);
+    }
+    if (check.ordered && SORT_PATTERN.test(detail)) {
+      problems.push(detail);
+    }
+  }
+  return problems;
+}
+
+async function checkQueryPlans(db) {
+  const failures = [];
+  for (const check of QUERY_PLAN_CHECKS) {
+    const planRows = await db.all(`EXPLAIN QUERY PLAN ${check.sql}`, check.params);
+    const problems = planViolations(check, planRows);
+    if (problems.length) {
+      failures.push({ name: check.name, problems, plan: planRows.map((row) => row.detail) });
+    }
+  }
+  return { checked: QUERY_PLAN_CHECKS.length, failures };
+}
+
+async function runQueryPlanCheck() {
+  await initializeSchema();
+  const db = await connectDb();
+  const { checked, failures } = await checkQueryPlans(db);
+  for (const failure of failures) {
+    process.stdout.write(`FAIL ${failure.name}: ${failure.problems.join("; ")}\n`);
+    for (const detail of failure.plan) {
+      process.stdout.write(`    ${detail}\n`);
+    }
+  }
+  process.stdout.write(`Checked ${checked} query plans, ${failures.length} regressed to a scan or sort.\n`);
+  if (failures.length) {
+    process.exitCode = 1;
+  }
+}
+
+if (require.main === module) {
+  runQueryPlanCheck().catch((error) => {
+    process.stderr.write(`Query plan check failed: ${error.message}\n`);
+    process.exit(1);
+  });
+}
+
+module.exports = {
+  QUERY_PLAN_CHECKS,
+  checkQueryPlans
+};
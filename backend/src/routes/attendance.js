@@ -1,10 +1,44 @@
 const express = require("express");
+const multer = require("multer");
 const { connectDb } = require("../db");
 const { requireAuth, requireRoles } = require("../auth");
 const { parsePagination } = require("./helpers");
-const { createAuditLog, buildAttendanceCsv } = require("../services");
+const { markAttendance, parseAttendanceCsv } = require("../services");
+const { iterateKeyset, streamCsvExport } = require("../exports");
+const { enrolledStudentsQuery, attendanceHistoryQueries, attendanceStatsQuery, attendanceExportQuery } = require("../queries");
 
 const router = express.Router();
+const upload = multer({ storage: multer.memoryStorage() });
+
+const ATTENDANCE_STATUSES = new Set(["PRESENT", "ABSENT"]);
+
+function invalidAttendanceEntry(entries) {
+  return entries.find(
+    (entry) =>
+      !Number.isInteger(entry.batch_id) ||
+      !Number.isInteger(entry.student_id) ||
+      !/^\d{4}-\d{2}-\d{2}$/.test(String(entry.date || "")) ||
+      !ATTENDANCE_STATUSES.has(entry.status)
+  );
+}
+
+async function findUnenrolledEntry(db, instituteId, entries) {
+  const batchIds = [...new Set(entries.map((entry) => entry.batch_id))];
+  const query = enrolledStudentsQuery(instituteId, batchIds);
+  const enrolled = await db.all(query.sql, query.params);
+  const enrolledSet = new Set(enrolled.map((item) => `${item.batch_id}|${item.student_id}`));
+  return entries.find((entry) => !enrolledSet.has(`${entry.batch_id}|${entry.student_id}`));
+}
+
+function attendanceFilters(query, instituteId) {
+  return {
+    instituteId,
+    batchId: query.batch_id ? Number(query.batch_id) : null,
+    studentId: query.student_id ? Number(query.student_id) : null,
+    dateFrom: query.date_from || null,
+    dateTo: query.date_to || null
+  };
+}
 
 router.post("/attendance/mark", requireRoles("ADMIN", "TEACHER"), async (req, res) => {
   const db = await connectDb();
@@ -12,124 +46,109 @@ router.post("/attendance/mark", requireRoles("ADMIN", "TEACHER"), async (req, re
   if (!batch) {
     return res.status(404).json({ detail: "Batch not found" });
   }
-  const enrolled = await db.all("SELECT student_id FROM student_batches WHERE batch_id = ? AND institute_id = ?", [
-    req.body.batch_id,
-    req.user.institute_id
-  ]);
-  const enrolledSet = new Set(enrolled.map((item) => item.student_id));
-  for (const record of req.body.records || []) {
-    if (!enrolledSet.has(record.student_id)) {
-      return res.status(400).json({ detail: "Attendance records include students not enrolled in this batch" });
-    }
+  const entries = (req.body.records || []).map((record) => ({
+    batch_id: batch.id,
+    student_id: record.student_id,
+    date: req.body.date,
+    status: record.status
+  }));
+  if (!entries.length) {
+    return res.json([]);
   }
-  const result = [];
-  for (const record of req.body.records || []) {
-    const existing = await db.get(
-      "SELECT * FROM attendance WHERE institute_id = ? AND batch_id = ? AND date = ? AND student_id = ?",
-      [req.user.institute_id, req.body.batch_id, req.body.date, record.student_id]
-    );
-    if (existing) {
-      await db.run("UPDATE attendance SET status = ?, marked_by = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?", [
-        record.status,
-        req.user.id,
-        existing.id
-      ]);
-      await createAuditLog(db, {
-        instituteId: req.user.institute_id,
-        actorUserId: req.user.id,
-        action: "ATTENDANCE_UPDATED",
-        entity: "attendance",
-        entityId: existing.id,
-        before: { status: existing.status },
-        after: { status: record.status }
-      });
-      result.push(await db.get("SELECT * FROM attendance WHERE id = ?", [existing.id]));
-    } else {
-      const created = await db.run(
-        `INSERT INTO attendance (institute_id, batch_id, student_id, date, status, marked_by)
-         VALUES (?, ?, ?, ?, ?, ?)`,
-        [req.user.institute_id, req.body.batch_id, record.student_id, req.body.date, record.status, req.user.id]
-      );
-      await createAuditLog(db, {
-        instituteId: req.user.institute_id,
-        actorUserId: req.user.id,
-        action: "ATTENDANCE_CREATED",
-        entity: "attendance",
-        entityId: created.lastID,
-        before: null,
-        after: { status: record.status }
-      });
-      result.push(await db.get("SELECT * FROM attendance WHERE id = ?", [created.lastID]));
-    }
+  if (invalidAttendanceEntry(entries)) {
+    return res.status(400).json({ detail: "Attendance records must have a student_id, a YYYY-MM-DD date and PRESENT or ABSENT status" });
   }
-  res.json(result);
+  if (await findUnenrolledEntry(db, req.user.institute_id, entries)) {
+    return res.status(400).json({ detail: "Attendance records include students not enrolled in this batch" });
+  }
+  const { rows } = await markAttendance(db, {
+    instituteId: req.user.institute_id,
+    actorUserId: req.user.id,
+    entries
+  });
+  res.json(rows);
 });
 
-router.get("/attendance/history", requireAuth, async (req, res) => {
+router.post("/attendance/mark-bulk", requireRoles("ADMIN", "TEACHER"), upload.single("file"), async (req, res) => {
   const db = await connectDb();
-  const { page, pageSize, offset } = parsePagination(req.query, 20);
-  const params = [req.user.institute_id];
-  let where = "WHERE institute_id = ?";
-  if (req.query.batch_id) {
-    where += " AND batch_id = ?";
-    params.push(Number(req.query.batch_id));
+  let entries;
+  if (req.file) {
+    try {
+      entries = parseAttendanceCsv(req.file.buffer.toString("utf8"), { date: req.body.date || null });
+    } catch (error) {
+      return res.status(400).json({ detail: error.message });
+    }
+  } else {
+    entries = (req.body.sessions || []).flatMap((session) =>
+      (session.records || []).map((record) => ({
+        batch_id: Number(session.batch_id),
+        student_id: record.student_id,
+        date: session.date,
+        status: record.status
+      }))
+    );
   }
-  if (req.query.student_id) {
-    where += " AND student_id = ?";
-    params.push(Number(req.query.student_id));
+  if (!entries.length) {
+    return res.status(400).json({ detail: "No attendance records supplied" });
   }
-  if (req.query.date_from) {
-    where += " AND date >= ?";
-    params.push(req.query.date_from);
+  if (invalidAttendanceEntry(entries)) {
+    return res.status(400).json({ detail: "Attendance records must have a batch_id, student_id, a YYYY-MM-DD date and PRESENT or ABSENT status" });
   }
-  if (req.query.date_to) {
-    where += " AND date <= ?";
-    params.push(req.query.date_to);
+  const batchIds = [...new Set(entries.map((entry) => entry.batch_id))];
+  const batches = await db.all(
+    `SELECT id FROM batches WHERE institute_id = ? AND id IN (${batchIds.map(() => "?").join(",")})`,
+    [req.user.institute_id, ...batchIds]
+  );
+  if (batches.length !== batchIds.length) {
+    return res.status(404).json({ detail: "Batch not found" });
   }
+  if (await findUnenrolledEntry(db, req.user.institute_id, entries)) {
+    return res.status(400).json({ detail: "Attendance records include students not enrolled in their batch" });
+  }
+  const { rows, created, updated } = await markAttendance(db, {
+    instituteId: req.user.institute_id,
+    actorUserId: req.user.id,
+    entries
+  });
+  res.json({
+    total: rows.length,
+    created,
+    updated,
+    sessions: new Set(rows.map((row) => `${row.batch_id}|${row.date}`)).size
+  });
+});
+
+router.get("/attendance/history", requireAuth, async (req, res) => {
+  const db = await connectDb();
+  const { page, pageSize, offset } = parsePagination(req.query, 20);
+  const filters = attendanceFilters(req.query, req.user.institute_id);
   if (req.user.role === "STUDENT") {
     if (!req.user.student_id) {
       return res.status(403).json({ detail: "Student profile missing" });
     }
-    where += " AND student_id = ?";
-    params.push(req.user.student_id);
+    filters.viewerStudentId = req.user.student_id;
   }
-  const total = await db.get(`SELECT COUNT(*) as total FROM attendance ${where}`, params);
-  const items = await db.all(
-    `SELECT * FROM attendance ${where}
-     ORDER BY date DESC, created_at DESC LIMIT ? OFFSET ?`,
-    [...params, pageSize, offset]
-  );
+  const queries = attendanceHistoryQueries(filters, { limit: pageSize, offset });
+  const total = await db.get(queries.count.sql, queries.count.params);
+  const items = await db.all(queries.page.sql, queries.page.params);
   res.json({ total: total.total, page, page_size: pageSize, items });
 });
 
 router.get("/attendance/stats", requireAuth, async (req, res) => {
   const db = await connectDb();
-  const params = [req.user.institute_id];
-  let where = "WHERE institute_id = ?";
-  if (req.query.batch_id) {
-    where += " AND batch_id = ?";
-    params.push(Number(req.query.batch_id));
-  }
-  if (req.query.student_id) {
-    where += " AND student_id = ?";
-    params.push(Number(req.query.student_id));
-  }
+  const filters = {
+    instituteId: req.user.institute_id,
+    batchId: req.query.batch_id ? Number(req.query.batch_id) : null,
+    studentId: req.query.student_id ? Number(req.query.student_id) : null
+  };
   if (req.user.role === "STUDENT") {
     if (!req.user.student_id) {
       return res.status(403).json({ detail: "Student profile missing" });
     }
-    where += " AND student_id = ?";
-    params.push(req.user.student_id);
+    filters.viewerStudentId = req.user.student_id;
   }
-  const rows = await db.all(
-    `SELECT student_id, batch_id,
-            COUNT(*) as total_classes,
-            SUM(CASE WHEN status = 'PRESENT' THEN 1 ELSE 0 END) as present_count,
-            SUM(CASE WHEN status = 'ABSENT' THEN 1 ELSE 0 END) as absent_count
-     FROM attendance ${where}
-     GROUP BY student_id, batch_id`,
-    params
-  );
+  const query = attendanceStatsQuery(filters);
+  const rows = await db.all(query.sql, query.params);
   res.json(
     rows.map((row) => {
       const total = Number(row.total_classes || 0);
@@ -149,29 +168,19 @@ router.get("/attendance/stats", requireAuth, async (req, res) => {
 
 router.get("/attendance/export", requireRoles("ADMIN", "TEACHER"), async (req, res) => {
   const db = await connectDb();
-  const params = [req.user.institute_id];
-  let where = "WHERE institute_id = ?";
-  if (req.query.batch_id) {
-    where += " AND batch_id = ?";
-    params.push(Number(req.query.batch_id));
-  }
-  if (req.query.student_id) {
-    where += " AND student_id = ?";
-    params.push(Number(req.query.student_id));
-  }
-  if (req.query.date_from) {
-    where += " AND date >= ?";
-    params.push(req.query.date_from);
-  }
-  if (req.query.date_to) {
-    where += " AND date <= ?";
-    params.push(req.query.date_to);
-  }
-  const rows = await db.all(`SELECT * FROM attendance ${where} ORDER BY date ASC`, params);
-  const csv = buildAttendanceCsv(rows);
-  res.setHeader("Content-Type", "text/csv");
-  res.setHeader("Content-Disposition", "attachment; filename=attendance_export.csv");
-  res.send(csv);
+  await streamCsvExport(req, res, {
+    filename: "attendance_export.csv",
+    columns: [
+      ["attendance_id", (row) => row.id],
+      ["batch_id", (row) => row.batch_id],
+      ["student_id", (row) => row.student_id],
+      ["date", (row) => row.date],
+      ["status", (row) => row.status],
+      ["marked_by", (row) => row.marked_by],
+      ["created_at", (row) => row.created_at]
+    ],
+    rows: iterateKeyset(db, attendanceExportQuery(attendanceFilters(req.query, req.user.institute_id)))
+  });
 });
 
 module.exports = router;
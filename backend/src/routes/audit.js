@@ -0,0 +1,36 @@
+const express = require("express");
+const { connectDb } = require("../db");
+const { requireRoles } = require("../auth");
+const { iterateKeyset, streamCsvExport } = require("../exports");
+const { auditLogExportQuery } = require("../queries");
+
+const router = express.Router();
+
+router.get("/audit-logs/export", requireRoles("ADMIN"), async (req, res) => {
+  const db = await connectDb();
+  await streamCsvExport(req, res, {
+    filename: "audit_logs_export.csv",
+    columns: [
+      ["audit_log_id", (row) => row.id],
+      ["actor_user_id", (row) => row.actor_user_id],
+      ["action", (row) => row.action],
+      ["entity", (row) => row.entity],
+      ["entity_id", (row) => row.entity_id],
+      ["before_json", (row) => row.before_json || ""],
+      ["after_json", (row) => row.after_json || ""],
+      ["created_at", (row) => row.created_at]
+    ],
+    rows: iterateKeyset(
+      db,
+      auditLogExportQuery({
+        instituteId: req.user.institute_id,
+        entity: req.query.entity || null,
+        action: req.query.action || null,
+        dateFrom: req.query.date_from || null,
+        dateTo: req.query.date_to || null
+      })
+    )
+  });
+});
+
+module.exports = router;
@@ -1,7 +1,9 @@
 const express = require("express");
 const { connectDb } = require("../db");
 const { requireAuth, requireRoles, verifyPassword, hashPassword, issueTokenPair, decodeRefreshToken } = require("../auth");
+const { isWorkerPoolBusy } = require("../workers");
 const { userResponse } = require("./helpers");
+const { USER_BY_ID_SQL, USER_BY_EMAIL_SQL } = require("../queries");
 
 const router = express.Router();
 
@@ -11,6 +13,15 @@ router.post("/auth/register", requireRoles("ADMIN"), async (req, res) => {
   if (existing) {
     return res.status(400).json({ detail: "Email already registered" });
   }
+  let passwordHash;
+  try {
+    passwordHash = await hashPassword(req.body.password);
+  } catch (error) {
+    if (isWorkerPoolBusy(error)) {
+      return res.status(503).json({ detail: "Server is busy, try again shortly" });
+    }
+    throw error;
+  }
   const result = await db.run(
     `INSERT INTO users (institute_id, full_name, email, phone, password_hash, role, student_id, is_active)
      VALUES (?, ?, ?, ?, ?, ?, ?, ?)`,
@@ -19,20 +30,29 @@ router.post("/auth/register", requireRoles("ADMIN"), async (req, res) => {
       req.body.full_name,
       req.body.email,
       req.body.phone || null,
-      hashPassword(req.body.password),
+      passwordHash,
       req.body.role,
       req.body.student_id || null,
       req.body.is_active == null ? 1 : req.body.is_active ? 1 : 0
     ]
   );
-  const user = await db.get("SELECT * FROM users WHERE id = ?", [result.lastID]);
+  const user = await db.get(USER_BY_ID_SQL, [result.lastID]);
   res.json(userResponse(user));
 });
 
 router.post("/auth/login", async (req, res) => {
   const db = await connectDb();
-  const user = await db.get("SELECT * FROM users WHERE email = ?", [req.body.email]);
-  if (!user || !verifyPassword(req.body.password || "", user.password_hash)) {
+  const user = await db.get(USER_BY_EMAIL_SQL, [req.body.email]);
+  let valid = false;
+  try {
+    valid = Boolean(user) && (await verifyPassword(req.body.password || "", user.password_hash));
+  } catch (error) {
+    if (isWorkerPoolBusy(error)) {
+      return res.status(503).json({ detail: "Server is busy, try again shortly" });
+    }
+    throw error;
+  }
+  if (!valid) {
     return res.status(401).json({ detail: "Invalid email or password" });
   }
   if (!user.is_active) {
@@ -49,7 +69,7 @@ router.post("/auth/refresh", async (req, res) => {
     return res.status(401).json({ detail: "Invalid refresh token" });
   }
   const db = await connectDb();
-  const user = await db.get("SELECT * FROM users WHERE id = ?", [Number(payload.sub)]);
+  const user = await db.get(USER_BY_ID_SQL, [Number(payload.sub)]);
   if (!user || !user.is_active) {
     return res.status(401).json({ detail: "Invalid refresh token" });
   }
@@ -2,6 +2,7 @@ const express = require("express");
 const { connectDb } = require("../db");
 const { requireAuth, requireRoles } = require("../auth");
 const { parsePagination } = require("./helpers");
+const { BATCH_ROSTER_SQL, batchListQueries } = require("../queries");
 
 const router = express.Router();
 
@@ -28,30 +29,16 @@ router.post("/batches", requireRoles("ADMIN", "TEACHER"), async (req, res) => {
 router.get("/batches", requireAuth, async (req, res) => {
   const db = await connectDb();
   const { page, pageSize, offset } = parsePagination(req.query, 10);
-  const params = [req.user.institute_id];
-  let joinSql = "";
-  let where = "WHERE b.institute_id = ?";
+  const filters = { instituteId: req.user.institute_id, search: req.query.search || null };
   if (req.user.role === "STUDENT") {
     if (!req.user.student_id) {
       return res.status(403).json({ detail: "Student profile not linked" });
     }
-    joinSql = "JOIN student_batches sb ON sb.batch_id = b.id";
-    where += " AND sb.student_id = ?";
-    params.push(req.user.student_id);
+    filters.studentId = req.user.student_id;
   }
-  if (req.query.search) {
-    where += " AND b.name LIKE ?";
-    params.push(`%${req.query.search}%`);
-  }
-  const total = await db.get(
-    `SELECT COUNT(*) as total FROM (SELECT DISTINCT b.id FROM batches b ${joinSql} ${where}) x`,
-    params
-  );
-  const rows = await db.all(
-    `SELECT DISTINCT b.* FROM batches b ${joinSql} ${where}
-     ORDER BY b.created_at DESC LIMIT ? OFFSET ?`,
-    [...params, pageSize, offset]
-  );
+  const queries = batchListQueries(filters, { limit: pageSize, offset });
+  const total = await db.get(queries.count.sql, queries.count.params);
+  const rows = await db.all(queries.page.sql, queries.page.params);
   res.json({ total: total.total, page, page_size: pageSize, items: rows });
 });
 
@@ -116,12 +103,7 @@ router.get("/batches/:batchId/students", requireAuth, async (req, res) => {
   if (!batch) {
     return res.status(404).json({ detail: "Batch not found" });
   }
-  const rows = await db.all(
-    `SELECT s.id, s.full_name, s.phone, s.email
-     FROM students s JOIN student_batches sb ON sb.student_id = s.id
-     WHERE sb.batch_id = ? AND s.institute_id = ? ORDER BY s.full_name ASC`,
-    [batchId, req.user.institute_id]
-  );
+  const rows = await db.all(BATCH_ROSTER_SQL, [batchId, req.user.institute_id]);
   res.json(rows);
 });
 
@@ -1,8 +1,10 @@
 const express = require("express");
 const { connectDb } = require("../db");
 const { requireAuth, requireRoles } = require("../auth");
-const { toMoneyNumber, sumPayments } = require("../utils/money");
-const { getStudentFeeWithPayments, calculateDueAmount, nextDueInstallment } = require("../services");
+const { toMoneyNumber } = require("../utils/money");
+const { loadFeeLedger, summarizeFeeLedger } = require("../services");
+const { loadStudentBatchIds } = require("../cache");
+const { PRESENT_ON_DATE_SQL, STUDENT_ATTENDANCE_SUMMARY_SQL, batchNotesQuery } = require("../queries");
 
 const router = express.Router();
 
@@ -12,30 +14,15 @@ router.get("/dashboard/admin", requireRoles("ADMIN", "TEACHER"), async (req, res
   const totalStudents = (await db.get("SELECT COUNT(*) as c FROM students WHERE institute_id = ?", [instituteId])).c;
   const totalBatches = (await db.get("SELECT COUNT(*) as c FROM batches WHERE institute_id = ?", [instituteId])).c;
   const today = new Date().toISOString().slice(0, 10);
-  const todayPresent = (
-    await db.get("SELECT COUNT(*) as c FROM attendance WHERE institute_id = ? AND date = ? AND status = 'PRESENT'", [instituteId, today])
-  ).c;
-  const feeRows = await db.all("SELECT * FROM student_fees WHERE institute_id = ?", [instituteId]);
-  let unpaidStudents = 0;
-  let totalDue = 0;
-  const upcoming = [];
-  for (const fee of feeRows) {
-    const full = await getStudentFeeWithPayments(db, fee.id);
-    const due = calculateDueAmount(full);
-    if (due > 0) {
-      unpaidStudents += 1;
-      totalDue += due;
-      const student = await db.get("SELECT full_name FROM students WHERE id = ?", [fee.student_id]);
-      const batch = await db.get("SELECT name FROM batches WHERE id = ?", [fee.batch_id]);
-      const { nextDueDate, upcomingAmount } = nextDueInstallment(full);
-      upcoming.push({
-        student_name: student?.full_name || "",
-        batch_name: batch?.name || "",
-        next_due_date: nextDueDate,
-        due_amount: Number((upcomingAmount ?? due).toFixed(2))
-      });
-    }
-  }
+  const todayPresent = (await db.get(PRESENT_ON_DATE_SQL, [instituteId, today])).c;
+  const { unpaid: unpaidStudents, totalDue } = await summarizeFeeLedger(db, { instituteId });
+  const dueRows = await loadFeeLedger(db, { instituteId, outstandingOnly: true }, { limit: 10 });
+  const upcoming = dueRows.map((fee) => ({
+    student_name: fee.student_name || "",
+    batch_name: fee.batch_name || "",
+    next_due_date: fee.next_due_date,
+    due_amount: Number((fee.upcoming_due_amount ?? fee.due_amount).toFixed(2))
+  }));
   const notifications = await db.all(
     "SELECT id, type, message, created_at FROM notifications WHERE institute_id = ? ORDER BY created_at DESC LIMIT 5",
     [instituteId]
@@ -46,7 +33,7 @@ router.get("/dashboard/admin", requireRoles("ADMIN", "TEACHER"), async (req, res
     today_present_records: todayPresent,
     unpaid_students: unpaidStudents,
     total_due_amount: Number(totalDue.toFixed(2)),
-    upcoming_dues: upcoming.slice(0, 10),
+    upcoming_dues: upcoming,
     recent_notifications: notifications
   });
 });
@@ -60,8 +47,7 @@ router.get("/dashboard/student", requireAuth, async (req, res) => {
   if (!student) {
     return res.status(404).json({ detail: "Student profile not found" });
   }
-  const links = await db.all("SELECT batch_id FROM student_batches WHERE student_id = ?", [student.id]);
-  const batchIds = links.map((item) => item.batch_id);
+  const batchIds = await loadStudentBatchIds(db, student.id);
   const batches = batchIds.length
     ? await db.all(
         `SELECT b.*, u.full_name as teacher_name FROM batches b
@@ -70,36 +56,26 @@ router.get("/dashboard/student", requireAuth, async (req, res) => {
         batchIds
       )
     : [];
-  const notes = batchIds.length
-    ? await db.all(
-        `SELECT id, batch_id, title, description, file_name, created_at
-         FROM notes WHERE batch_id IN (${batchIds.map(() => "?").join(",")})
-         ORDER BY created_at DESC LIMIT 30`,
-        batchIds
-      )
-    : [];
-  const attendanceRows = await db.all(
-    `SELECT batch_id, COUNT(*) as total, SUM(CASE WHEN status = 'PRESENT' THEN 1 ELSE 0 END) as present
-     FROM attendance WHERE student_id = ? AND institute_id = ? GROUP BY batch_id`,
-    [student.id, req.user.institute_id]
-  );
+  const notesQuery = batchIds.length ? batchNotesQuery(batchIds) : null;
+  const notes = notesQuery ? await db.all(notesQuery.sql, notesQuery.params) : [];
+  const attendanceRows = await db.all(STUDENT_ATTENDANCE_SUMMARY_SQL, [student.id, req.user.institute_id]);
   const fees = [];
   let totalDue = 0;
-  const feeRows = await db.all("SELECT * FROM student_fees WHERE student_id = ?", [student.id]);
+  const feeRows = await loadFeeLedger(
+    db,
+    { instituteId: req.user.institute_id, studentId: student.id },
+    { withPayments: true }
+  );
   for (const row of feeRows) {
-    const full = await getStudentFeeWithPayments(db, row.id);
-    const paid = sumPayments(full.payments || []);
-    const due = calculateDueAmount(full);
-    totalDue += due;
-    const batch = await db.get("SELECT name FROM batches WHERE id = ?", [row.batch_id]);
+    totalDue += row.due_amount;
     fees.push({
       student_fee_id: row.id,
-      batch_name: batch?.name || "",
+      batch_name: row.batch_name || "",
       total_fee: Number(toMoneyNumber(row.total_fee).toFixed(2)),
       discount: Number(toMoneyNumber(row.discount).toFixed(2)),
-      paid_amount: Number(paid.toFixed(2)),
-      due_amount: Number(due.toFixed(2)),
-      payments: (full.payments || []).map((p) => ({
+      paid_amount: Number(row.paid_amount.toFixed(2)),
+      due_amount: Number(row.due_amount.toFixed(2)),
+      payments: row.payments.map((p) => ({
         id: p.id,
         amount: Number(toMoneyNumber(p.amount).toFixed(2)),
         date: p.paid_on,
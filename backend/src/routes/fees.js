@@ -1,23 +1,33 @@
+const fs = require("fs");
 const express = require("express");
 const { randomUUID } = require("crypto");
-const { connectDb } = require("../db");
+const config = require("../config");
+const { connectDb, withTransaction } = require("../db");
 const { requireAuth, requireRoles } = require("../auth");
 const { parsePagination } = require("./helpers");
-const { formatMoney, toMoneyNumber, sumPayments } = require("../utils/money");
+const { formatMoney, toMoneyNumber } = require("../utils/money");
 const {
   createAuditLog,
   parseSchedule,
   getStudentFeeWithPayments,
+  paidTotal,
   calculateDueAmount,
-  nextDueInstallment,
-  generateReceiptPdf
+  refreshFeeBalance,
+  countFeeLedger,
+  loadFeeLedger,
+  iterateFeeLedger,
+  ensureReceiptFile
 } = require("../services");
+const { iterateKeyset, streamCsvExport, streamZipExport } = require("../exports");
+const { isWorkerPoolBusy } = require("../workers");
+const { MAX_ZIP_ENTRIES } = require("../zip");
+const { FEE_PLANS_SQL, paymentListQueries, paymentExportQuery, receiptBundleQueries } = require("../queries");
 
 const router = express.Router();
 
 function serializeStudentFee(row) {
-  const paid = sumPayments(row.payments || []);
-  const dueAmount = Math.max(toMoneyNumber(row.total_fee) - toMoneyNumber(row.discount) - paid, 0);
+  const paid = paidTotal(row);
+  const dueAmount = calculateDueAmount(row);
   return {
     id: row.id,
     student_id: row.student_id,
@@ -52,7 +62,7 @@ router.post("/fees/plans", requireRoles("ADMIN", "TEACHER"), async (req, res) =>
 
 router.get("/fees/plans", requireRoles("ADMIN", "TEACHER"), async (req, res) => {
   const db = await connectDb();
-  const rows = await db.all("SELECT * FROM fee_plans WHERE institute_id = ? ORDER BY created_at DESC", [req.user.institute_id]);
+  const rows = await db.all(FEE_PLANS_SQL, [req.user.institute_id]);
   res.json(rows.map((row) => ({ ...row, metadata_json: row.metadata_json ? JSON.parse(row.metadata_json) : null })));
 });
 
@@ -135,127 +145,150 @@ router.post("/fees/student-fees", requireRoles("ADMIN", "TEACHER"), async (req,
     }
   }
   const dueSchedule = (req.body.due_schedule || []).map((item) => ({ due_date: item.due_date, amount: String(item.amount) }));
-  const created = await db.run(
-    `INSERT INTO student_fees (institute_id, student_id, batch_id, fee_plan_id, total_fee, discount, due_schedule_json)
-     VALUES (?, ?, ?, ?, ?, ?, ?)`,
-    [
-      req.user.institute_id,
-      req.body.student_id,
-      req.body.batch_id,
-      req.body.fee_plan_id || null,
-      req.body.total_fee,
-      req.body.discount || 0,
-      JSON.stringify(dueSchedule)
-    ]
-  );
-  const row = await getStudentFeeWithPayments(db, created.lastID);
+  const studentFeeId = await withTransaction(db, async (tx) => {
+    const created = await tx.run(
+      `INSERT INTO student_fees (institute_id, student_id, batch_id, fee_plan_id, total_fee, discount, due_schedule_json)
+       VALUES (?, ?, ?, ?, ?, ?, ?)`,
+      [
+        req.user.institute_id,
+        req.body.student_id,
+        req.body.batch_id,
+        req.body.fee_plan_id || null,
+        req.body.total_fee,
+        req.body.discount || 0,
+        JSON.stringify(dueSchedule)
+      ]
+    );
+    await refreshFeeBalance(tx, created.lastID);
+    return created.lastID;
+  });
+  const row = await getStudentFeeWithPayments(db, studentFeeId);
   res.status(201).json(serializeStudentFee(row));
 });
 
 router.get("/fees/student-fees", requireAuth, async (req, res) => {
   const db = await connectDb();
   const { page, pageSize, offset } = parsePagination(req.query, 20);
-  const params = [req.user.institute_id];
-  let where = "WHERE institute_id = ?";
-  if (req.query.student_id) {
-    where += " AND student_id = ?";
-    params.push(Number(req.query.student_id));
-  }
-  if (req.query.batch_id) {
-    where += " AND batch_id = ?";
-    params.push(Number(req.query.batch_id));
-  }
+  const filters = {
+    instituteId: req.user.institute_id,
+    studentId: req.query.student_id ? Number(req.query.student_id) : null,
+    batchId: req.query.batch_id ? Number(req.query.batch_id) : null
+  };
   if (req.user.role === "STUDENT") {
     if (!req.user.student_id) {
       return res.status(403).json({ detail: "Student profile missing" });
     }
-    where += " AND student_id = ?";
-    params.push(req.user.student_id);
+    filters.viewerStudentId = req.user.student_id;
   }
-  const total = await db.get(`SELECT COUNT(*) AS total FROM student_fees ${where}`, params);
-  const rows = await db.all(
-    `SELECT * FROM student_fees ${where}
-     ORDER BY created_at DESC LIMIT ? OFFSET ?`,
-    [...params, pageSize, offset]
-  );
-  const items = [];
-  for (const row of rows) {
-    items.push(serializeStudentFee(await getStudentFeeWithPayments(db, row.id)));
-  }
-  res.json({ total: total.total, page, page_size: pageSize, items });
+  const total = await countFeeLedger(db, filters);
+  const rows = await loadFeeLedger(db, filters, { newestFirst: true, limit: pageSize, offset });
+  res.json({ total, page, page_size: pageSize, items: rows.map(serializeStudentFee) });
 });
 
 router.post("/fees/payments", requireRoles("ADMIN", "TEACHER"), async (req, res) => {
   const db = await connectDb();
-  const studentFee = await getStudentFeeWithPayments(db, req.body.student_fee_id);
-  if (!studentFee || studentFee.institute_id !== req.user.institute_id) {
+  const studentFee = await db.get("SELECT id FROM student_fees WHERE id = ? AND institute_id = ?", [
+    req.body.student_fee_id,
+    req.user.institute_id
+  ]);
+  if (!studentFee) {
     return res.status(404).json({ detail: "Student fee mapping not found" });
   }
-  const due = calculateDueAmount(studentFee);
-  if (toMoneyNumber(req.body.amount) > due) {
-    return res.status(400).json({ detail: "Payment exceeds due amount" });
-  }
   const receiptNo = `RCPT-${new Date().toISOString().replace(/[-:TZ.]/g, "").slice(0, 14)}-${randomUUID().slice(0, 6).toUpperCase()}`;
-  const created = await db.run(
-    `INSERT INTO payments (institute_id, student_fee_id, amount, paid_on, mode, receipt_no, remarks, created_by)
-     VALUES (?, ?, ?, ?, ?, ?, ?, ?)`,
-    [
-      req.user.institute_id,
-      req.body.student_fee_id,
-      req.body.amount,
-      req.body.paid_on,
-      req.body.mode,
-      receiptNo,
-      req.body.remarks || null,
-      req.user.id
-    ]
-  );
-  await createAuditLog(db, {
-    instituteId: req.user.institute_id,
-    actorUserId: req.user.id,
-    action: "FEE_PAYMENT_CREATED",
-    entity: "payment",
-    entityId: created.lastID,
-    before: null,
-    after: {
-      student_fee_id: req.body.student_fee_id,
-      amount: formatMoney(req.body.amount),
-      mode: req.body.mode,
-      receipt_no: receiptNo
+  const paymentId = await withTransaction(db, async (tx) => {
+    const balance =
+      (await tx.get("SELECT due_amount FROM student_fee_balances WHERE student_fee_id = ?", [studentFee.id])) ||
+      (await refreshFeeBalance(tx, studentFee.id));
+    if (toMoneyNumber(req.body.amount) > toMoneyNumber(balance.due_amount)) {
+      return null;
     }
+    const created = await tx.run(
+      `INSERT INTO payments (institute_id, student_fee_id, amount, paid_on, mode, receipt_no, remarks, created_by)
+       VALUES (?, ?, ?, ?, ?, ?, ?, ?)`,
+      [
+        req.user.institute_id,
+        studentFee.id,
+        req.body.amount,
+        req.body.paid_on,
+        req.body.mode,
+        receiptNo,
+        req.body.remarks || null,
+        req.user.id
+      ]
+    );
+    await createAuditLog(tx, {
+      instituteId: req.user.institute_id,
+      actorUserId: req.user.id,
+      action: "FEE_PAYMENT_CREATED",
+      entity: "payment",
+      entityId: created.lastID,
+      before: null,
+      after: {
+        student_fee_id: studentFee.id,
+        amount: formatMoney(req.body.amount),
+        mode: req.body.mode,
+        receipt_no: receiptNo
+      }
+    });
+    await refreshFeeBalance(tx, studentFee.id);
+    return created.lastID;
   });
-  const payment = await db.get("SELECT * FROM payments WHERE id = ?", [created.lastID]);
+  if (paymentId == null) {
+    return res.status(400).json({ detail: "Payment exceeds due amount" });
+  }
+  const payment = await db.get("SELECT * FROM payments WHERE id = ?", [paymentId]);
   res.status(201).json(payment);
 });
 
 router.get("/fees/payments", requireAuth, async (req, res) => {
   const db = await connectDb();
   const { page, pageSize, offset } = parsePagination(req.query, 20);
-  const params = [req.user.institute_id];
-  let where = "WHERE p.institute_id = ?";
-  if (req.query.student_fee_id) {
-    where += " AND p.student_fee_id = ?";
-    params.push(Number(req.query.student_fee_id));
-  }
+  const filters = {
+    instituteId: req.user.institute_id,
+    studentFeeId: req.query.student_fee_id ? Number(req.query.student_fee_id) : null
+  };
   if (req.user.role === "STUDENT") {
     if (!req.user.student_id) {
       return res.status(403).json({ detail: "Student profile missing" });
     }
-    where += " AND sf.student_id = ?";
-    params.push(req.user.student_id);
+    filters.viewerStudentId = req.user.student_id;
   }
-  const total = await db.get(
-    `SELECT COUNT(*) AS total FROM payments p JOIN student_fees sf ON sf.id = p.student_fee_id ${where}`,
-    params
-  );
-  const items = await db.all(
-    `SELECT p.* FROM payments p JOIN student_fees sf ON sf.id = p.student_fee_id ${where}
-     ORDER BY p.created_at DESC LIMIT ? OFFSET ?`,
-    [...params, pageSize, offset]
-  );
+  const queries = paymentListQueries(filters, { limit: pageSize, offset });
+  const total = await db.get(queries.count.sql, queries.count.params);
+  const items = await db.all(queries.page.sql, queries.page.params);
   res.json({ total: total.total, page, page_size: pageSize, items });
 });
 
+router.get("/fees/payments/export", requireRoles("ADMIN", "TEACHER"), async (req, res) => {
+  const db = await connectDb();
+  const query = paymentExportQuery({
+    instituteId: req.user.institute_id,
+    studentFeeId: req.query.student_fee_id ? Number(req.query.student_fee_id) : null,
+    batchId: req.query.batch_id ? Number(req.query.batch_id) : null,
+    dateFrom: req.query.date_from || null,
+    dateTo: req.query.date_to || null
+  });
+  await streamCsvExport(req, res, {
+    filename: "payments_export.csv",
+    columns: [
+      ["payment_id", (row) => row.id],
+      ["receipt_no", (row) => row.receipt_no],
+      ["student_fee_id", (row) => row.student_fee_id],
+      ["student_id", (row) => row.student_id],
+      ["student_name", (row) => row.student_name || ""],
+      ["batch_id", (row) => row.batch_id],
+      ["batch_name", (row) => row.batch_name || ""],
+      ["amount", (row) => formatMoney(row.amount)],
+      ["mode", (row) => row.mode],
+      ["paid_on", (row) => row.paid_on],
+      ["remarks", (row) => row.remarks || ""],
+      ["created_by", (row) => row.created_by],
+      ["created_at", (row) => row.created_at]
+    ],
+    rows: iterateKeyset(db, query)
+  });
+});
+
 router.get("/fees/payments/:paymentId/receipt", requireAuth, async (req, res) => {
   const db = await connectDb();
   const payment = await db.get("SELECT * FROM payments WHERE id = ? AND institute_id = ?", [
@@ -276,63 +309,157 @@ router.get("/fees/payments/:paymentId/receipt", requireAuth, async (req, res) =>
       return res.status(403).json({ detail: "Not allowed" });
     }
   }
-  const pdf = await generateReceiptPdf({ payment, studentFee, student, batch });
-  res.setHeader("Content-Type", "application/pdf");
-  res.setHeader("Content-Disposition", `attachment; filename=receipt-${payment.receipt_no}.pdf`);
-  res.send(pdf);
+  let filePath;
+  try {
+    filePath = await ensureReceiptFile({ payment, studentFee, student, batch });
+  } catch (error) {
+    if (isWorkerPoolBusy(error)) {
+      return res.status(503).json({ detail: "Server is busy, try again shortly" });
+    }
+    throw error;
+  }
+  res.sendFile(filePath, {
+    headers: {
+      "Content-Type": "application/pdf",
+      "Content-Disposition": `attachment; filename=receipt-${payment.receipt_no}.pdf`
+    }
+  });
 });
 
-router.get("/fees/dues", requireAuth, async (req, res) => {
+function monthRange(month) {
+  const match = /^(\d{4})-(\d{2})$/.exec(String(month));
+  if (!match || Number(match[2]) < 1 || Number(match[2]) > 12) {
+    return null;
+  }
+  const next = new Date(Date.UTC(Number(match[1]), Number(match[2]), 1)).toISOString().slice(0, 10);
+  return { from: `${month}-01`, to: next };
+}
+
+function receiptFileName(receiptNo) {
+  return `receipt-${String(receiptNo).replace(/[^\w.-]/g, "_")}.pdf`;
+}
+
+// Renders up to `lookahead` receipts ahead of the one being written, so the worker pool
+// stays busy while the zip streams, and yields them in payment order. The first receipt
+// is rendered on its own: the response is only committed once it is ready, so a busy
+// pool gets a 503 rather than a zip cut short by its prefetched renders.
+async function* receiptEntries(rows, lookahead) {
+  const pending = [];
+  let window = 1;
+  for await (const row of rows) {
+    const entry = ensureReceiptFile({
+      payment: row,
+      studentFee: { total_fee: row.total_fee, discount: row.discount },
+      student: { full_name: row.student_name },
+      batch: { name: row.batch_name, course: row.batch_course }
+    }).then(async (filePath) => ({
+      name: receiptFileName(row.receipt_no),
+      data: await fs.promises.readFile(filePath),
+      date: new Date(`${row.paid_on}T00:00:00`)
+    }));
+    entry.catch(() => {});
+    pending.push(entry);
+    if (pending.length >= window) {
+      yield await pending.shift();
+      window = lookahead;
+    }
+  }
+  while (pending.length) {
+    yield await pending.shift();
+  }
+}
+
+router.get("/fees/receipts/export", requireRoles("ADMIN", "TEACHER"), async (req, res) => {
   const db = await connectDb();
-  const params = [req.user.institute_id];
-  let where = "WHERE institute_id = ?";
+  if (!req.query.batch_id && !req.query.month) {
+    return res.status(400).json({ detail: "Provide batch_id, month (YYYY-MM) or both" });
+  }
+  const filters = { instituteId: req.user.institute_id };
+  const nameParts = ["receipts"];
   if (req.query.batch_id) {
-    where += " AND batch_id = ?";
-    params.push(Number(req.query.batch_id));
+    filters.batchId = Number(req.query.batch_id);
+    nameParts.push(`batch-${filters.batchId}`);
+  }
+  if (req.query.month) {
+    const range = monthRange(req.query.month);
+    if (!range) {
+      return res.status(400).json({ detail: "month must be YYYY-MM" });
+    }
+    Object.assign(filters, range);
+    nameParts.push(req.query.month);
   }
-  if (req.query.student_id) {
-    where += " AND student_id = ?";
-    params.push(Number(req.query.student_id));
+  const queries = receiptBundleQueries(filters);
+  const count = await db.get(queries.count.sql, queries.count.params);
+  if (count.total > MAX_ZIP_ENTRIES) {
+    return res.status(400).json({ detail: `Too many receipts (${count.total}); narrow the filter` });
   }
+  await streamZipExport(req, res, {
+    filename: `${nameParts.join("_")}.zip`,
+    entries: receiptEntries(iterateKeyset(db, queries.rows), Math.max(config.workerPoolSize, 1))
+  });
+});
+
+router.get("/fees/dues", requireAuth, async (req, res) => {
+  const db = await connectDb();
+  const filters = {
+    instituteId: req.user.institute_id,
+    studentId: req.query.student_id ? Number(req.query.student_id) : null,
+    batchId: req.query.batch_id ? Number(req.query.batch_id) : null,
+    outstandingOnly: true,
+    dueFrom: req.query.due_from || null,
+    dueTo: req.query.due_to || null
+  };
   if (req.user.role === "STUDENT") {
     if (!req.user.student_id) {
       return res.status(403).json({ detail: "Student profile missing" });
     }
-    where += " AND student_id = ?";
-    params.push(req.user.student_id);
+    filters.viewerStudentId = req.user.student_id;
   }
-  const rows = await db.all(`SELECT * FROM student_fees ${where}`, params);
-  const results = [];
-  for (const row of rows) {
-    const full = await getStudentFeeWithPayments(db, row.id);
-    const dueAmount = calculateDueAmount(full);
-    if (dueAmount <= 0) {
-      continue;
-    }
-    const student = await db.get("SELECT full_name FROM students WHERE id = ?", [row.student_id]);
-    const batch = await db.get("SELECT name FROM batches WHERE id = ?", [row.batch_id]);
-    const { nextDueDate, upcomingAmount } = nextDueInstallment(full);
-    if (req.query.due_from && nextDueDate && nextDueDate < req.query.due_from) {
-      continue;
-    }
-    if (req.query.due_to && nextDueDate && nextDueDate > req.query.due_to) {
-      continue;
-    }
-    results.push({
+  const rows = await loadFeeLedger(db, filters);
+  res.json(
+    rows.map((row) => ({
       student_fee_id: row.id,
       student_id: row.student_id,
-      student_name: student?.full_name || "",
+      student_name: row.student_name || "",
       batch_id: row.batch_id,
-      batch_name: batch?.name || "",
+      batch_name: row.batch_name || "",
       total_fee: formatMoney(row.total_fee),
       discount: formatMoney(row.discount),
-      paid_amount: formatMoney(sumPayments(full.payments || [])),
-      due_amount: formatMoney(dueAmount),
-      next_due_date: nextDueDate,
-      upcoming_due_amount: upcomingAmount == null ? null : formatMoney(upcomingAmount)
-    });
-  }
-  res.json(results);
+      paid_amount: formatMoney(row.paid_amount),
+      due_amount: formatMoney(row.due_amount),
+      next_due_date: row.next_due_date,
+      upcoming_due_amount: row.upcoming_due_amount == null ? null : formatMoney(row.upcoming_due_amount)
+    }))
+  );
+});
+
+router.get("/fees/dues/export", requireRoles("ADMIN", "TEACHER"), async (req, res) => {
+  const db = await connectDb();
+  const rows = iterateFeeLedger(db, {
+    instituteId: req.user.institute_id,
+    studentId: req.query.student_id ? Number(req.query.student_id) : null,
+    batchId: req.query.batch_id ? Number(req.query.batch_id) : null,
+    outstandingOnly: true,
+    dueFrom: req.query.due_from || null,
+    dueTo: req.query.due_to || null
+  });
+  await streamCsvExport(req, res, {
+    filename: "dues_export.csv",
+    columns: [
+      ["student_fee_id", (row) => row.id],
+      ["student_id", (row) => row.student_id],
+      ["student_name", (row) => row.student_name || ""],
+      ["batch_id", (row) => row.batch_id],
+      ["batch_name", (row) => row.batch_name || ""],
+      ["total_fee", (row) => formatMoney(row.total_fee)],
+      ["discount", (row) => formatMoney(row.discount)],
+      ["paid_amount", (row) => formatMoney(row.paid_amount)],
+      ["due_amount", (row) => formatMoney(row.due_amount)],
+      ["next_due_date", (row) => row.next_due_date || ""],
+      ["upcoming_due_amount", (row) => (row.upcoming_due_amount == null ? "" : formatMoney(row.upcoming_due_amount))]
+    ],
+    rows
+  });
 });
 
 module.exports = router;
@@ -1,3 +1,5 @@
+const { STUDENT_BATCH_IDS_SQL } = require("../queries");
+
 function parsePagination(query, defaultSize = 20) {
   const page = Math.max(Number(query.page) || 1, 1);
   const pageSize = Math.max(Math.min(Number(query.page_size) || defaultSize, 200), 1);
@@ -20,7 +22,7 @@ function userResponse(user) {
 }
 
 async function serializeStudent(db, student) {
-  const links = await db.all("SELECT batch_id FROM student_batches WHERE student_id = ?", [student.id]);
+  const links = await db.all(STUDENT_BATCH_IDS_SQL, [student.id]);
   return { ...student, batch_ids: links.map((item) => item.batch_id) };
 }
 
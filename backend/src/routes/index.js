@@ -9,6 +9,8 @@ const fees = require("./fees");
 const notes = require("./notes");
 const notifications = require("./notifications");
 const dashboard = require("./dashboard");
+const audit = require("./audit");
+const metrics = require("./metrics");
 
 const router = express.Router();
 
@@ -22,5 +24,7 @@ router.use(fees);
 router.use(notes);
 router.use(notifications);
 router.use(dashboard);
+router.use(audit);
+router.use(metrics);
 
 module.exports = router;
@@ -0,0 +1,46 @@
+const crypto = require("crypto");
+const express = require("express");
+const config = require("../config");
+const { cacheStats } = require("../cache");
+const { metricsSnapshot, resetMetrics } = require("../instrumentation");
+const { workerPool } = require("../workers");
+
+const router = express.Router();
+
+function tokenDigest(token) {
+  return crypto.createHash("sha256").update(token).digest();
+}
+
+// The counters cover every institute this process serves (routes, SQL, cache and pool
+// sizes), so they belong to whoever runs the deployment, not to an institute admin. The
+// endpoints only exist when METRICS_TOKEN is set, and callers send that token as a bearer
+// token instead of signing in.
+function requireMetricsToken(req, res, next) {
+  if (!config.metricsToken) {
+    return res.status(404).json({ detail: "Not found" });
+  }
+  const authHeader = req.headers.authorization || "";
+  const token = authHeader.startsWith("Bearer ") ? authHeader.slice("Bearer ".length) : "";
+  if (!crypto.timingSafeEqual(tokenDigest(token), tokenDigest(config.metricsToken))) {
+    return res.status(401).json({ detail: "Invalid metrics token" });
+  }
+  return next();
+}
+
+router.get("/metrics", requireMetricsToken, async (req, res) => {
+  const { since, routes, queries } = metricsSnapshot();
+  res.json({
+    since,
+    routes,
+    queries,
+    caches: cacheStats(),
+    worker_pool: workerPool().stats()
+  });
+});
+
+router.post("/metrics/reset", requireMetricsToken, async (req, res) => {
+  resetMetrics();
+  res.status(204).send();
+});
+
+module.exports = router;
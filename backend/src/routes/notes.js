@@ -6,6 +6,8 @@ const { connectDb } = require("../db");
 const { requireAuth, requireRoles } = require("../auth");
 const { parsePagination } = require("./helpers");
 const { storeNoteFile, resolveStoragePath } = require("../services");
+const { loadStudentBatchIds } = require("../cache");
+const { noteListQueries } = require("../queries");
 
 const router = express.Router();
 const upload = multer({ storage: multer.memoryStorage() });
@@ -42,30 +44,22 @@ router.post("/notes", requireRoles("ADMIN", "TEACHER"), upload.single("file"), a
 router.get("/notes", requireAuth, async (req, res) => {
   const db = await connectDb();
   const { page, pageSize, offset } = parsePagination(req.query, 20);
-  const params = [req.user.institute_id];
-  let where = "WHERE n.institute_id = ?";
-  let joinSql = "";
-  if (req.query.batch_id) {
-    where += " AND n.batch_id = ?";
-    params.push(Number(req.query.batch_id));
-  }
+  const filters = {
+    instituteId: req.user.institute_id,
+    batchId: req.query.batch_id ? Number(req.query.batch_id) : null
+  };
   if (req.user.role === "STUDENT") {
     if (!req.user.student_id) {
       return res.status(403).json({ detail: "Student profile missing" });
     }
-    joinSql = "JOIN student_batches sb ON sb.batch_id = n.batch_id";
-    where += " AND sb.student_id = ?";
-    params.push(req.user.student_id);
+    filters.batchIds = await loadStudentBatchIds(db, req.user.student_id);
+    if (!filters.batchIds.length) {
+      return res.json({ total: 0, page, page_size: pageSize, items: [] });
+    }
   }
-  const total = await db.get(
-    `SELECT COUNT(*) as total FROM (SELECT DISTINCT n.id FROM notes n ${joinSql} ${where}) x`,
-    params
-  );
-  const rows = await db.all(
-    `SELECT DISTINCT n.* FROM notes n ${joinSql} ${where}
-     ORDER BY n.created_at DESC LIMIT ? OFFSET ?`,
-    [...params, pageSize, offset]
-  );
+  const queries = noteListQueries(filters, { limit: pageSize, offset });
+  const total = await db.get(queries.count.sql, queries.count.params);
+  const rows = await db.all(queries.page.sql, queries.page.params);
   res.json({ total: total.total, page, page_size: pageSize, items: rows });
 });
 
@@ -80,8 +74,8 @@ router.get("/notes/:noteId/download", requireAuth, async (req, res) => {
     if (!req.user.student_id) {
       return res.status(403).json({ detail: "Student profile missing" });
     }
-    const link = await db.get("SELECT id FROM student_batches WHERE student_id = ? AND batch_id = ?", [req.user.student_id, note.batch_id]);
-    if (!link) {
+    const batchIds = await loadStudentBatchIds(db, req.user.student_id);
+    if (!batchIds.includes(note.batch_id)) {
       return res.status(403).json({ detail: "Not allowed" });
     }
   }
@@ -3,39 +3,25 @@ const { connectDb } = require("../db");
 const { requireAuth, requireRoles } = require("../auth");
 const { parsePagination } = require("./helpers");
 const { runFeeReminders } = require("../services");
+const { loadStudentBatchIds } = require("../cache");
+const { notificationListQueries } = require("../queries");
 
 const router = express.Router();
 
 router.get("/notifications", requireAuth, async (req, res) => {
   const db = await connectDb();
   const { page, pageSize, offset } = parsePagination(req.query, 20);
-  const params = [req.user.institute_id];
-  let where = "WHERE institute_id = ?";
-  if (req.query.type) {
-    where += " AND type = ?";
-    params.push(req.query.type);
-  }
+  const filters = { instituteId: req.user.institute_id, type: req.query.type || null };
   if (req.user.role === "STUDENT") {
     if (!req.user.student_id) {
       return res.status(403).json({ detail: "Student profile missing" });
     }
-    const links = await db.all("SELECT batch_id FROM student_batches WHERE student_id = ?", [req.user.student_id]);
-    const batchIds = links.map((item) => item.batch_id);
-    let clause = "(student_id = ? OR (student_id IS NULL AND batch_id IS NULL)";
-    params.push(req.user.student_id);
-    if (batchIds.length) {
-      clause += ` OR (student_id IS NULL AND batch_id IN (${batchIds.map(() => "?").join(",")}))`;
-      params.push(...batchIds);
-    }
-    clause += ")";
-    where += ` AND ${clause}`;
+    filters.viewerStudentId = req.user.student_id;
+    filters.batchIds = await loadStudentBatchIds(db, req.user.student_id);
   }
-  const total = await db.get(`SELECT COUNT(*) as total FROM notifications ${where}`, params);
-  const rows = await db.all(
-    `SELECT * FROM notifications ${where}
-     ORDER BY created_at DESC LIMIT ? OFFSET ?`,
-    [...params, pageSize, offset]
-  );
+  const queries = notificationListQueries(filters, { limit: pageSize, offset });
+  const total = await db.get(queries.count.sql, queries.count.params);
+  const rows = await db.all(queries.page.sql, queries.page.params);
   res.json({
     total: total.total,
     page,
@@ -55,8 +41,7 @@ router.patch("/notifications/:notificationId/read", requireAuth, async (req, res
     if (!req.user.student_id) {
       return res.status(403).json({ detail: "Student profile missing" });
     }
-    const links = await db.all("SELECT batch_id FROM student_batches WHERE student_id = ?", [req.user.student_id]);
-    const batchSet = new Set(links.map((item) => item.batch_id));
+    const batchSet = new Set(await loadStudentBatchIds(db, req.user.student_id));
     const allowed =
       notification.student_id === req.user.student_id ||
       (notification.student_id == null && notification.batch_id == null) ||
@@ -147,9 +132,12 @@ router.delete("/notifications/reminder-rules/:ruleId", requireRoles("ADMIN"), as
   res.status(204).send();
 });
 
-router.post("/notifications/run-reminders", requireRoles("ADMIN", "TEACHER"), async (_req, res) => {
-  const created = await runFeeReminders(new Date().toISOString().slice(0, 10));
-  res.json({ created_notifications: created });
+router.post("/notifications/run-reminders", requireRoles("ADMIN", "TEACHER"), async (req, res) => {
+  const report = await runFeeReminders(new Date().toISOString().slice(0, 10), {
+    instituteId: req.user.institute_id,
+    dryRun: String(req.query.dry_run).toLowerCase() === "true"
+  });
+  res.json({ created_notifications: report.created, report });
 });
 
 router.get("/notifications/:notificationId/whatsapp-template", requireAuth, async (req, res) => {
@@ -162,8 +150,7 @@ router.get("/notifications/:notificationId/whatsapp-template", requireAuth, asyn
     if (!req.user.student_id) {
       return res.status(403).json({ detail: "Student profile missing" });
     }
-    const links = await db.all("SELECT batch_id FROM student_batches WHERE student_id = ?", [req.user.student_id]);
-    const batchSet = new Set(links.map((item) => item.batch_id));
+    const batchSet = new Set(await loadStudentBatchIds(db, req.user.student_id));
     const allowed =
       row.student_id === req.user.student_id ||
       (row.student_id == null && row.batch_id == null) ||
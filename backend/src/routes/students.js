@@ -1,7 +1,9 @@
 const express = require("express");
-const { connectDb } = require("../db");
+const { connectDb, withTransaction } = require("../db");
 const { requireAuth, requireRoles } = require("../auth");
 const { parsePagination, serializeStudent } = require("./helpers");
+const { invalidateStudentBatches } = require("../cache");
+const { studentListQueries } = require("../queries");
 
 const router = express.Router();
 
@@ -17,67 +19,50 @@ router.post("/students", requireRoles("ADMIN", "TEACHER"), async (req, res) => {
       return res.status(400).json({ detail: "One or more batches are invalid" });
     }
   }
-  const created = await db.run(
-    `INSERT INTO students (institute_id, full_name, phone, email, guardian_name, guardian_phone, address, join_date, status)
-     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)`,
-    [
-      req.user.institute_id,
-      req.body.full_name,
-      req.body.phone || null,
-      req.body.email || null,
-      req.body.guardian_name || null,
-      req.body.guardian_phone || null,
-      req.body.address || null,
-      req.body.join_date,
-      req.body.status || "ACTIVE"
-    ]
-  );
-  for (const batchId of batchIds) {
-    await db.run("INSERT INTO student_batches (institute_id, student_id, batch_id) VALUES (?, ?, ?)", [
-      req.user.institute_id,
-      created.lastID,
-      batchId
-    ]);
-  }
-  const student = await db.get("SELECT * FROM students WHERE id = ?", [created.lastID]);
+  const studentId = await withTransaction(db, async (tx) => {
+    const created = await tx.run(
+      `INSERT INTO students (institute_id, full_name, phone, email, guardian_name, guardian_phone, address, join_date, status)
+       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)`,
+      [
+        req.user.institute_id,
+        req.body.full_name,
+        req.body.phone || null,
+        req.body.email || null,
+        req.body.guardian_name || null,
+        req.body.guardian_phone || null,
+        req.body.address || null,
+        req.body.join_date,
+        req.body.status || "ACTIVE"
+      ]
+    );
+    for (const batchId of batchIds) {
+      await tx.run("INSERT INTO student_batches (institute_id, student_id, batch_id) VALUES (?, ?, ?)", [
+        req.user.institute_id,
+        created.lastID,
+        batchId
+      ]);
+    }
+    return created.lastID;
+  });
+  const student = await db.get("SELECT * FROM students WHERE id = ?", [studentId]);
   res.status(201).json(await serializeStudent(db, student));
 });
 
 router.get("/students", requireRoles("ADMIN", "TEACHER"), async (req, res) => {
   const db = await connectDb();
   const { page, pageSize, offset } = parsePagination(req.query, 10);
-  const params = [req.user.institute_id];
-  let where = "WHERE s.institute_id = ?";
-  let join = "";
-  if (req.query.search) {
-    where += " AND s.full_name LIKE ?";
-    params.push(`%${req.query.search}%`);
-  }
-  if (req.query.phone) {
-    where += " AND s.phone LIKE ?";
-    params.push(`%${req.query.phone}%`);
-  }
-  if (req.query.batch_id) {
-    join = "JOIN student_batches sb ON sb.student_id = s.id";
-    where += " AND sb.batch_id = ?";
-    params.push(Number(req.query.batch_id));
-  }
-  if (String(req.query.unpaid_only).toLowerCase() === "true") {
-    where += ` AND EXISTS (
-      SELECT 1 FROM student_fees sf LEFT JOIN payments p ON p.student_fee_id = sf.id
-      WHERE sf.student_id = s.id AND sf.institute_id = s.institute_id
-      GROUP BY sf.id HAVING (sf.total_fee - sf.discount - COALESCE(SUM(p.amount), 0)) > 0
-    )`;
-  }
-  const total = await db.get(
-    `SELECT COUNT(*) AS total FROM (SELECT DISTINCT s.id FROM students s ${join} ${where}) x`,
-    params
-  );
-  const rows = await db.all(
-    `SELECT DISTINCT s.* FROM students s ${join} ${where}
-     ORDER BY s.created_at DESC LIMIT ? OFFSET ?`,
-    [...params, pageSize, offset]
+  const queries = studentListQueries(
+    {
+      instituteId: req.user.institute_id,
+      search: req.query.search || null,
+      phone: req.query.phone || null,
+      batchId: req.query.batch_id ? Number(req.query.batch_id) : null,
+      unpaidOnly: String(req.query.unpaid_only).toLowerCase() === "true"
+    },
+    { limit: pageSize, offset }
   );
+  const total = await db.get(queries.count.sql, queries.count.params);
+  const rows = await db.all(queries.page.sql, queries.page.params);
   const items = [];
   for (const row of rows) {
     items.push(await serializeStudent(db, row));
@@ -148,14 +133,17 @@ router.put("/students/:studentId/batches", requireRoles("ADMIN", "TEACHER"), asy
       return res.status(400).json({ detail: "One or more batches are invalid" });
     }
   }
-  await db.run("DELETE FROM student_batches WHERE institute_id = ? AND student_id = ?", [req.user.institute_id, studentId]);
-  for (const batchId of batchIds) {
-    await db.run("INSERT INTO student_batches (institute_id, student_id, batch_id) VALUES (?, ?, ?)", [
-      req.user.institute_id,
-      studentId,
-      batchId
-    ]);
-  }
+  await withTransaction(db, async (tx) => {
+    await tx.run("DELETE FROM student_batches WHERE institute_id = ? AND student_id = ?", [req.user.institute_id, studentId]);
+    for (const batchId of batchIds) {
+      await tx.run("INSERT INTO student_batches (institute_id, student_id, batch_id) VALUES (?, ?, ?)", [
+        req.user.institute_id,
+        studentId,
+        batchId
+      ]);
+    }
+  });
+  invalidateStudentBatches(studentId);
   const updated = await db.get("SELECT * FROM students WHERE id = ?", [studentId]);
   res.json(await serializeStudent(db, updated));
 });
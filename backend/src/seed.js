@@ -2,7 +2,7 @@ const fs = require("fs");
 const path = require("path");
 const { initializeSchema, connectDb } = require("./db");
 const { hashPassword } = require("./auth");
-const { ensureStorageDirs } = require("./services");
+const { ensureStorageDirs, rebuildFeeBalances } = require("./services");
 
 function isoDateOffset(days) {
   const d = new Date();
@@ -27,12 +27,12 @@ async function runSeed() {
   const admin = await db.run(
     `INSERT INTO users (institute_id, full_name, email, phone, password_hash, role, is_active)
      VALUES (?, ?, ?, ?, ?, 'ADMIN', 1)`,
-    [instituteId, "System Admin", "admin@demo.com", "9990000001", hashPassword("Admin@123")]
+    [instituteId, "System Admin", "admin@demo.com", "9990000001", await hashPassword("Admin@123")]
   );
   const teacher = await db.run(
     `INSERT INTO users (institute_id, full_name, email, phone, password_hash, role, is_active)
      VALUES (?, ?, ?, ?, ?, 'TEACHER', 1)`,
-    [instituteId, "Anita Sharma", "teacher@demo.com", "9990000002", hashPassword("Teacher@123")]
+    [instituteId, "Anita Sharma", "teacher@demo.com", "9990000002", await hashPassword("Teacher@123")]
   );
 
   const studentIds = [];
@@ -60,7 +60,7 @@ async function runSeed() {
         `Student ${i}`,
         `student${i}@demo.com`,
         `900000000${i}`,
-        hashPassword("Student@123"),
+        await hashPassword("Student@123"),
         student.lastID
       ]
     );
@@ -230,6 +230,8 @@ async function runSeed() {
     [instituteId]
   );
 
+  await rebuildFeeBalances(db, { instituteId });
+
   process.stdout.write("Seed completed.\n");
   process.stdout.write("Admin login: admin@demo.com / Admin@123\n");
   process.stdout.write("Teacher login: teacher@demo.com / Teacher@123\n");
@@ -1,17 +1,39 @@
 const { createApp } = require("./app");
 const config = require("./config");
-const { initializeSchema } = require("./db");
-const { ensureStorageDirs, runFeeReminders } = require("./services");
+const { connectDb, closeDb, initializeSchema } = require("./db");
+const { ensureStorageDirs, rebuildFeeBalances, runFeeReminders } = require("./services");
+const { closeWorkerPool } = require("./workers");
 
 let reminderTimer = null;
+let reminderRunning = false;
+
+async function runScheduledReminders() {
+  if (reminderRunning) {
+    return;
+  }
+  reminderRunning = true;
+  try {
+    const report = await runFeeReminders(new Date().toISOString().slice(0, 10), {
+      shardIndex: config.reminderShardIndex,
+      shardCount: config.reminderShardCount
+    });
+    process.stdout.write(
+      `Fee reminders: ${report.created} created, ${report.skipped_existing} already sent, ` +
+        `${report.fees_scanned} fees across ${report.institutes} institutes in ${report.duration_ms}ms\n`
+    );
+  } catch (error) {
+    process.stderr.write(`Fee reminder run failed: ${error.message}\n`);
+  } finally {
+    reminderRunning = false;
+  }
+}
 
 async function start() {
   await initializeSchema();
+  await rebuildFeeBalances(await connectDb(), { missingOnly: true });
   ensureStorageDirs();
   if (config.runScheduler) {
-    reminderTimer = setInterval(() => {
-      runFeeReminders(new Date().toISOString().slice(0, 10)).catch(() => {});
-    }, 30 * 60 * 1000);
+    reminderTimer = setInterval(runScheduledReminders, 30 * 60 * 1000);
   }
   const app = createApp();
   const server = app.listen(config.port, () => {
@@ -22,7 +44,9 @@ async function start() {
     if (reminderTimer) {
       clearInterval(reminderTimer);
     }
-    server.close(() => process.exit(0));
+    server.close(() => {
+      Promise.all([closeDb(), closeWorkerPool()]).finally(() => process.exit(0));
+    });
   };
 
   process.on("SIGINT", shutdown);
@@ -1,10 +1,22 @@
 const fs = require("fs");
 const path = require("path");
 const crypto = require("crypto");
-const PDFDocument = require("pdfkit");
-const { stringify } = require("csv-stringify/sync");
 const config = require("./config");
-const { connectDb } = require("./db");
+const { connectDb, withTransaction } = require("./db");
+const { iterateKeyset } = require("./exports");
+const { runTask } = require("./workers");
+const {
+  FEE_WITH_PAID_SQL,
+  STUDENT_FEE_WITH_PAID_SQL,
+  ACTIVE_REMINDER_RULES_SQL,
+  REMINDER_FEE_CHUNK_SQL,
+  feeLedgerCountQuery,
+  feeLedgerSummaryQuery,
+  feeLedgerQuery,
+  feeLedgerExportQuery,
+  feePaymentsQuery,
+  existingRemindersQuery
+} = require("./queries");
 const { formatMoney, sumPayments, toMoneyNumber } = require("./utils/money");
 
 function ensureStorageDirs() {
@@ -36,22 +48,39 @@ function storeNoteFile(file) {
   };
 }
 
+function auditLogParams(instituteId, actorUserId, { action, entity, entityId, before, after }) {
+  return [
+    instituteId,
+    actorUserId || null,
+    action,
+    entity,
+    String(entityId),
+    before ? JSON.stringify(before) : null,
+    after ? JSON.stringify(after) : null
+  ];
+}
+
 function createAuditLog(db, { instituteId, actorUserId, action, entity, entityId, before, after }) {
   return db.run(
     `INSERT INTO audit_logs (institute_id, actor_user_id, action, entity, entity_id, before_json, after_json)
      VALUES (?, ?, ?, ?, ?, ?, ?)`,
-    [
-      instituteId,
-      actorUserId || null,
-      action,
-      entity,
-      String(entityId),
-      before ? JSON.stringify(before) : null,
-      after ? JSON.stringify(after) : null
-    ]
+    auditLogParams(instituteId, actorUserId, { action, entity, entityId, before, after })
   );
 }
 
+const AUDIT_LOG_BATCH_SIZE = 100;
+
+async function createAuditLogs(db, { instituteId, actorUserId, entries }) {
+  for (let start = 0; start < entries.length; start += AUDIT_LOG_BATCH_SIZE) {
+    const chunk = entries.slice(start, start + AUDIT_LOG_BATCH_SIZE);
+    await db.run(
+      `INSERT INTO audit_logs (institute_id, actor_user_id, action, entity, entity_id, before_json, after_json)
+       VALUES ${chunk.map(() => "(?, ?, ?, ?, ?, ?, ?)").join(", ")}`,
+      chunk.flatMap((entry) => auditLogParams(instituteId, actorUserId, entry))
+    );
+  }
+}
+
 function parseSchedule(raw) {
   try {
     const loaded = JSON.parse(raw || "[]");
@@ -77,34 +106,21 @@ function calculateTotalDue(studentFee) {
   return Math.max(toMoneyNumber(studentFee.total_fee) - toMoneyNumber(studentFee.discount), 0);
 }
 
-function calculateDueAmount(studentFee) {
-  const paid = sumPayments(studentFee.payments || []);
-  return Math.max(calculateTotalDue(studentFee) - paid, 0);
+function paidTotal(studentFee) {
+  if (studentFee.paid_amount != null) {
+    return toMoneyNumber(studentFee.paid_amount);
+  }
+  return sumPayments(studentFee.payments || []);
 }
 
-function nextDueInstallment(studentFee) {
-  const schedule = parseSchedule(studentFee.due_schedule_json);
-  if (!schedule.length) {
-    return { nextDueDate: null, upcomingAmount: null };
-  }
-  let paidRemaining = sumPayments(studentFee.payments || []);
-  const sorted = [...schedule].sort((a, b) => String(a.due_date).localeCompare(String(b.due_date)));
-  for (const item of sorted) {
-    const installment = toMoneyNumber(item.amount);
-    const consumed = Math.min(paidRemaining, installment);
-    const outstanding = installment - consumed;
-    paidRemaining -= consumed;
-    if (outstanding > 0) {
-      return { nextDueDate: String(item.due_date), upcomingAmount: outstanding };
-    }
-  }
-  return { nextDueDate: null, upcomingAmount: null };
+function calculateDueAmount(studentFee) {
+  return Math.max(calculateTotalDue(studentFee) - paidTotal(studentFee), 0);
 }
 
 function outstandingInstallments(studentFee) {
   const schedule = parseSchedule(studentFee.due_schedule_json);
   const sorted = [...schedule].sort((a, b) => String(a.due_date).localeCompare(String(b.due_date)));
-  let paidRemaining = sumPayments(studentFee.payments || []);
+  let paidRemaining = paidTotal(studentFee);
   const rows = [];
   sorted.forEach((item, idx) => {
     const installment = toMoneyNumber(item.amount);
@@ -122,97 +138,311 @@ function outstandingInstallments(studentFee) {
   return rows;
 }
 
-async function generateReceiptPdf({ payment, studentFee, student, batch }) {
-  const doc = new PDFDocument({ size: "A4", margin: 50 });
-  const chunks = [];
-  doc.on("data", (chunk) => chunks.push(chunk));
-
-  doc.fontSize(20).text("Fee Payment Receipt");
-  doc.moveDown(0.8);
-  doc.fontSize(11).text(`Receipt No: ${payment.receipt_no}`);
-  doc.text(`Date: ${payment.paid_on}`);
-  doc.moveDown(0.8);
-  doc.fontSize(13).text("Student Details");
-  doc.fontSize(11).text(`Name: ${student.full_name}`);
-  doc.text(`Batch: ${batch.name}`);
-  doc.text(`Course: ${batch.course}`);
-  doc.moveDown(0.8);
-  doc.fontSize(13).text("Payment Details");
-  doc.fontSize(11).text(`Amount Paid: INR ${formatMoney(payment.amount)}`);
-  doc.text(`Mode: ${payment.mode}`);
-  doc.text(`Total Fee: INR ${formatMoney(studentFee.total_fee)}`);
-  doc.text(`Discount: INR ${formatMoney(studentFee.discount)}`);
-  doc.moveDown(0.8);
-  doc.fontSize(10).text(`Generated at: ${new Date().toISOString()}`);
-  doc.end();
-
-  return new Promise((resolve) => {
-    doc.on("end", () => {
-      resolve(Buffer.concat(chunks));
-    });
+function nextDueInstallment(studentFee) {
+  const [next] = outstandingInstallments(studentFee);
+  if (!next) {
+    return { nextDueDate: null, upcomingAmount: null };
+  }
+  return { nextDueDate: next.dueDate, upcomingAmount: next.amount };
+}
+
+function computeFeeBalance(studentFee) {
+  const outstanding = outstandingInstallments(studentFee);
+  return {
+    paid_amount: paidTotal(studentFee),
+    due_amount: calculateDueAmount(studentFee),
+    next_due_date: outstanding.length ? outstanding[0].dueDate : null,
+    next_installment_amount: outstanding.length ? outstanding[0].amount : null,
+    outstanding_installments: outstanding.length
+  };
+}
+
+const UPSERT_FEE_BALANCE_SQL = `INSERT INTO student_fee_balances (
+     student_fee_id, institute_id, student_id, batch_id, paid_amount, due_amount,
+     next_due_date, next_installment_amount, outstanding_installments, updated_at
+   ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+   ON CONFLICT(student_fee_id) DO UPDATE SET
+     paid_amount = excluded.paid_amount,
+     due_amount = excluded.due_amount,
+     next_due_date = excluded.next_due_date,
+     next_installment_amount = excluded.next_installment_amount,
+     outstanding_installments = excluded.outstanding_installments,
+     updated_at = CURRENT_TIMESTAMP`;
+
+// The balance row stored for a fee, computed from the fee and its paid total.
+function feeBalanceRow(studentFee) {
+  return {
+    student_fee_id: studentFee.id,
+    institute_id: studentFee.institute_id,
+    student_id: studentFee.student_id,
+    batch_id: studentFee.batch_id,
+    ...computeFeeBalance(studentFee)
+  };
+}
+
+function feeBalanceParams(balance) {
+  return [
+    balance.student_fee_id,
+    balance.institute_id,
+    balance.student_id,
+    balance.batch_id,
+    balance.paid_amount,
+    balance.due_amount,
+    balance.next_due_date,
+    balance.next_installment_amount,
+    balance.outstanding_installments
+  ];
+}
+
+async function refreshFeeBalance(db, studentFeeId) {
+  const studentFee = await db.get(STUDENT_FEE_WITH_PAID_SQL, [studentFeeId]);
+  if (!studentFee) {
+    return null;
+  }
+  const balance = feeBalanceRow(studentFee);
+  await db.run(UPSERT_FEE_BALANCE_SQL, feeBalanceParams(balance));
+  return balance;
+}
+
+async function rebuildFeeBalances(db, { instituteId = null, missingOnly = false } = {}) {
+  const clauses = [];
+  const params = [];
+  if (instituteId != null) {
+    clauses.push("sf.institute_id = ?");
+    params.push(instituteId);
+  }
+  if (missingOnly) {
+    clauses.push("NOT EXISTS (SELECT 1 FROM student_fee_balances fb WHERE fb.student_fee_id = sf.id)");
+  }
+  const where = clauses.length ? `WHERE ${clauses.join(" AND ")}` : "";
+  // Read inside the write transaction, so a payment committed by a running server can't
+  // land between the read and the upsert and be overwritten with a stale balance.
+  return withTransaction(db, async (tx) => {
+    const rows = await tx.all(`${FEE_WITH_PAID_SQL} ${where}`, params);
+    if (!rows.length) {
+      return 0;
+    }
+    for (const row of rows) {
+      await tx.run(UPSERT_FEE_BALANCE_SQL, feeBalanceParams(feeBalanceRow(row)));
+    }
+    return rows.length;
   });
 }
 
-function buildWhatsappTemplate(studentName, batchName, dueAmount, dueDate) {
-  return `Hello ${studentName}, this is a fee reminder for ${batchName}. Amount due: ${dueAmount}. Due date: ${dueDate}. Please pay at the earliest. Thank you.`;
+function sameMoney(a, b) {
+  if (a == null || b == null) {
+    return a == null && b == null;
+  }
+  return Math.abs(toMoneyNumber(a) - toMoneyNumber(b)) < 0.005;
 }
 
-async function runFeeReminders(runDateStr) {
-  const db = await connectDb();
-  const runDate = new Date(runDateStr);
-  const reminders = await db.all("SELECT * FROM reminder_rules WHERE is_active = 1");
-  const notifications = await db.all(
-    "SELECT student_id, meta_json FROM notifications WHERE type = 'FEE_REMINDER'"
+async function verifyFeeBalances(db, { instituteId = null } = {}) {
+  const params = [];
+  let where = "";
+  if (instituteId != null) {
+    where = "WHERE sf.institute_id = ?";
+    params.push(instituteId);
+  }
+  const rows = await db.all(
+    `SELECT f.*, fb.student_fee_id AS stored_id, fb.paid_amount AS stored_paid_amount,
+            fb.due_amount AS stored_due_amount, fb.next_due_date AS stored_next_due_date,
+            fb.next_installment_amount AS stored_next_installment_amount,
+            fb.outstanding_installments AS stored_outstanding_installments
+     FROM (${FEE_WITH_PAID_SQL} ${where}) f
+     LEFT JOIN student_fee_balances fb ON fb.student_fee_id = f.id`,
+    params
   );
+  const mismatches = [];
+  for (const row of rows) {
+    const expected = computeFeeBalance(row);
+    const matches =
+      row.stored_id != null &&
+      sameMoney(row.stored_paid_amount, expected.paid_amount) &&
+      sameMoney(row.stored_due_amount, expected.due_amount) &&
+      row.stored_next_due_date === expected.next_due_date &&
+      sameMoney(row.stored_next_installment_amount, expected.next_installment_amount) &&
+      row.stored_outstanding_installments === expected.outstanding_installments;
+    if (!matches) {
+      mismatches.push({
+        student_fee_id: row.id,
+        expected,
+        stored:
+          row.stored_id == null
+            ? null
+            : {
+                paid_amount: row.stored_paid_amount,
+                due_amount: row.stored_due_amount,
+                next_due_date: row.stored_next_due_date,
+                next_installment_amount: row.stored_next_installment_amount,
+                outstanding_installments: row.stored_outstanding_installments
+              }
+      });
+    }
+  }
+  return { checked: rows.length, mismatches };
+}
 
-  const existing = new Set();
-  for (const row of notifications) {
-    if (!row.meta_json) {
-      continue;
+async function countFeeLedger(db, filters) {
+  const query = feeLedgerCountQuery(filters);
+  const row = await db.get(query.sql, query.params);
+  return row.total;
+}
+
+async function summarizeFeeLedger(db, filters) {
+  const query = feeLedgerSummaryQuery(filters);
+  const row = await db.get(query.sql, query.params);
+  return { unpaid: row.unpaid, totalDue: toMoneyNumber(row.total_due) };
+}
+
+async function loadFeeLedger(db, filters, { newestFirst = false, limit, offset, withPayments = false } = {}) {
+  const query = feeLedgerQuery(filters, { newestFirst, limit, offset });
+  const rows = await db.all(query.sql, query.params);
+
+  const paymentsByFee = new Map();
+  if (withPayments && rows.length) {
+    const paymentsQuery = feePaymentsQuery(rows.map((row) => row.id));
+    const payments = await db.all(paymentsQuery.sql, paymentsQuery.params);
+    for (const payment of payments) {
+      if (!paymentsByFee.has(payment.student_fee_id)) {
+        paymentsByFee.set(payment.student_fee_id, []);
+      }
+      paymentsByFee.get(payment.student_fee_id).push(payment);
     }
-    const meta = JSON.parse(row.meta_json);
-    existing.add(`${row.student_id}|${meta.student_fee_id}|${meta.due_date}|${meta.trigger_day}`);
   }
 
-  const studentFees = await db.all("SELECT * FROM student_fees");
-  let created = 0;
-  for (const fee of studentFees) {
-    const payments = await db.all("SELECT * FROM payments WHERE student_fee_id = ?", [fee.id]);
-    const withPayments = { ...fee, payments };
-    const dueAmount = calculateDueAmount(withPayments);
-    if (dueAmount <= 0) {
-      continue;
+  return rows.map((row) => {
+    const entry = {
+      ...row,
+      paid_amount: toMoneyNumber(row.paid_amount),
+      due_amount: toMoneyNumber(row.due_amount),
+      upcoming_due_amount: row.upcoming_due_amount == null ? null : toMoneyNumber(row.upcoming_due_amount)
+    };
+    if (withPayments) {
+      entry.payments = paymentsByFee.get(row.id) || [];
     }
-    const student = await db.get("SELECT * FROM students WHERE id = ?", [fee.student_id]);
-    const batch = await db.get("SELECT * FROM batches WHERE id = ?", [fee.batch_id]);
-    if (!student || !batch) {
-      continue;
+    return entry;
+  });
+}
+
+// Same rows as loadFeeLedger in student_fee id order, fetched in keyset pages for exports.
+function iterateFeeLedger(db, filters, { chunkSize } = {}) {
+  return iterateKeyset(db, { ...feeLedgerExportQuery(filters), chunkSize });
+}
+
+function generateReceiptPdf({ payment, studentFee, student, batch }) {
+  return runTask("renderReceiptPdf", { payment, studentFee, student, batch });
+}
+
+// Everything a receipt prints apart from its render time. A cached file is only reused
+// while these match, so correcting a payment, a fee or a student's name yields a fresh
+// receipt instead of the old PDF.
+function receiptFields({ payment, studentFee, student, batch }) {
+  return [
+    payment.receipt_no,
+    payment.paid_on,
+    formatMoney(payment.amount),
+    payment.mode,
+    student.full_name,
+    batch.name,
+    batch.course,
+    formatMoney(studentFee.total_fee),
+    formatMoney(studentFee.discount)
+  ];
+}
+
+function receiptCachePath(receipt) {
+  const fingerprint = crypto
+    .createHash("sha256")
+    .update(JSON.stringify(receiptFields(receipt)))
+    .digest("hex")
+    .slice(0, 16);
+  const receiptNo = String(receipt.payment.receipt_no).replace(/[^\w.-]/g, "_");
+  return path.join(config.storageDir, "receipts", `${receiptNo}-${fingerprint}.pdf`);
+}
+
+const receiptRenders = new Map();
+
+// A receipt is rendered once per version of its contents and served from
+// storage/receipts/<receipt no>-<fingerprint>.pdf after that. Concurrent requests for a
+// receipt that is not cached yet share a single render, and the file is written under a
+// temporary name and renamed so readers never see a partial PDF.
+async function ensureReceiptFile({ payment, studentFee, student, batch }) {
+  const filePath = receiptCachePath({ payment, studentFee, student, batch });
+  try {
+    await fs.promises.access(filePath);
+    return filePath;
+  } catch (_error) {
+    // Not rendered yet.
+  }
+  let pending = receiptRenders.get(filePath);
+  if (!pending) {
+    pending = (async () => {
+      const pdf = await generateReceiptPdf({ payment, studentFee, student, batch });
+      ensureStorageDirs();
+      const tempPath = `${filePath}.${crypto.randomUUID()}.tmp`;
+      try {
+        await fs.promises.writeFile(tempPath, pdf);
+        await fs.promises.rename(tempPath, filePath);
+      } catch (error) {
+        await fs.promises.rm(tempPath, { force: true });
+        throw error;
+      }
+      return filePath;
+    })().finally(() => receiptRenders.delete(filePath));
+    receiptRenders.set(filePath, pending);
+  }
+  return pending;
+}
+
+function buildWhatsappTemplate(studentName, batchName, dueAmount, dueDate) {
+  return `Hello ${studentName}, this is a fee reminder for ${batchName}. Amount due: ${dueAmount}. Due date: ${dueDate}. Please pay at the earliest. Thank you.`;
+}
+
+const REMINDER_CHUNK_SIZE = 500;
+const DEFAULT_REMINDER_RULE = { days_before: 3, on_due_date: 1, every_n_days_after_due: 3 };
+
+function reminderTrigger(rule, deltaDays) {
+  if (deltaDays === Number(rule.days_before || 0)) {
+    return "before_due";
+  }
+  if (deltaDays === 0 && Number(rule.on_due_date || 0) === 1) {
+    return "on_due";
+  }
+  if (deltaDays < 0) {
+    const n = Math.max(Number(rule.every_n_days_after_due || 1), 1);
+    if (Math.abs(deltaDays) % n === 0) {
+      return "after_due";
     }
-    const ruleSet = reminders.filter((rule) => rule.institute_id === fee.institute_id && (rule.batch_id == null || rule.batch_id === fee.batch_id));
-    const activeRules = ruleSet.length ? ruleSet : [{ days_before: 3, on_due_date: 1, every_n_days_after_due: 3 }];
-    for (const installment of outstandingInstallments(withPayments)) {
+  }
+  return null;
+}
+
+function reminderDedupeKey(studentFeeId, dueDate, runDateStr) {
+  return `FEE_REMINDER|${studentFeeId}|${dueDate}|${runDateStr}`;
+}
+
+function buildReminderRows(fees, rules, runDateStr) {
+  const runDate = new Date(runDateStr);
+  const rows = [];
+  const seen = new Set();
+  for (const fee of fees) {
+    const ruleSet = rules.filter((rule) => rule.batch_id == null || rule.batch_id === fee.batch_id);
+    const activeRules = ruleSet.length ? ruleSet : [DEFAULT_REMINDER_RULE];
+    const dueAmount = toMoneyNumber(fee.due_amount);
+    for (const installment of outstandingInstallments(fee)) {
       const dueDate = new Date(installment.dueDate);
       const deltaDays = Math.floor((dueDate.getTime() - runDate.getTime()) / (1000 * 60 * 60 * 24));
       for (const rule of activeRules) {
-        let trigger = null;
-        if (deltaDays === Number(rule.days_before || 0)) {
-          trigger = "before_due";
-        } else if (deltaDays === 0 && Number(rule.on_due_date || 0) === 1) {
-          trigger = "on_due";
-        } else if (deltaDays < 0) {
-          const n = Math.max(Number(rule.every_n_days_after_due || 1), 1);
-          if (Math.abs(deltaDays) % n === 0) {
-            trigger = "after_due";
-          }
-        }
+        const trigger = reminderTrigger(rule, deltaDays);
         if (!trigger) {
           continue;
         }
-        const key = `${student.id}|${fee.id}|${installment.dueDate}|${runDateStr}`;
-        if (existing.has(key)) {
+        const dedupeKey = reminderDedupeKey(fee.id, installment.dueDate, runDateStr);
+        if (seen.has(dedupeKey)) {
           continue;
         }
-        const message = `Fee reminder: ${student.full_name}, installment ${installment.index + 1} for batch ${batch.name} is due ${installment.dueDate}. Pending installment amount: INR ${formatMoney(installment.amount)}. Total pending: INR ${formatMoney(dueAmount)}.`;
+        seen.add(dedupeKey);
+        const message = `Fee reminder: ${fee.student_name}, installment ${installment.index + 1} for batch ${fee.batch_name} is due ${installment.dueDate}. Pending installment amount: INR ${formatMoney(installment.amount)}. Total pending: INR ${formatMoney(dueAmount)}.`;
         const meta = JSON.stringify({
           student_fee_id: fee.id,
           batch_id: fee.batch_id,
@@ -220,41 +450,222 @@ async function runFeeReminders(runDateStr) {
           trigger,
           trigger_day: runDateStr,
           whatsapp_template: buildWhatsappTemplate(
-            student.full_name,
-            batch.name,
+            fee.student_name,
+            fee.batch_name,
             `INR ${formatMoney(installment.amount)}`,
             installment.dueDate
           )
         });
-        await db.run(
-          `INSERT INTO notifications (institute_id, student_id, batch_id, type, message, meta_json)
-           VALUES (?, ?, ?, 'FEE_REMINDER', ?, ?)`,
-          [fee.institute_id, student.id, fee.batch_id, message, meta]
-        );
-        existing.add(key);
-        created += 1;
+        rows.push([fee.institute_id, fee.student_id, fee.batch_id, message, meta, dedupeKey]);
       }
     }
   }
-  return created;
-}
-
-function buildAttendanceCsv(rows) {
-  return stringify(
-    rows.map((item) => [
-      item.id,
-      item.batch_id,
-      item.student_id,
-      item.date,
-      item.status,
-      item.marked_by,
-      item.created_at
-    ]),
-    {
-      header: true,
-      columns: ["attendance_id", "batch_id", "student_id", "date", "status", "marked_by", "created_at"]
+  return rows;
+}
+
+async function reminderInstituteIds(db, { instituteId, shardIndex, shardCount }) {
+  if (instituteId != null) {
+    return [instituteId];
+  }
+  const rows = await db.all("SELECT id FROM institutes WHERE id % ? = ? ORDER BY id", [shardCount, shardIndex]);
+  return rows.map((row) => row.id);
+}
+
+async function countExistingReminders(db, rows) {
+  const query = existingRemindersQuery(rows.map((row) => row[5]));
+  const found = await db.get(query.sql, query.params);
+  return found.c;
+}
+
+const INSERT_REMINDER_SQL = `INSERT INTO notifications (institute_id, student_id, batch_id, type, message, meta_json, dedupe_key)
+   VALUES (?, ?, ?, 'FEE_REMINDER', ?, ?, ?)
+   ON CONFLICT(dedupe_key) DO NOTHING`;
+
+async function insertReminderRows(db, rows) {
+  return withTransaction(db, async (tx) => {
+    let inserted = 0;
+    for (const row of rows) {
+      const result = await tx.run(INSERT_REMINDER_SQL, row);
+      inserted += result.changes;
     }
-  );
+    return inserted;
+  });
+}
+
+async function runFeeReminders(
+  runDateStr,
+  { instituteId = null, shardIndex = 0, shardCount = 1, dryRun = false, chunkSize = REMINDER_CHUNK_SIZE } = {}
+) {
+  const startedAt = Date.now();
+  const db = await connectDb();
+  const report = {
+    run_date: runDateStr,
+    dry_run: dryRun,
+    institutes: 0,
+    chunks: 0,
+    fees_scanned: 0,
+    candidates: 0,
+    skipped_existing: 0,
+    created: 0,
+    would_create: 0,
+    duration_ms: 0
+  };
+
+  for (const currentInstituteId of await reminderInstituteIds(db, { instituteId, shardIndex, shardCount })) {
+    report.institutes += 1;
+    const rules = await db.all(ACTIVE_REMINDER_RULES_SQL, [currentInstituteId]);
+    let lastFeeId = 0;
+    for (;;) {
+      const fees = await db.all(REMINDER_FEE_CHUNK_SQL, [currentInstituteId, lastFeeId, chunkSize]);
+      if (!fees.length) {
+        break;
+      }
+      lastFeeId = fees[fees.length - 1].id;
+      report.chunks += 1;
+      report.fees_scanned += fees.length;
+
+      const rows = buildReminderRows(fees, rules, runDateStr);
+      if (!rows.length) {
+        continue;
+      }
+      report.candidates += rows.length;
+      if (dryRun) {
+        const existing = await countExistingReminders(db, rows);
+        report.skipped_existing += existing;
+        report.would_create += rows.length - existing;
+      } else {
+        const inserted = await insertReminderRows(db, rows);
+        report.skipped_existing += rows.length - inserted;
+        report.created += inserted;
+      }
+    }
+  }
+
+  report.duration_ms = Date.now() - startedAt;
+  return report;
+}
+
+const ATTENDANCE_UPSERT_BATCH_SIZE = 100;
+
+function attendanceKey(batchId, studentId, date) {
+  return `${batchId}|${studentId}|${date}`;
+}
+
+// Upserts attendance for any mix of batches and dates inside one transaction: one
+// SELECT per batch/date for the previous statuses, multi-row INSERT ... ON CONFLICT
+// ... RETURNING for the rows, and batched audit-log inserts. Later entries for the
+// same student/batch/date win. Returns the stored rows in input order.
+async function markAttendance(db, { instituteId, actorUserId, entries }) {
+  const byKey = new Map();
+  for (const entry of entries) {
+    byKey.set(attendanceKey(entry.batch_id, entry.student_id, entry.date), entry);
+  }
+  const unique = [...byKey.values()];
+  if (!unique.length) {
+    return { rows: [], created: 0, updated: 0 };
+  }
+
+  return withTransaction(db, async (tx) => {
+    const sessions = new Map();
+    for (const entry of unique) {
+      const sessionKey = `${entry.batch_id}|${entry.date}`;
+      if (!sessions.has(sessionKey)) {
+        sessions.set(sessionKey, { batchId: entry.batch_id, date: entry.date, studentIds: [] });
+      }
+      sessions.get(sessionKey).studentIds.push(entry.student_id);
+    }
+    const previous = new Map();
+    for (const session of sessions.values()) {
+      const existing = await tx.all(
+        `SELECT id, student_id, status FROM attendance
+         WHERE institute_id = ? AND batch_id = ? AND date = ?
+           AND student_id IN (${session.studentIds.map(() => "?").join(",")})`,
+        [instituteId, session.batchId, session.date, ...session.studentIds]
+      );
+      for (const row of existing) {
+        previous.set(attendanceKey(session.batchId, row.student_id, session.date), row);
+      }
+    }
+
+    const stored = new Map();
+    for (let start = 0; start < unique.length; start += ATTENDANCE_UPSERT_BATCH_SIZE) {
+      const chunk = unique.slice(start, start + ATTENDANCE_UPSERT_BATCH_SIZE);
+      const rows = await tx.all(
+        `INSERT INTO attendance (institute_id, batch_id, student_id, date, status, marked_by)
+         VALUES ${chunk.map(() => "(?, ?, ?, ?, ?, ?)").join(", ")}
+         ON CONFLICT(batch_id, student_id, date) DO UPDATE SET
+           status = excluded.status,
+           marked_by = excluded.marked_by,
+           updated_at = CURRENT_TIMESTAMP
+         RETURNING *`,
+        chunk.flatMap((entry) => [instituteId, entry.batch_id, entry.student_id, entry.date, entry.status, actorUserId])
+      );
+      for (const row of rows) {
+        stored.set(attendanceKey(row.batch_id, row.student_id, row.date), row);
+      }
+    }
+
+    let created = 0;
+    const auditEntries = unique.map((entry) => {
+      const key = attendanceKey(entry.batch_id, entry.student_id, entry.date);
+      const before = previous.get(key);
+      if (!before) {
+        created += 1;
+      }
+      return {
+        action: before ? "ATTENDANCE_UPDATED" : "ATTENDANCE_CREATED",
+        entity: "attendance",
+        entityId: stored.get(key).id,
+        before: before ? { status: before.status } : null,
+        after: { status: entry.status }
+      };
+    });
+    await createAuditLogs(tx, { instituteId, actorUserId, entries: auditEntries });
+
+    return {
+      rows: unique.map((entry) => stored.get(attendanceKey(entry.batch_id, entry.student_id, entry.date))),
+      created,
+      updated: unique.length - created
+    };
+  });
+}
+
+const ATTENDANCE_CSV_COLUMNS = ["batch_id", "student_id", "date", "status"];
+
+// Parses a plain attendance sheet (batch_id, student_id, date, status; header row
+// required, any column order). `date` may be omitted from the sheet when a default
+// date is supplied, e.g. when uploading one day's register.
+function parseAttendanceCsv(text, { date = null } = {}) {
+  const lines = String(text)
+    .replace(/^\uFEFF/, "")
+    .split(/\r?\n/)
+    .filter((line) => line.trim());
+  if (!lines.length) {
+    return [];
+  }
+  // The columns are plain ids, dates and statuses, so lines are split on commas. A quote
+  // could hide a comma inside a field and shift every cell after it, so quoted input is
+  // rejected rather than misread.
+  const quoted = lines.findIndex((line) => line.includes('"'));
+  if (quoted !== -1) {
+    throw new Error(`CSV line ${quoted + 1} contains a quote; quoted fields are not supported`);
+  }
+  const splitLine = (line) => line.split(",").map((cell) => cell.trim());
+  const header = splitLine(lines[0]).map((cell) => cell.toLowerCase());
+  const missing = ATTENDANCE_CSV_COLUMNS.filter((column) => !header.includes(column) && !(column === "date" && date));
+  if (missing.length) {
+    throw new Error(`CSV is missing column(s): ${missing.join(", ")}`);
+  }
+  return lines.slice(1).map((line) => {
+    const cells = splitLine(line);
+    const value = (column) => cells[header.indexOf(column)];
+    return {
+      batch_id: Number(value("batch_id")),
+      student_id: Number(value("student_id")),
+      date: header.includes("date") && value("date") ? value("date") : date,
+      status: String(value("status") || "").toUpperCase()
+    };
+  });
 }
 
 module.exports = {
@@ -262,12 +673,25 @@ module.exports = {
   resolveStoragePath,
   storeNoteFile,
   createAuditLog,
+  createAuditLogs,
   parseSchedule,
   getStudentFeeWithPayments,
+  paidTotal,
   calculateDueAmount,
   nextDueInstallment,
+  computeFeeBalance,
+  refreshFeeBalance,
+  rebuildFeeBalances,
+  verifyFeeBalances,
+  countFeeLedger,
+  summarizeFeeLedger,
+  loadFeeLedger,
+  iterateFeeLedger,
   generateReceiptPdf,
+  receiptCachePath,
+  ensureReceiptFile,
   buildWhatsappTemplate,
   runFeeReminders,
-  buildAttendanceCsv
+  markAttendance,
+  parseAttendanceCsv
 };
@@ -0,0 +1,182 @@
+const path = require("path");
+const { Worker } = require("worker_threads");
+const config = require("../config");
+const tasks = require("./tasks");
+
+const WORKER_SCRIPT = path.join(__dirname, "worker.js");
+
+function busyError() {
+  const error = new Error("Worker pool queue is full");
+  error.code = "WORKER_POOL_BUSY";
+  return error;
+}
+
+function fromWorker(result) {
+  if (result instanceof Uint8Array) {
+    return Buffer.from(result.buffer, result.byteOffset, result.byteLength);
+  }
+  return result;
+}
+
+// Runs the handlers in ./tasks on a fixed set of worker threads. Workers are started on
+// first use and only hold the process open while they have a task in flight. Once every
+// worker is busy, up to `queueLimit` tasks wait in FIFO order and anything beyond that is
+// rejected with code WORKER_POOL_BUSY, so a burst turns into fast 503s instead of an
+// unbounded backlog. With `size` 0 the tasks run inline on the calling thread.
+class WorkerPool {
+  constructor({ size, queueLimit }) {
+    this.size = size;
+    this.queueLimit = queueLimit;
+    this.workers = [];
+    this.idle = [];
+    this.queue = [];
+    this.nextTaskId = 1;
+    this.completed = 0;
+    this.rejected = 0;
+  }
+
+  run(name, payload) {
+    if (!tasks[name]) {
+      return Promise.reject(new Error(`Unknown worker task: ${name}`));
+    }
+    if (!this.size) {
+      return Promise.resolve()
+        .then(() => tasks[name](payload))
+        .finally(() => {
+          this.completed += 1;
+        });
+    }
+    return new Promise((resolve, reject) => {
+      const task = { id: this.nextTaskId++, name, payload, resolve, reject };
+      const slot = this.idle.pop() || this.spawn();
+      if (slot) {
+        this.dispatch(slot, task);
+        return;
+      }
+      if (this.queue.length >= this.queueLimit) {
+        this.rejected += 1;
+        reject(busyError());
+        return;
+      }
+      this.queue.push(task);
+    });
+  }
+
+  spawn() {
+    if (this.workers.length >= this.size) {
+      return null;
+    }
+    const slot = { worker: new Worker(WORKER_SCRIPT), task: null };
+    slot.worker.on("message", (message) => this.settle(slot, message));
+    slot.worker.on("error", (error) => this.retire(slot, error));
+    slot.worker.on("exit", (code) => this.retire(slot, new Error(`Worker exited with code ${code}`)));
+    this.workers.push(slot);
+    return slot;
+  }
+
+  dispatch(slot, task) {
+    slot.task = task;
+    slot.worker.ref();
+    slot.worker.postMessage({ id: task.id, name: task.name, payload: task.payload });
+  }
+
+  settle(slot, { id, result, error }) {
+    const task = slot.task;
+    if (!task || task.id !== id) {
+      return;
+    }
+    slot.task = null;
+    this.completed += 1;
+    if (error) {
+      const failure = new Error(error.message);
+      failure.stack = error.stack;
+      task.reject(failure);
+    } else {
+      task.resolve(fromWorker(result));
+    }
+    this.release(slot);
+  }
+
+  release(slot) {
+    const next = this.queue.shift();
+    if (next) {
+      this.dispatch(slot, next);
+      return;
+    }
+    slot.worker.unref();
+    this.idle.push(slot);
+  }
+
+  retire(slot, error) {
+    if (!this.workers.includes(slot)) {
+      return;
+    }
+    this.workers = this.workers.filter((item) => item !== slot);
+    this.idle = this.idle.filter((item) => item !== slot);
+    if (slot.task) {
+      slot.task.reject(error);
+      slot.task = null;
+    }
+    // Keep queued work moving on a fresh worker.
+    if (this.queue.length) {
+      this.dispatch(this.spawn(), this.queue.shift());
+    }
+  }
+
+  stats() {
+    return {
+      size: this.size,
+      started: this.workers.length,
+      busy: this.workers.filter((slot) => slot.task).length,
+      queued: this.queue.length,
+      queue_limit: this.queueLimit,
+      completed: this.completed,
+      rejected: this.rejected
+    };
+  }
+
+  async close() {
+    const slots = this.workers;
+    this.workers = [];
+    this.idle = [];
+    const pending = [...this.queue.splice(0), ...slots.map((slot) => slot.task).filter(Boolean)];
+    for (const task of pending) {
+      task.reject(new Error("Worker pool closed"));
+    }
+    await Promise.all(slots.map((slot) => slot.worker.terminate()));
+  }
+}
+
+let pool;
+
+function workerPool() {
+  if (!pool) {
+    pool = new WorkerPool({ size: config.workerPoolSize, queueLimit: config.workerQueueLimit });
+  }
+  return pool;
+}
+
+function runTask(name, payload) {
+  return workerPool().run(name, payload);
+}
+
+function isWorkerPoolBusy(error) {
+  return Boolean(error) && error.code === "WORKER_POOL_BUSY";
+}
+
+async function closeWorkerPool() {
+  if (!pool) {
+    return;
+  }
+  const current = pool;
+  pool = null;
+  await current.close();
+}
+
+module.exports = {
+  WorkerPool,
+  workerPool,
+  runTask,
+  isWorkerPoolBusy,
+  closeWorkerPool
+};
@@ -0,0 +1,61 @@
+const crypto = require("crypto");
+const bcrypt = require("bcryptjs");
+const PDFDocument = require("pdfkit");
+const { formatMoney } = require("../utils/money");
+
+// CPU-bound jobs run by the worker pool. Each handler takes one plain, structured-clone
+// friendly payload and may return a value or a promise.
+
+function hashPassword({ password }) {
+  return bcrypt.hashSync(password, 12);
+}
+
+function verifyPassword({ password, packedHash }) {
+  const raw = String(packedHash || "");
+  if (raw.startsWith("$2a$") || raw.startsWith("$2b$") || raw.startsWith("$2y$")) {
+    return bcrypt.compareSync(password, raw);
+  }
+  const [salt, expected] = raw.split(":");
+  if (!salt || !expected) {
+    return false;
+  }
+  const actual = crypto.pbkdf2Sync(password, salt, 120000, 64, "sha512").toString("hex");
+  return crypto.timingSafeEqual(Buffer.from(actual, "hex"), Buffer.from(expected, "hex"));
+}
+
+function renderReceiptPdf({ payment, studentFee, student, batch }) {
+  const doc = new PDFDocument({ size: "A4", margin: 50 });
+  const chunks = [];
+  doc.on("data", (chunk) => chunks.push(chunk));
+
+  doc.fontSize(20).text("Fee Payment Receipt");
+  doc.moveDown(0.8);
+  doc.fontSize(11).text(`Receipt No: ${payment.receipt_no}`);
+  doc.text(`Date: ${payment.paid_on}`);
+  doc.moveDown(0.8);
+  doc.fontSize(13).text("Student Details");
+  doc.fontSize(11).text(`Name: ${student.full_name}`);
+  doc.text(`Batch: ${batch.name}`);
+  doc.text(`Course: ${batch.course}`);
+  doc.moveDown(0.8);
+  doc.fontSize(13).text("Payment Details");
+  doc.fontSize(11).text(`Amount Paid: INR ${formatMoney(payment.amount)}`);
+  doc.text(`Mode: ${payment.mode}`);
+  doc.text(`Total Fee: INR ${formatMoney(studentFee.total_fee)}`);
+  doc.text(`Discount: INR ${formatMoney(studentFee.discount)}`);
+  doc.moveDown(0.8);
+  doc.fontSize(10).text(`Generated at: ${new Date().toISOString()}`);
+  doc.end();
+
+  return new Promise((resolve) => {
+    doc.on("end", () => {
+      resolve(Buffer.concat(chunks));
+    });
+  });
+}
+
+module.exports = {
+  hashPassword,
+  verifyPassword,
+  renderReceiptPdf
+};
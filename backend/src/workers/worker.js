@@ -0,0 +1,18 @@
+const { parentPort } = require("worker_threads");
+const tasks = require("./tasks");
+
+parentPort.on("message", async ({ id, name, payload }) => {
+  try {
+    let result = await tasks[name](payload);
+    const transfer = [];
+    if (Buffer.isBuffer(result)) {
+      // Small Buffers share Node's allocation pool, so copy into an owned array before
+      // transferring it; the parent gets the bytes without a second structured-clone copy.
+      result = new Uint8Array(result);
+      transfer.push(result.buffer);
+    }
+    parentPort.postMessage({ id, result }, transfer);
+  } catch (error) {
+    parentPort.postMessage({ id, error: { message: error.message, stack: error.stack } });
+  }
+});
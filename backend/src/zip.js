@@ -0,0 +1,111 @@
+// Minimal streaming writer for ZIP archives with stored (uncompressed) entries. The
+// archives it builds hold PDFs, which pdfkit has already deflated, so storing them costs
+// nothing and keeps each entry a header plus its bytes. Only the classic format is
+// produced: at most MAX_ZIP_ENTRIES entries and 4 GiB in total.
+
+const MAX_ZIP_ENTRIES = 0xffff;
+const MAX_ZIP_OFFSET = 0xffffffff;
+const UTF8_NAMES = 0x0800;
+
+const CRC_TABLE = (() => {
+  const table = new Uint32Array(256);
+  for (let n = 0; n < 256; n += 1) {
+    let c = n;
+    for (let k = 0; k < 8; k += 1) {
+      c = c & 1 ? 0xedb88320 ^ (c >>> 1) : c >>> 1;
+    }
+    table[n] = c >>> 0;
+  }
+  return table;
+})();
+
+function crc32(data) {
+  let crc = 0xffffffff;
+  for (let i = 0; i < data.length; i += 1) {
+    crc = CRC_TABLE[(crc ^ data[i]) & 0xff] ^ (crc >>> 8);
+  }
+  return (crc ^ 0xffffffff) >>> 0;
+}
+
+function dosDateTime(date) {
+  const value = date instanceof Date && !Number.isNaN(date.getTime()) ? date : new Date();
+  const year = Math.max(value.getFullYear(), 1980);
+  return {
+    time: (value.getHours() << 11) | (value.getMinutes() << 5) | Math.floor(value.getSeconds() / 2),
+    day: ((year - 1980) << 9) | ((value.getMonth() + 1) << 5) | value.getDate()
+  };
+}
+
+function localHeader(entry) {
+  const header = Buffer.alloc(30);
+  header.writeUInt32LE(0x04034b50, 0);
+  header.writeUInt16LE(20, 4);
+  header.writeUInt16LE(UTF8_NAMES, 6);
+  header.writeUInt16LE(0, 8);
+  header.writeUInt16LE(entry.time, 10);
+  header.writeUInt16LE(entry.day, 12);
+  header.writeUInt32LE(entry.crc, 14);
+  header.writeUInt32LE(entry.size, 18);
+  header.writeUInt32LE(entry.size, 22);
+  header.writeUInt16LE(entry.name.length, 26);
+  header.writeUInt16LE(0, 28);
+  return Buffer.concat([header, entry.name]);
+}
+
+function centralRecord(entry) {
+  const record = Buffer.alloc(46);
+  record.writeUInt32LE(0x02014b50, 0);
+  record.writeUInt16LE(20, 4);
+  record.writeUInt16LE(20, 6);
+  record.writeUInt16LE(UTF8_NAMES, 8);
+  record.writeUInt16LE(0, 10);
+  record.writeUInt16LE(entry.time, 12);
+  record.writeUInt16LE(entry.day, 14);
+  record.writeUInt32LE(entry.crc, 16);
+  record.writeUInt32LE(entry.size, 20);
+  record.writeUInt32LE(entry.size, 24);
+  record.writeUInt16LE(entry.name.length, 28);
+  record.writeUInt32LE(entry.offset, 42);
+  return Buffer.concat([record, entry.name]);
+}
+
+function endOfCentralDirectory(count, size, offset) {
+  const record = Buffer.alloc(22);
+  record.writeUInt32LE(0x06054b50, 0);
+  record.writeUInt16LE(count, 8);
+  record.writeUInt16LE(count, 10);
+  record.writeUInt32LE(size, 12);
+  record.writeUInt32LE(offset, 16);
+  return record;
+}
+
+// Yields the archive as Buffers, one entry at a time, from an (async) iterable of
+// `{ name, data, date }`. Only the central directory (about 50 bytes per entry) is kept
+// until the end.
+async function* zipStream(entries) {
+  const written = [];
+  let offset = 0;
+  for await (const { name, data, date } of entries) {
+    if (written.length >= MAX_ZIP_ENTRIES) {
+      throw new Error(`ZIP archives are limited to ${MAX_ZIP_ENTRIES} entries`);
+    }
+    const entry = { name: Buffer.from(name, "utf8"), crc: crc32(data), size: data.length, offset, ...dosDateTime(date) };
+    const header = localHeader(entry);
+    offset += header.length + data.length;
+    if (offset > MAX_ZIP_OFFSET) {
+      throw new Error("ZIP archive exceeds 4 GiB");
+    }
+    written.push(entry);
+    yield header;
+    yield data;
+  }
+  const directory = Buffer.concat(written.map(centralRecord));
+  yield directory;
+  yield endOfCentralDirectory(written.length, directory.length, offset);
+}
+
+module.exports = {
+  MAX_ZIP_ENTRIES,
+  crc32,
+  zipStream
+};
@@ -0,0 +1,16 @@
+const test = require("node:test");
+const assert = require("node:assert/strict");
+
+const { parseAttendanceCsv } = require("../src/services");
+
+test("parses a register, taking the date from the form when the file has none", () => {
+  const entries = parseAttendanceCsv("\uFEFFbatch_id,student_id,status\r\n1, 2 ,present\r\n", { date: "2025-01-10" });
+  assert.deepEqual(entries, [{ batch_id: 1, student_id: 2, date: "2025-01-10", status: "PRESENT" }]);
+});
+
+test("rejects quoted fields instead of splitting inside them", () => {
+  assert.throws(
+    () => parseAttendanceCsv('batch_id,student_id,date,status\n1,"2,3",2025-01-10,PRESENT\n'),
+    /line 2 contains a quote/
+  );
+});
@@ -0,0 +1,75 @@
+const test = require("node:test");
+const assert = require("node:assert/strict");
+
+const { TtlLruCache } = require("../src/cache");
+
+function fakeClock(t, start = 1000) {
+  const clock = { now: start };
+  t.mock.method(Date, "now", () => clock.now);
+  return clock;
+}
+
+test("entries expire after the TTL and are loaded again", async (t) => {
+  const clock = fakeClock(t);
+  const cache = new TtlLruCache({ name: "test", capacity: 10, ttlMs: 100 });
+  let loads = 0;
+  const loader = async () => {
+    loads += 1;
+    return { loads };
+  };
+
+  assert.deepEqual(await cache.getOrLoad(1, loader), { loads: 1 });
+  clock.now += 99;
+  assert.deepEqual(await cache.getOrLoad(1, loader), { loads: 1 });
+  clock.now += 1;
+  assert.equal(cache.get(1), undefined);
+  assert.deepEqual(await cache.getOrLoad(1, loader), { loads: 2 });
+  assert.equal(cache.stats().hits, 1);
+  assert.equal(cache.stats().misses, 2);
+});
+
+test("evicts the least recently used entry beyond capacity", (t) => {
+  fakeClock(t);
+  const cache = new TtlLruCache({ name: "test", capacity: 2, ttlMs: 1000 });
+  cache.set("a", 1);
+  cache.set("b", 2);
+  assert.equal(cache.get("a"), 1);
+  cache.set("c", 3);
+
+  assert.equal(cache.get("b"), undefined);
+  assert.equal(cache.get("a"), 1);
+  assert.equal(cache.get("c"), 3);
+  assert.equal(cache.stats().size, 2);
+  assert.equal(cache.stats().evictions, 1);
+});
+
+test("concurrent loads share one query and a delete keeps a running load out", async () => {
+  const cache = new TtlLruCache({ name: "test", capacity: 10, ttlMs: 1000 });
+  let loads = 0;
+  let release;
+  const gate = new Promise((resolve) => {
+    release = resolve;
+  });
+  const loader = async () => {
+    loads += 1;
+    await gate;
+    return "stale";
+  };
+
+  const first = cache.getOrLoad("k", loader);
+  const second = cache.getOrLoad("k", loader);
+  cache.delete("k");
+  release();
+  assert.deepEqual(await Promise.all([first, second]), ["stale", "stale"]);
+  assert.equal(loads, 1);
+  assert.equal(cache.get("k"), undefined);
+});
+
+test("a TTL of zero turns caching off", async () => {
+  const cache = new TtlLruCache({ name: "test", capacity: 10, ttlMs: 0 });
+  let loads = 0;
+  await cache.getOrLoad(1, async () => ++loads);
+  await cache.getOrLoad(1, async () => ++loads);
+  assert.equal(loads, 2);
+  assert.equal(cache.stats().size, 0);
+});
@@ -0,0 +1,42 @@
+const test = require("node:test");
+const assert = require("node:assert/strict");
+const fs = require("fs");
+const os = require("os");
+const path = require("path");
+
+const workDir = fs.mkdtempSync(path.join(os.tmpdir(), "db-test-"));
+process.env.DATABASE_URL = `sqlite:///${path.join(workDir, "test.db")}`;
+process.env.DB_READ_POOL_SIZE = "0";
+
+const { connectDb, closeDb, withTransaction } = require("../src/db");
+
+test.after(async () => {
+  await closeDb();
+  fs.rmSync(workDir, { recursive: true, force: true });
+});
+
+test("without readers, a read waits for another caller's transaction", async () => {
+  const db = await connectDb();
+  await db.exec("CREATE TABLE items (id INTEGER PRIMARY KEY)");
+  let inserted;
+  const insertDone = new Promise((resolve) => {
+    inserted = resolve;
+  });
+  let release;
+  const held = new Promise((resolve) => {
+    release = resolve;
+  });
+  const transaction = withTransaction(db, async (tx) => {
+    await tx.run("INSERT INTO items (id) VALUES (1)");
+    inserted();
+    await held;
+    throw new Error("rolled back");
+  });
+  await insertDone;
+  const read = db.get("SELECT COUNT(*) AS c FROM items");
+  // Give a read that bypassed the queue time to finish while the insert is uncommitted.
+  await new Promise((resolve) => setTimeout(resolve, 50));
+  release();
+  await assert.rejects(transaction, /rolled back/);
+  assert.equal((await read).c, 0);
+});
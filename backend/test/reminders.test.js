@@ -0,0 +1,99 @@
+const test = require("node:test");
+const assert = require("node:assert/strict");
+const fs = require("fs");
+const os = require("os");
+const path = require("path");
+
+const workDir = fs.mkdtempSync(path.join(os.tmpdir(), "reminders-test-"));
+process.env.DATABASE_URL = `sqlite:///${path.join(workDir, "test.db")}`;
+process.env.STORAGE_DIR = path.join(workDir, "storage");
+
+const { connectDb, initializeSchema } = require("../src/db");
+const { rebuildFeeBalances, runFeeReminders } = require("../src/services");
+
+const RUN_DATE = "2025-01-10";
+const INSTITUTES = 3;
+const FEES_PER_INSTITUTE = 4;
+
+async function seed(db) {
+  for (let i = 1; i <= INSTITUTES; i += 1) {
+    const institute = await db.run("INSERT INTO institutes (name) VALUES (?)", [`Institute ${i}`]);
+    const batch = await db.run(
+      "INSERT INTO batches (institute_id, name, course, schedule, start_date) VALUES (?, 'Batch', 'Course', 'Mon', '2025-01-01')",
+      [institute.lastID]
+    );
+    for (let j = 1; j <= FEES_PER_INSTITUTE; j += 1) {
+      const student = await db.run(
+        "INSERT INTO students (institute_id, full_name, join_date, status) VALUES (?, ?, '2025-01-01', 'ACTIVE')",
+        [institute.lastID, `Student ${i}-${j}`]
+      );
+      // One installment due on the run date and one long after it, so each fee gets
+      // exactly one on-due reminder.
+      await db.run(
+        `INSERT INTO student_fees (institute_id, student_id, batch_id, total_fee, discount, due_schedule_json)
+         VALUES (?, ?, ?, 2000, 0, ?)`,
+        [
+          institute.lastID,
+          student.lastID,
+          batch.lastID,
+          JSON.stringify([
+            { due_date: RUN_DATE, amount: "1000" },
+            { due_date: "2025-06-01", amount: "1000" }
+          ])
+        ]
+      );
+    }
+  }
+  await rebuildFeeBalances(db);
+}
+
+async function reminderCount(db) {
+  return (await db.get("SELECT COUNT(*) AS c FROM notifications WHERE type = 'FEE_REMINDER'")).c;
+}
+
+test.before(async () => {
+  await initializeSchema();
+  await seed(await connectDb());
+});
+
+test.beforeEach(async () => {
+  await (await connectDb()).run("DELETE FROM notifications");
+});
+
+test.after(async () => {
+  await (await connectDb()).close();
+  fs.rmSync(workDir, { recursive: true, force: true });
+});
+
+test("a dry run reports what it would create and writes nothing", async () => {
+  const db = await connectDb();
+  const report = await runFeeReminders(RUN_DATE, { dryRun: true });
+  assert.equal(report.would_create, INSTITUTES * FEES_PER_INSTITUTE);
+  assert.equal(report.created, 0);
+  assert.equal(await reminderCount(db), 0);
+});
+
+test("rerunning a day creates no duplicate reminders", async () => {
+  const db = await connectDb();
+  const first = await runFeeReminders(RUN_DATE, { chunkSize: 3 });
+  assert.equal(first.created, INSTITUTES * FEES_PER_INSTITUTE);
+  const second = await runFeeReminders(RUN_DATE);
+  assert.equal(second.created, 0);
+  assert.equal(second.skipped_existing, INSTITUTES * FEES_PER_INSTITUTE);
+  const dryRun = await runFeeReminders(RUN_DATE, { dryRun: true });
+  assert.equal(dryRun.would_create, 0);
+  assert.equal(await reminderCount(db), INSTITUTES * FEES_PER_INSTITUTE);
+});
+
+test("shards split the institutes without overlap or gaps", async () => {
+  const db = await connectDb();
+  const shards = [];
+  for (let shardIndex = 0; shardIndex < 2; shardIndex += 1) {
+    shards.push(await runFeeReminders(RUN_DATE, { shardIndex, shardCount: 2 }));
+  }
+  assert.equal(shards[0].institutes + shards[1].institutes, INSTITUTES);
+  assert.equal(shards[0].created + shards[1].created, INSTITUTES * FEES_PER_INSTITUTE);
+  const unsharded = await runFeeReminders(RUN_DATE);
+  assert.equal(unsharded.created, 0);
+  assert.equal(await reminderCount(db), INSTITUTES * FEES_PER_INSTITUTE);
+});
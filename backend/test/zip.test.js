@@ -0,0 +1,71 @@
+const test = require("node:test");
+const assert = require("node:assert/strict");
+const crypto = require("crypto");
+const zlib = require("zlib");
+
+const { crc32, zipStream } = require("../src/zip");
+
+async function buildArchive(entries) {
+  const chunks = [];
+  for await (const chunk of zipStream(entries)) {
+    chunks.push(chunk);
+  }
+  return Buffer.concat(chunks);
+}
+
+// Reads the archive back through its central directory, checking each local header
+// against the record that points at it.
+function readArchive(archive) {
+  const end = archive.length - 22;
+  assert.equal(archive.readUInt32LE(end), 0x06054b50);
+  const count = archive.readUInt16LE(end + 10);
+  let position = archive.readUInt32LE(end + 16);
+  const entries = [];
+  for (let i = 0; i < count; i += 1) {
+    assert.equal(archive.readUInt32LE(position), 0x02014b50);
+    const crc = archive.readUInt32LE(position + 16);
+    const size = archive.readUInt32LE(position + 24);
+    const nameLength = archive.readUInt16LE(position + 28);
+    const offset = archive.readUInt32LE(position + 42);
+    const name = archive.toString("utf8", position + 46, position + 46 + nameLength);
+    position += 46 + nameLength;
+
+    assert.equal(archive.readUInt32LE(offset), 0x04034b50);
+    assert.equal(archive.readUInt16LE(offset + 8), 0, "entries are stored");
+    assert.equal(archive.readUInt32LE(offset + 14), crc);
+    assert.equal(archive.toString("utf8", offset + 30, offset + 30 + nameLength), name);
+    const start = offset + 30 + nameLength + archive.readUInt16LE(offset + 28);
+    entries.push({ name, crc, data: archive.subarray(start, start + size) });
+  }
+  return entries;
+}
+
+test("crc32 matches zlib", () => {
+  for (const size of [0, 1, 7, 256, 65537]) {
+    const data = crypto.randomBytes(size);
+    assert.equal(crc32(data), zlib.crc32(data), `size ${size}`);
+  }
+});
+
+test("writes entries that read back with matching names, data and checksums", async () => {
+  const inputs = [
+    { name: "receipt-A.pdf", data: crypto.randomBytes(1500), date: new Date(2025, 0, 10, 9, 30) },
+    { name: "empty.pdf", data: Buffer.alloc(0), date: new Date(2025, 0, 11) },
+    { name: "reçu-é.pdf", data: Buffer.from("%PDF-1.3\n"), date: new Date("invalid") }
+  ];
+  const entries = readArchive(await buildArchive(inputs));
+  assert.deepEqual(
+    entries.map((entry) => entry.name),
+    inputs.map((input) => input.name)
+  );
+  entries.forEach((entry, i) => {
+    assert.ok(entry.data.equals(inputs[i].data));
+    assert.equal(entry.crc, zlib.crc32(inputs[i].data));
+  });
+});
+
+test("an empty input still yields a valid archive", async () => {
+  const archive = await buildArchive([]);
+  assert.equal(archive.length, 22);
+  assert.deepEqual(readArchive(archive), []);
+});